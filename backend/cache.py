@@ -0,0 +1,134 @@
+"""
+Content-hash result cache for /predict: re-submitted frames skip the forward pass.
+
+🔒 PRIVACY: only the prediction (imt_mm, risk_level, foreground_prob, optional IMT statistics) is stored, keyed by a SHA-256 of
+image bytes + spacing + model version. Image bytes are never cached, in memory or on disk.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from backend.config import RESULT_CACHE_DB, RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S
+
+CACHED_FIELDS = ("imt_mm", "risk_level", "foreground_prob")
+# Optional (stats=true); kept with the entry when the result has them
+STATS_FIELDS = ("imt_max_mm", "imt_p75_mm", "imt_coverage")
+
+
+def cache_key(image_bytes: bytes, spacing_mm_per_pixel: float, model_version: str) -> str:
+    h = hashlib.sha256(image_bytes)
+    h.update(f"|{spacing_mm_per_pixel!r}|{model_version}".encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache with size and TTL eviction, optionally backed by a local SQLite file so entries
+    survive restarts. max_entries=0 disables caching. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 3600.0, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path and max_entries > 0:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_results_expires_at ON results (expires_at)")
+            self._prune_db()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str, required: Tuple[str, ...] = CACHED_FIELDS) -> Optional[Dict]:
+        """Cached result, or None (a miss) when absent, expired or lacking any of the required fields."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM results WHERE key = ? AND expires_at >= ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[1], json.loads(row[0]))
+                    self._store(key, entry)
+            if entry is None or not all(k in entry[1] for k in required):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key: str, result: Dict) -> None:
+        if not self.enabled:
+            return
+        value = {k: result[k] for k in CACHED_FIELDS}
+        value.update({k: result[k] for k in STATS_FIELDS if k in result})
+        entry = (time.time() + self.ttl_s, value)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and len(value) == len(CACHED_FIELDS):
+                # A prediction without statistics does not drop statistics cached for the same frame
+                value.update({k: v for k, v in previous[1].items() if k in STATS_FIELDS})
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), entry[0]),
+                )
+                self._puts += 1
+                if self._puts % 100 == 0:
+                    self._prune_db()
+                self._db.commit()
+
+    def _store(self, key: str, entry: tuple) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_db(self) -> None:
+        """Drop expired rows and keep at most max_entries (the most recently written) on disk."""
+        self._db.execute("DELETE FROM results WHERE expires_at < ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache(
+    max_entries=RESULT_CACHE_SIZE,
+    ttl_s=RESULT_CACHE_TTL_S,
+    db_path=RESULT_CACHE_DB or None,
+)
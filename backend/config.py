@@ -24,3 +24,67 @@ def get_database_url() -> str:
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-production-use-openssl-rand")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+
+# Inference backend: "torch" (eager checkpoint), "onnx" (ONNX Runtime) or "torchscript";
+# export the graphs with `python -m backend.export_model`. ORT thread counts: 0 = ONNX Runtime default
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+
+# Recorded with results and part of the result-cache key; default derives it from the served weights' hash
+MODEL_VERSION = os.getenv("MODEL_VERSION", "")
+
+# Memory-map checkpoint weights (CPU) so uvicorn workers share read-only pages; load + warm up at startup
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") == "1"
+MODEL_EAGER_LOAD = os.getenv("MODEL_EAGER_LOAD", "1") == "1"
+
+# Serving build: channels-last memory format and torch.compile are opt-in (benchmark first: benchmarks/bench_inference.py)
+MODEL_CHANNELS_LAST = os.getenv("MODEL_CHANNELS_LAST", "0") == "1"
+MODEL_COMPILE = os.getenv("MODEL_COMPILE", "0") == "1"
+# Serve the INT8 checkpoint written by `python -m backend.quantize_model` (only after its accuracy guardrail passed)
+MODEL_QUANTIZED = os.getenv("MODEL_QUANTIZED", "0") == "1"
+
+# Per-image preprocessing budget (ms, the checkpoint's preprocessing pipeline at native resolution); measured at
+# warm-up, slower images are counted in strokelink_preprocess_over_budget_total. 0 = no budget
+PREPROCESS_BUDGET_MS = float(os.getenv("PREPROCESS_BUDGET_MS", "60"))
+
+# Inference scheduling: concurrent /predict requests are micro-batched into one forward pass
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+# Inference runs on its own thread pool; when INFERENCE_QUEUE_SIZE images are already waiting, /predict returns 503
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "32"))
+INFERENCE_RETRY_AFTER_S = int(os.getenv("INFERENCE_RETRY_AFTER_S", "2"))
+
+# POST /predict/batch: max frames per request (files plus images inside zips), max uncompressed image bytes per zip
+PREDICT_BATCH_MAX_FILES = int(os.getenv("PREDICT_BATCH_MAX_FILES", "64"))
+PREDICT_BATCH_MAX_UNZIPPED_MB = int(os.getenv("PREDICT_BATCH_MAX_UNZIPPED_MB", "256"))
+
+# /predict result cache (results only, never images): entries, TTL, optional SQLite file so hits survive restarts
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "3600"))
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")
+
+# POST /predict/video: max upload size, max frames analysed per clip, near-duplicate frame threshold (grey levels, 0 = off)
+VIDEO_MAX_UPLOAD_MB = int(os.getenv("VIDEO_MAX_UPLOAD_MB", "200"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "600"))
+VIDEO_SKIP_THRESHOLD = float(os.getenv("VIDEO_SKIP_THRESHOLD", "1.0"))
+
+# Async inference jobs (async_job=true): background workers per process (0 = enqueue only), queue poll interval,
+# max waiting jobs before 503, re-queue "running" jobs without a worker heartbeat for JOB_STALE_AFTER_S (crashed
+# process; failed once claimed max attempts times),
+# fail jobs still queued after the queued TTL (their upload is dropped), delete finished jobs after retention
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S", "1.0"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+JOB_STALE_AFTER_S = float(os.getenv("JOB_STALE_AFTER_S", "900"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_QUEUED_TTL_S = float(os.getenv("JOB_QUEUED_TTL_S", "3600"))
+JOB_RETENTION_S = float(os.getenv("JOB_RETENTION_S", "86400"))
+
+# Request profiling (/predict): header X-Profile: <PROFILE_TOKEN> (unset = header disabled) and/or a random
+# fraction of requests; artifacts written under PROFILE_DIR, newest PROFILE_KEEP kept
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(_data_dir / "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
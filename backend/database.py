@@ -1,8 +1,11 @@
 """SQLAlchemy engine and session. Sync (SQLite + PostgreSQL)."""
+import time
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from backend.config import get_database_url
+from backend.metrics import DB_SESSION_SECONDS
 
 database_url = get_database_url()
 connect_args = {}
@@ -21,7 +24,9 @@ Base = declarative_base()
 def get_db():
     """FastAPI dependency: yield a DB session."""
     db = SessionLocal()
+    start = time.perf_counter()
     try:
         yield db
     finally:
         db.close()
+        DB_SESSION_SECONDS.observe(time.perf_counter() - start)
@@ -0,0 +1,152 @@
+"""
+Export the Swin-UNETR checkpoint (models/carotid_swin_unetr_2d.pt from model.ipynb / carotid/train_carotid.py)
+to ONNX and/or TorchScript for the CPU serving backends (INFERENCE_BACKEND=onnx | torchscript).
+
+Run from project root:
+    python -m backend.export_model --checkpoint models/carotid_swin_unetr_2d.pt --formats onnx torchscript --verify
+Graphs are written next to the checkpoint (same stem, .onnx / .ts), where load_model() looks for them.
+--verify checks parity against the eager model on masks and IMT (the values /predict returns).
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+import torch
+
+from backend.inference import (
+    DEFAULT_SPACING_MM_PER_PIXEL,
+    MODEL_PATH,
+    OnnxRunner,
+    build_model,
+)
+from carotid.imt_utils import imt_mm_batch
+from carotid.pipeline import PreprocessingPipeline, load_array
+
+
+def load_eager(checkpoint: Path) -> torch.nn.Module:
+    state = torch.load(checkpoint, map_location="cpu")
+    net = build_model(
+        in_channels=state.get("in_channels", 1),
+        out_channels=state.get("out_channels", 2),
+    )
+    net.load_state_dict(state.get("model", state), strict=False)
+    return net.eval()
+
+
+def export_onnx(net: torch.nn.Module, out_path: Path, img_size: int = 224, opset: int = 17) -> Path:
+    dummy = torch.rand(1, 1, img_size, img_size)
+    torch.onnx.export(
+        net,
+        (dummy,),
+        str(out_path),
+        input_names=["image"],
+        output_names=["logits"],
+        dynamic_axes={"image": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset,
+        dynamo=False,
+    )
+    return out_path
+
+
+def export_torchscript(net: torch.nn.Module, out_path: Path, img_size: int = 224) -> Path:
+    dummy = torch.rand(1, 1, img_size, img_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(net, dummy)
+    traced.save(str(out_path))
+    return out_path
+
+
+def preprocess_files(checkpoint: Path, paths: Sequence[str], size: Optional[Sequence[int]] = None) -> torch.Tensor:
+    """
+    (N, 1, H, W) model inputs for image files, preprocessed with the pipeline stored in `checkpoint` (the model
+    being evaluated, not the one the API serves); size (H, W) overrides its img_size.
+    """
+    pipeline = PreprocessingPipeline.from_checkpoint(torch.load(checkpoint, map_location="cpu"))
+    frames = []
+    for path in paths:
+        frames.append(torch.from_numpy(pipeline(load_array(path), size))[None, None])
+    return torch.cat(frames, dim=0)
+
+
+def _verification_batch(checkpoint: Path, image_glob: Optional[str], n: int, img_size: int) -> torch.Tensor:
+    paths = sorted(glob.glob(image_glob))[:n] if image_glob else []
+    if not paths:
+        return torch.rand(n, 1, img_size, img_size)
+    return preprocess_files(checkpoint, paths, size=(img_size, img_size))
+
+
+def parity_report(
+    eager: torch.nn.Module,
+    exported: Callable[[torch.Tensor], torch.Tensor],
+    x: torch.Tensor,
+    spacing_mm_per_pixel: float = DEFAULT_SPACING_MM_PER_PIXEL,
+) -> Dict[str, float]:
+    """Logit, mask and IMT agreement between eager and exported models on batch x."""
+    with torch.inference_mode():
+        ref = eager(x)
+        out = exported(x)
+    ref_mask = ref.argmax(dim=1)
+    out_mask = out.argmax(dim=1)
+    ia = imt_mm_batch(ref_mask, spacing_mm_per_pixel, lumen_label=1, wall_label=1)
+    ib = imt_mm_batch(out_mask, spacing_mm_per_pixel, lumen_label=1, wall_label=1)
+    both = np.isfinite(ia) & np.isfinite(ib)
+    # A mask that yields an IMT on one side only is a hard mismatch
+    imt_diffs = np.where(both, np.abs(ia - ib), np.where(np.isfinite(ia) != np.isfinite(ib), np.inf, 0.0))
+    return {
+        "max_abs_logit_diff": float((ref - out).abs().max()),
+        "mask_agreement": float((ref_mask == out_mask).float().mean()),
+        "max_imt_diff_mm": float(imt_diffs.max()) if imt_diffs.size else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Swin-UNETR checkpoint to ONNX / TorchScript")
+    parser.add_argument("--checkpoint", type=str, default=str(MODEL_PATH))
+    parser.add_argument("--formats", nargs="+", choices=["onnx", "torchscript"], default=["onnx"])
+    parser.add_argument("--out_dir", type=str, default=None, help="Default: checkpoint directory")
+    parser.add_argument("--img_size", type=int, default=224)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--verify", action="store_true", help="Check mask / IMT parity against the eager model")
+    parser.add_argument("--verify_images", type=str, default="data/Common Carotid Artery Ultrasound Images/US images/*.png")
+    parser.add_argument("--verify_n", type=int, default=8)
+    parser.add_argument("--max_imt_diff_mm", type=float, default=0.01)
+    args = parser.parse_args()
+
+    checkpoint = Path(args.checkpoint)
+    if not checkpoint.exists():
+        raise SystemExit(f"Checkpoint not found: {checkpoint}")
+    out_dir = Path(args.out_dir) if args.out_dir else checkpoint.parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+    eager = load_eager(checkpoint)
+
+    exported: Dict[str, Callable[[torch.Tensor], torch.Tensor]] = {}
+    if "onnx" in args.formats:
+        path = export_onnx(eager, out_dir / f"{checkpoint.stem}.onnx", args.img_size, args.opset)
+        print(f"ONNX written to {path}")
+        if args.verify:
+            exported["onnx"] = OnnxRunner(path)
+    if "torchscript" in args.formats:
+        path = export_torchscript(eager, out_dir / f"{checkpoint.stem}.ts", args.img_size)
+        print(f"TorchScript written to {path}")
+        if args.verify:
+            exported["torchscript"] = torch.jit.load(str(path)).eval()
+
+    failed = False
+    if exported:
+        x = _verification_batch(checkpoint, args.verify_images, args.verify_n, args.img_size)
+        for name, fn in exported.items():
+            report = parity_report(eager, fn, x)
+            ok = report["max_imt_diff_mm"] <= args.max_imt_diff_mm
+            failed |= not ok
+            print(f"{name}: {report} -> {'OK' if ok else 'PARITY FAILED'}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""Swin-UNETR inference: model loading, preprocessing, IMT estimation (single image and batched)."""
+import hashlib
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import torch
+from monai.networks.nets import SwinUNETR
+import numpy as np
+
+from backend.config import (
+    INFERENCE_BACKEND,
+    MODEL_CHANNELS_LAST,
+    MODEL_COMPILE,
+    MODEL_MMAP,
+    MODEL_QUANTIZED,
+    MODEL_VERSION,
+    ORT_INTER_OP_THREADS,
+    ORT_INTRA_OP_THREADS,
+    PREPROCESS_BUDGET_MS,
+)
+from backend.metrics import BATCH_SIZE, MODEL_LOAD_SECONDS, PREPROCESS_OVER_BUDGET, STAGE_SECONDS
+from carotid.imt_utils import imt_mm_batch, imt_summary_batch
+from carotid.pipeline import PreprocessingPipeline, decode_image
+
+# MODEL INFERENCE
+MODEL_PATH = Path(__file__).parent.parent / "models" / "carotid_swin_unetr_2d.pt"
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+model = None
+_model_version: Optional[str] = None
+_pipeline: Optional[PreprocessingPipeline] = None
+
+# Spacing from ultrasound machine (mm per pixel)
+# Typical carotid ultrasound: ~0.03-0.05 mm/pixel
+DEFAULT_SPACING_MM_PER_PIXEL = 0.04
+
+
+def build_model(in_channels: int = 1, out_channels: int = 2) -> torch.nn.Module:
+    """
+    Serving build of the model.ipynb Swin-UNETR (feature_size=48, heads 3/6/12/24).
+    Gradient checkpointing is a training-only memory trick (it recomputes activations), so it is off here.
+    """
+    return SwinUNETR(
+        in_channels=in_channels,
+        out_channels=out_channels,
+        spatial_dims=2,
+        feature_size=48,
+        num_heads=(3, 6, 12, 24),
+        patch_size=2,
+        window_size=7,
+        use_checkpoint=False,
+    )
+
+
+def quantize_dynamic_int8(net: torch.nn.Module) -> torch.nn.Module:
+    """Post-training dynamic INT8 quantization of the Linear layers (Swin attention / MLP blocks)."""
+    return torch.ao.quantization.quantize_dynamic(net, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantized_checkpoint_path(checkpoint: Path) -> Path:
+    """Where `python -m backend.quantize_model` writes the INT8 checkpoint for `checkpoint`."""
+    return checkpoint.with_name(f"{checkpoint.stem}_int8{checkpoint.suffix}")
+
+
+class OnnxRunner:
+    """ONNX Runtime session with the torch model's call signature: (N, 1, H, W) tensor -> (N, C, H, W) logits."""
+
+    def __init__(self, path: Path):
+        import onnxruntime as ort  # optional dependency, only needed for INFERENCE_BACKEND=onnx
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ORT_INTRA_OP_THREADS:
+            opts.intra_op_num_threads = ORT_INTRA_OP_THREADS
+        if ORT_INTER_OP_THREADS:
+            opts.inter_op_num_threads = ORT_INTER_OP_THREADS
+        self.session = ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})[0]
+        return torch.from_numpy(out)
+
+
+def _read_checkpoint(path: Path) -> tuple:
+    """
+    torch.load the checkpoint -> (state, mmapped). With MODEL_MMAP on CPU the tensors stay backed by the
+    file's page cache, so every uvicorn worker maps the same read-only pages instead of holding a copy.
+    """
+    if MODEL_MMAP and device.type == "cpu":
+        try:
+            return torch.load(path, map_location="cpu", mmap=True, weights_only=True), True
+        except RuntimeError:
+            pass  # legacy (non-zip) checkpoints cannot be memory-mapped
+    return torch.load(path, map_location=device), False
+
+
+def _load_torch_model(path: Path) -> torch.nn.Module:
+    if not path.exists():
+        raise FileNotFoundError(f"Model not found at {path}")
+    state, mmapped = _read_checkpoint(path)
+    net = build_model(
+        in_channels=state.get("in_channels", 1),
+        out_channels=state.get("out_channels", 2),
+    ).to(device)
+    if state.get("quantization") == "dynamic_int8":
+        # INT8 kernels are CPU-only; packed weights load into a freshly quantized module
+        net = quantize_dynamic_int8(net.cpu().eval())
+        mmapped = False
+    # assign=True keeps the mmap'ed tensors as parameters instead of copying into the fresh ones
+    net.load_state_dict(state.get("model", state), strict=False, assign=mmapped)
+    net.eval()
+    if MODEL_CHANNELS_LAST:
+        net = net.to(memory_format=torch.channels_last)
+    if MODEL_COMPILE:
+        net = torch.compile(net)
+    return net
+
+
+def serving_model_path() -> Path:
+    """File load_model() reads for the configured INFERENCE_BACKEND / MODEL_QUANTIZED."""
+    if INFERENCE_BACKEND == "onnx":
+        return MODEL_PATH.with_suffix(".onnx")
+    if INFERENCE_BACKEND == "torchscript":
+        return MODEL_PATH.with_suffix(".ts")
+    return quantized_checkpoint_path(MODEL_PATH) if MODEL_QUANTIZED else MODEL_PATH
+
+
+def model_version() -> str:
+    """MODEL_VERSION if set, else '<file stem>-<backend>-<sha256 prefix of the served weights>'."""
+    global _model_version
+    if _model_version is None:
+        if MODEL_VERSION:
+            _model_version = MODEL_VERSION
+        else:
+            path = serving_model_path()
+            if not path.exists():
+                raise FileNotFoundError(f"Model not found at {path}")
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            _model_version = f"{path.stem}-{INFERENCE_BACKEND}-{digest.hexdigest()[:12]}"
+    return _model_version
+
+
+def load_model():
+    """
+    Load the serving model for INFERENCE_BACKEND:
+    torch (checkpoint, eager; optional channels-last / torch.compile; MODEL_QUANTIZED=1 serves the
+    INT8 checkpoint from `python -m backend.quantize_model`), onnx or torchscript
+    (graphs written next to the checkpoint by `python -m backend.export_model`).
+    """
+    global model
+    if model is not None:
+        return model
+
+    path = serving_model_path()
+    if not path.exists():
+        raise FileNotFoundError(f"Model not found at {path}")
+    t0 = time.perf_counter()
+    if INFERENCE_BACKEND == "onnx":
+        model = OnnxRunner(path)
+    elif INFERENCE_BACKEND == "torchscript":
+        model = torch.jit.load(str(path), map_location=device).eval()
+    else:
+        model = _load_torch_model(path)
+    MODEL_LOAD_SECONDS.set(time.perf_counter() - t0)
+    print(f"✅ Model loaded from {path} ({INFERENCE_BACKEND})")
+    return model
+
+
+def preprocessing_pipeline() -> PreprocessingPipeline:
+    """
+    The preprocessing the served model was trained with ("preprocessing" in the checkpoint, see carotid/pipeline.py),
+    read from the .pt checkpoint for every backend; legacy checkpoints keep max-normalise + resize.
+    """
+    global _pipeline
+    if _pipeline is None:
+        path = serving_model_path()
+        if path.suffix != ".pt":
+            path = MODEL_PATH
+        state = _read_checkpoint(path)[0] if path.exists() else {}
+        _pipeline = PreprocessingPipeline.from_checkpoint(state)
+        print(f"✅ Preprocessing: {' -> '.join(_pipeline.describe())}")
+    return _pipeline
+
+
+def process_memory_mb() -> Dict[str, float]:
+    """Resident memory of this process (Linux): total, anonymous (private) and file-backed (shareable)."""
+    fields = {"VmRSS": "rss_mb", "RssAnon": "rss_anon_mb", "RssFile": "rss_file_mb"}
+    out: Dict[str, float] = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key = line.split(":", 1)[0]
+                if key in fields:
+                    out[fields[key]] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return out
+
+
+def warm_up(img_size: int = 224) -> Dict[str, float]:
+    """Load the model and run one dummy forward pass so the first request does not pay for either."""
+    t0 = time.perf_counter()
+    net = load_model()
+    t1 = time.perf_counter()
+    with torch.inference_mode():
+        net(torch.zeros(1, 1, img_size, img_size, device=device))
+    t2 = time.perf_counter()
+    model_version()
+    # Per-image preprocessing cost on a dataset-sized frame, held against PREPROCESS_BUDGET_MS
+    frame = np.random.default_rng(0).integers(0, 256, (709, 749), dtype=np.uint8)
+    preprocess_ms = preprocessing_pipeline().measure(frame, repeats=3)
+    stats = {
+        "load_s": round(t1 - t0, 3),
+        "warmup_s": round(t2 - t1, 3),
+        "preprocess_ms": preprocess_ms["total"],
+        **process_memory_mb(),
+    }
+    if PREPROCESS_BUDGET_MS and preprocess_ms["total"] > PREPROCESS_BUDGET_MS:
+        print(f"⚠️  Preprocessing takes {preprocess_ms} ms per image, over PREPROCESS_BUDGET_MS={PREPROCESS_BUDGET_MS:g}")
+    print(f"✅ Model ready: {stats}")
+    return stats
+
+
+def preprocess_image(image_bytes: bytes, size=None) -> torch.Tensor:
+    """Convert image bytes to model-ready tensor."""
+    with STAGE_SECONDS.time("decode"):
+        img = decode_image(image_bytes)
+
+    if img is None:
+        raise ValueError("Invalid image")
+
+    return preprocess_array(img, size)
+
+
+def preprocess_array(img: np.ndarray, size=None) -> torch.Tensor:
+    """
+    Convert a decoded grayscale frame (H, W) to model-ready tensor (e.g. frames of a cine loop) with the
+    checkpoint's preprocessing pipeline; size (H, W) overrides its img_size.
+    """
+    pipeline = preprocessing_pipeline()
+    t0 = time.perf_counter()
+    img = pipeline(img, size)
+    # Add batch and channel dims: (1, 1, H, W)
+    img_tensor = torch.from_numpy(img).unsqueeze(0).unsqueeze(0).to(device)
+    elapsed = time.perf_counter() - t0
+    STAGE_SECONDS.observe(elapsed, "preprocess")
+    if PREPROCESS_BUDGET_MS and elapsed * 1000.0 > PREPROCESS_BUDGET_MS:
+        PREPROCESS_OVER_BUDGET.inc()
+    return img_tensor
+
+
+def foreground_probability(logits: torch.Tensor) -> torch.Tensor:
+    """P(class 1) per pixel from (N, C, H, W) logits; for 2 classes softmax reduces to a sigmoid of the logit gap."""
+    if logits.shape[1] == 2:
+        return torch.sigmoid(logits[:, 1] - logits[:, 0])
+    return torch.softmax(logits, dim=1)[:, 1]
+
+
+def risk_level_from_imt(imt_mm: float) -> str:
+    """Clinical risk threshold: IMT ≥ 0.9 mm indicates high stroke risk."""
+    return "High" if imt_mm >= 0.9 else "Moderate" if imt_mm >= 0.7 else "Low"
+
+
+# Optional PredictionResponse fields filled when IMT statistics are requested
+IMT_STATS_FIELDS = ("imt_max_mm", "imt_p75_mm", "imt_coverage")
+
+
+def _imt_stats(summary: Dict[str, np.ndarray], i: int) -> dict:
+    """Statistics of image i; max / p75 are None when no column had a measurable wall (fallback IMT)."""
+    def mm(value: float) -> Optional[float]:
+        return None if np.isnan(value) else round(float(value), 2)
+
+    return {
+        "imt_max_mm": mm(summary["max_mm"][i]),
+        "imt_p75_mm": mm(summary["p75_mm"][i]),
+        "imt_coverage": round(float(summary["coverage"][i]), 3),
+    }
+
+
+def predict_imt_batch(
+    img_tensors: torch.Tensor,
+    spacings_mm_per_pixel: Sequence[float],
+    stats: Union[bool, Sequence[bool]] = False,
+) -> List[dict]:
+    """
+    Run one forward pass over a stacked (N, 1, H, W) batch and estimate IMT for each image.
+    stats (one flag, or one per image) adds imt_max_mm / imt_p75_mm / imt_coverage, derived from the same
+    interface pass as imt_mm; without it only the mean is computed.
+    """
+    model = load_model()
+    if MODEL_CHANNELS_LAST and INFERENCE_BACKEND == "torch":
+        img_tensors = img_tensors.contiguous(memory_format=torch.channels_last)
+
+    BATCH_SIZE.observe(img_tensors.shape[0])
+    with STAGE_SECONDS.time("forward"), torch.inference_mode():
+        logits = model(img_tensors)
+        # argmax of softmax == argmax of logits; only the foreground probability is needed
+        pred_class = logits.argmax(dim=1)  # (N, H, W), stays on the model's device for the IMT pass
+        foreground_probs = foreground_probability(logits).mean(dim=(1, 2)).cpu().tolist()
+
+    t_imt = time.perf_counter()
+    want_stats = [stats] * len(foreground_probs) if isinstance(stats, bool) else list(stats)
+    # Calculate real IMT from the segmentation masks (whole batch at once)
+    # mask: 0=background, 1=foreground (carotid artery)
+    # For 2-class model, treat class 1 as both lumen and wall
+    summary = None
+    if any(want_stats):
+        summary = imt_summary_batch(pred_class, spacings_mm_per_pixel, lumen_label=1, wall_label=1)
+        imts_mm = summary["mean_mm"]
+    else:
+        imts_mm = imt_mm_batch(pred_class, spacings_mm_per_pixel, lumen_label=1, wall_label=1)
+    results = []
+    for i, (imt_mm, foreground_prob) in enumerate(zip(imts_mm.tolist(), foreground_probs)):
+        # Fallback to foreground probability if IMT calculation fails
+        if np.isnan(imt_mm):
+            imt_mm = 0.5 + (foreground_prob * 0.7)  # Fallback: scale to 0.5–1.2 mm range
+
+        result = {
+            "imt_mm": round(imt_mm, 2),
+            "risk_level": risk_level_from_imt(imt_mm),
+            "foreground_prob": round(foreground_prob, 3),
+        }
+        if want_stats[i]:
+            result.update(_imt_stats(summary, i))
+        results.append(result)
+    STAGE_SECONDS.observe(time.perf_counter() - t_imt, "imt")
+    return results
+
+
+def predict_imt(
+    image_bytes: bytes, spacing_mm_per_pixel: float = DEFAULT_SPACING_MM_PER_PIXEL, stats: bool = False
+) -> dict:
+    """Run inference and estimate IMT (Intima-Media Thickness) from segmentation; stats adds max / p75 / coverage."""
+    img_tensor = preprocess_image(image_bytes)
+    return predict_imt_batch(img_tensor, [spacing_mm_per_pixel], stats=stats)[0]
@@ -0,0 +1,337 @@
+"""
+Asynchronous inference jobs: POST /predict, /predict/batch and /predict/video with async_job=true.
+
+Jobs are rows of the inference_jobs table in the app database (SQLite / PostgreSQL, no external broker).
+Background workers started with the app claim queued rows, run them through the same micro-batched path
+as the synchronous endpoints and store the JSON response. Clients poll GET /jobs/{id} or follow the
+server-sent events at GET /jobs/{id}/events.
+
+🔒 PRIVACY: the upload is held in the job row only until a worker has processed it; the payload column is
+cleared in the same commit that stores the result (or the error). A job still queued after queued_ttl_s
+(JOB_WORKERS=0 everywhere, or a backlog) is failed and its payload cleared the same way.
+"""
+import asyncio
+import json
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select, update
+
+from backend.config import (
+    INFERENCE_RETRY_AFTER_S,
+    JOB_MAX_ATTEMPTS,
+    JOB_MAX_QUEUED,
+    JOB_POLL_INTERVAL_S,
+    JOB_QUEUED_TTL_S,
+    JOB_RETENTION_S,
+    JOB_STALE_AFTER_S,
+    JOB_WORKERS,
+)
+from backend.database import SessionLocal
+from backend.models import InferenceJob
+from backend.scheduler import QueueFullError
+
+# handler(payload, params, report_progress) -> JSON-serialisable result
+JobHandler = Callable[[bytes, dict, Callable[[int], Awaitable[None]]], Awaitable[dict]]
+
+FINISHED = ("done", "failed")
+MAINTENANCE_INTERVAL_S = 60.0
+
+
+def job_to_dict(job: InferenceJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress or 0,
+        "attempts": job.attempts or 0,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class JobQueue:
+    """
+    Persistent job queue on the app database. Handlers are registered per job kind with @job_queue.handler(kind).
+    A job is claimed with a conditional UPDATE (queued -> running), so several uvicorn processes can share the table.
+    A running job's heartbeat_at is refreshed every stale_after_s / 3 and on progress; jobs whose heartbeat is
+    older than stale_after_s (crashed process) are re-queued, or failed once they have been claimed
+    max_attempts times (a job that kills its worker must not loop forever). Jobs queued for longer than
+    queued_ttl_s are failed and their upload dropped; finished jobs are deleted after retention_s. Maintenance
+    runs every MAINTENANCE_INTERVAL_S in every process that starts the queue, even with workers=0.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        poll_interval_s: float = 1.0,
+        max_queued: int = 1000,
+        stale_after_s: float = 900.0,
+        retention_s: float = 86400.0,
+        max_attempts: int = 3,
+        queued_ttl_s: float = 3600.0,
+    ):
+        self.workers = max(0, workers)
+        self.poll_interval_s = max(0.05, poll_interval_s)
+        self.max_queued = max(1, max_queued)
+        self.stale_after_s = stale_after_s
+        self.retention_s = retention_s
+        self.max_attempts = max(1, max_attempts)
+        self.queued_ttl_s = queued_ttl_s
+        self.handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self._wake: Optional[asyncio.Event] = None
+        self._maintenance: Optional[asyncio.Task] = None
+
+    def handler(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        def register(fn: JobHandler) -> JobHandler:
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    # Database operations (blocking; called through run_in_threadpool)
+
+    def _insert(self, kind: str, payload: bytes, params: dict) -> dict:
+        with SessionLocal() as db:
+            queued = db.scalar(select(func.count(InferenceJob.id)).where(InferenceJob.status == "queued"))
+            if queued >= self.max_queued:
+                raise QueueFullError("Job queue is full")
+            job = InferenceJob(
+                id=str(uuid4()), kind=kind, status="queued", payload=payload, params=json.dumps(params), progress=0
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            return job_to_dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with SessionLocal() as db:
+            job = db.get(InferenceJob, job_id)
+            return job_to_dict(job) if job is not None else None
+
+    def _claim(self) -> Optional[Tuple[str, str, bytes, dict]]:
+        """Oldest queued job, marked running: (id, kind, payload, params). None if the queue is empty."""
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            while True:
+                job_id = db.scalar(
+                    select(InferenceJob.id)
+                    .where(InferenceJob.status == "queued")
+                    .order_by(InferenceJob.created_at)
+                    .limit(1)
+                )
+                if job_id is None:
+                    return None
+                claimed = db.execute(
+                    update(InferenceJob)
+                    .where(InferenceJob.id == job_id, InferenceJob.status == "queued")
+                    .values(
+                        status="running",
+                        started_at=now,
+                        heartbeat_at=now,
+                        attempts=func.coalesce(InferenceJob.attempts, 0) + 1,
+                    )
+                ).rowcount
+                db.commit()
+                if claimed:  # otherwise another worker got it first
+                    job = db.get(InferenceJob, job_id)
+                    return job.id, job.kind, job.payload, json.loads(job.params or "{}")
+
+    def _update(self, job_id: str, **values) -> None:
+        with SessionLocal() as db:
+            db.execute(update(InferenceJob).where(InferenceJob.id == job_id).values(**values))
+            db.commit()
+
+    def _finish(self, job_id: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        self._update(
+            job_id,
+            status="failed" if error is not None else "done",
+            result=json.dumps(result) if result is not None else None,
+            error=error,
+            payload=None,
+            finished_at=datetime.utcnow(),
+        )
+
+    def _release(self, job_id: str) -> None:
+        """Put a claimed job back in the queue without counting the attempt (overload or shutdown, not a crash)."""
+        self._update(
+            job_id,
+            status="queued",
+            started_at=None,
+            heartbeat_at=None,
+            attempts=func.coalesce(InferenceJob.attempts, 1) - 1,  # _claim counted it
+        )
+
+    def _maintain(self) -> None:
+        now = datetime.utcnow()
+        stale = (
+            InferenceJob.status == "running",
+            func.coalesce(InferenceJob.heartbeat_at, InferenceJob.started_at) < now - timedelta(seconds=self.stale_after_s),
+        )
+        exhausted = func.coalesce(InferenceJob.attempts, 0) >= self.max_attempts
+        with SessionLocal() as db:
+            db.execute(
+                update(InferenceJob)
+                .where(*stale, exhausted)
+                .values(
+                    status="failed",
+                    error=f"Abandoned after {self.max_attempts} attempts (worker crashed or timed out)",
+                    payload=None,
+                    finished_at=now,
+                )
+            )
+            db.execute(update(InferenceJob).where(*stale, ~exhausted).values(status="queued", started_at=None, heartbeat_at=None))
+            db.execute(
+                update(InferenceJob)
+                .where(
+                    InferenceJob.status == "queued",
+                    InferenceJob.created_at < now - timedelta(seconds=self.queued_ttl_s),
+                )
+                .values(
+                    status="failed",
+                    error=f"Not started within {self.queued_ttl_s:g} s; upload discarded",
+                    payload=None,
+                    finished_at=now,
+                )
+            )
+            db.execute(
+                delete(InferenceJob).where(
+                    InferenceJob.status.in_(FINISHED),
+                    InferenceJob.finished_at < now - timedelta(seconds=self.retention_s),
+                )
+            )
+            db.commit()
+
+    # Event-loop side
+
+    async def enqueue(self, kind: str, payload: bytes, params: dict) -> dict:
+        """Persist a job and wake a worker. Raises QueueFullError when max_queued jobs are already waiting."""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for job kind {kind!r}")
+        job = await run_in_threadpool(self._insert, kind, payload, params)
+        if self._wake is not None:
+            self._wake.set()
+        return job
+
+    def start(self) -> None:
+        if self._tasks or self._maintenance is not None:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._maintenance = asyncio.get_running_loop().create_task(self._maintain_periodically())
+        for _ in range(self.workers):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        task = asyncio.get_running_loop().create_task(self._work())
+        task.add_done_callback(self._on_worker_done)
+        self._tasks.append(task)
+
+    def _on_worker_done(self, task: asyncio.Task) -> None:
+        """A worker must only end through stop(): log anything else and start a replacement."""
+        if task in self._tasks:
+            self._tasks.remove(task)
+        if self._stopping or task.cancelled():
+            return
+        e = task.exception()
+        print(f"⚠️  Job worker died ({type(e).__name__}: {e}); restarting it in {self.poll_interval_s} s")
+        asyncio.get_running_loop().call_later(self.poll_interval_s, self._respawn)
+
+    def _respawn(self) -> None:
+        if not self._stopping:
+            self._spawn()
+
+    async def stop(self) -> None:
+        """Cancel workers; a job interrupted mid-run goes back to the queue."""
+        self._stopping = True
+        tasks, self._tasks = self._tasks, []
+        if self._maintenance is not None:
+            tasks.append(self._maintenance)
+            self._maintenance = None
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def _maintain_periodically(self) -> None:
+        # Independent of the workers: uploads of jobs nobody runs must still expire
+        while True:
+            try:
+                await run_in_threadpool(self._maintain)
+            except Exception as e:
+                print(f"⚠️  Job queue maintenance failed: {type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+            await asyncio.sleep(MAINTENANCE_INTERVAL_S)
+
+    async def _idle(self) -> None:
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._wake.wait(), self.poll_interval_s)
+        self._wake.clear()
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                claimed = await run_in_threadpool(self._claim)
+                if claimed is None:
+                    await self._idle()
+                else:
+                    await self._run(*claimed)
+                claimed = None  # drop the upload before waiting for the next job
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Database errors (locked file, lost connection, schema drift) must not end the worker; a job
+                # whose result could not be stored stays "running" and is re-queued by _maintain
+                claimed = None
+                print(f"⚠️  Job queue unavailable: {type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+                await asyncio.sleep(self.poll_interval_s)
+
+    async def _run(self, job_id: str, kind: str, payload: bytes, params: dict) -> None:
+        async def report_progress(n: int) -> None:
+            await run_in_threadpool(self._update, job_id, progress=n, heartbeat_at=datetime.utcnow())
+
+        # Keeps a long job (video, large batch) from being taken for a crashed one and run twice
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(job_id))
+        try:
+            try:
+                result = await self.handlers[kind](payload, params, report_progress)
+            finally:
+                heartbeat.cancel()
+        except QueueFullError:
+            # Synchronous traffic has the model saturated: put the job back and retry later
+            await run_in_threadpool(self._release, job_id)
+            await asyncio.sleep(INFERENCE_RETRY_AFTER_S)
+        except asyncio.CancelledError:
+            # Off the event loop, and shielded so the job is re-queued even if stop() cancels again
+            await asyncio.shield(run_in_threadpool(self._release, job_id))
+            raise
+        except Exception as e:
+            await run_in_threadpool(self._finish, job_id, None, str(e) or type(e).__name__)
+        else:
+            await run_in_threadpool(self._finish, job_id, result)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(max(self.poll_interval_s, self.stale_after_s / 3))
+            try:
+                await run_in_threadpool(self._update, job_id, heartbeat_at=datetime.utcnow())
+            except Exception as e:
+                print(f"⚠️  Job {job_id}: heartbeat failed ({type(e).__name__})")
+
+
+job_queue = JobQueue(
+    workers=JOB_WORKERS,
+    poll_interval_s=JOB_POLL_INTERVAL_S,
+    max_queued=JOB_MAX_QUEUED,
+    stale_after_s=JOB_STALE_AFTER_S,
+    retention_s=JOB_RETENTION_S,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    queued_ttl_s=JOB_QUEUED_TTL_S,
+)
@@ -0,0 +1,204 @@
+"""
+Prometheus text-format metrics for GET /metrics: per-stage inference latency, per-router request
+counts / latency, DB session time, model-load time and inference queue depth.
+
+Self-contained (no client library): an observation is one bisect and a locked increment, about
+2 µs per timed stage against tens of milliseconds for a forward pass.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Last value set, or read from fn() at scrape time (e.g. queue depth)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self.fn = fn
+        self._value: Optional[float] = None
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def _samples(self) -> List[str]:
+        value = self.fn() if self.fn is not None else self._value
+        return [] if value is None else [f"{self.name} {float(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [per-bucket counts (last = +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labelvalues: str) -> "_Timer":
+        """with histogram.time("label"): ... observes the elapsed seconds."""
+        return _Timer(self, labelvalues)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+        lines = []
+        for labelvalues, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram: Histogram, labelvalues: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format (version 0.0.4)."""
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+# Inference pipeline (decode / preprocess per image; forward / imt per batched forward pass)
+STAGE_SECONDS = Histogram(
+    "strokelink_inference_stage_seconds",
+    "Time per inference stage: decode, preprocess (per image); forward, imt (per batch)",
+    labelnames=("stage",),
+)
+BATCH_SIZE = Histogram(
+    "strokelink_inference_batch_size",
+    "Images per batched forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+MODEL_LOAD_SECONDS = Gauge("strokelink_model_load_seconds", "Time the last model load took")
+PREPROCESS_OVER_BUDGET = Counter(
+    "strokelink_preprocess_over_budget_total", "Images whose preprocessing took longer than PREPROCESS_BUDGET_MS"
+)
+
+# HTTP + database
+REQUESTS = Counter(
+    "strokelink_http_requests_total", "HTTP requests by router, method and status code", ("router", "method", "status")
+)
+REQUEST_SECONDS = Histogram("strokelink_http_request_seconds", "HTTP request latency by router", ("router",))
+DB_SESSION_SECONDS = Histogram("strokelink_db_session_seconds", "Lifetime of a get_db session (open to close)")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request count and latency per router (the route's first tag: auth, patients,
+    scans, predict, jobs; untagged routes use their path, unmatched requests "unmatched").
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            if route is None:
+                router = "unmatched"
+            else:
+                tags = getattr(route, "tags", None)
+                router = str(tags[0]) if tags else getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, router)
+            REQUESTS.inc(router, scope["method"], str(status_code))
@@ -2,5 +2,6 @@ from backend.models.user import User
 from backend.models.patient import Patient
 from backend.models.scan import Scan
 from backend.models.result import Result
+from backend.models.job import InferenceJob
 
-__all__ = ["User", "Patient", "Scan", "Result"]
+__all__ = ["User", "Patient", "Scan", "Result", "InferenceJob"]
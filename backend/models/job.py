@@ -0,0 +1,23 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, Text
+
+from backend.database import Base
+
+
+class InferenceJob(Base):
+    """Queued /predict work (async_job=true). The upload is kept only until a worker has processed it."""
+    __tablename__ = "inference_jobs"
+
+    id = Column(String(36), primary_key=True)
+    kind = Column(String(20), nullable=False)  # "image", "batch", "video"
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, done, failed
+    payload = Column(LargeBinary, nullable=True)  # Upload bytes; set to NULL once processed (privacy)
+    params = Column(Text)  # JSON: filename / frame names, endpoint options
+    result = Column(Text, nullable=True)  # JSON response body of the equivalent synchronous call
+    error = Column(Text, nullable=True)
+    progress = Column(Integer, default=0)  # Frames analysed so far
+    attempts = Column(Integer, default=0)  # Times a worker claimed the job; failed at JOB_MAX_ATTEMPTS stale runs
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # Refreshed while a worker runs the job; staleness is measured from it
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,146 @@
+"""
+On-demand profiling of the /predict path, safe to leave enabled in production.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is picked by PROFILE_SAMPLE_RATE.
+It then runs decode + preprocess + predict_imt_batch unbatched and uncached (so the profile shows the real
+work) under cProfile and torch.profiler, in one of the micro-batcher's worker slots (batcher.run_exclusive),
+so it counts against INFERENCE_WORKERS and is shed with 503 like other predictions. At most one request is
+profiled at a time; others go through the batcher as usual. Artifacts go to PROFILE_DIR/<id>/ and are listed by GET /profiles/{id}:
+  summary.json        stage timings, top operators (torch) and top Python functions (cProfile)
+  cprofile.pstats     `snakeviz cprofile.pstats` / `python -m pstats`
+  trace.json          Chrome trace: chrome://tracing or https://ui.perfetto.dev
+  stacks.txt          collapsed stacks (self CPU µs) for flamegraph.pl / speedscope
+
+🔒 PRIVACY: only timings and code locations are written, never image data.
+"""
+import cProfile
+import json
+import pstats
+import random
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import torch
+from torch.profiler import ProfilerActivity, profile, record_function
+
+from backend.config import PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE_RATE, PROFILE_TOKEN
+from backend.inference import DEFAULT_SPACING_MM_PER_PIXEL, INFERENCE_BACKEND, predict_imt_batch, preprocess_image
+
+ARTIFACTS = ("summary.json", "cprofile.pstats", "trace.json", "stacks.txt")
+TOP_N = 25
+
+_busy = threading.Lock()
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    """X-Profile header matching PROFILE_TOKEN (disabled when the token is unset), or a random sample."""
+    if PROFILE_TOKEN and header_value == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def profile_dir(profile_id: str) -> Optional[Path]:
+    """Directory of a stored profile; None if it does not exist (or the id is not a plain name)."""
+    if not profile_id or Path(profile_id).name != profile_id:
+        return None
+    path = Path(PROFILE_DIR) / profile_id
+    return path if path.is_dir() else None
+
+
+def _torch_profiler() -> profile:
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    kwargs = {}
+    # Python stacks on operator events are what export_stacks() needs for flame graphs
+    experimental_config = getattr(torch.profiler, "_ExperimentalConfig", None)
+    if experimental_config is not None:
+        kwargs["experimental_config"] = experimental_config(verbose=True)
+    return profile(activities=activities, record_shapes=True, with_stack=True, **kwargs)
+
+
+def _top_operators(prof: profile) -> List[Dict]:
+    events = sorted(prof.key_averages(), key=lambda e: e.self_cpu_time_total, reverse=True)[:TOP_N]
+    return [
+        {
+            "name": e.key,
+            "calls": e.count,
+            "self_cpu_ms": round(e.self_cpu_time_total / 1000.0, 3),
+            "cpu_total_ms": round(e.cpu_time_total / 1000.0, 3),
+        }
+        for e in events
+    ]
+
+
+def _top_functions(stats: pstats.Stats) -> List[Dict]:
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:TOP_N]
+    return [
+        {
+            "function": f"{Path(filename).name}:{line}({name})",
+            "calls": nc,
+            "total_ms": round(tt * 1000.0, 3),
+            "cumulative_ms": round(ct * 1000.0, 3),
+        }
+        for (filename, line, name), (_, nc, tt, ct, _) in rows
+    ]
+
+
+def _prune() -> None:
+    dirs = sorted((p for p in Path(PROFILE_DIR).iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime)
+    for old in dirs[: max(0, len(dirs) - PROFILE_KEEP)]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def profile_prediction(
+    image_bytes: bytes, spacing_mm_per_pixel: float = DEFAULT_SPACING_MM_PER_PIXEL, stats: bool = False
+) -> Optional[Tuple[dict, str]]:
+    """
+    Run one prediction under cProfile + torch.profiler: (result, profile_id).
+    None (nothing run) when another profile is already running; the caller predicts normally instead.
+    """
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+        out = Path(PROFILE_DIR) / profile_id
+        out.mkdir(parents=True, exist_ok=True)
+
+        py_prof = cProfile.Profile()
+        with _torch_profiler() as torch_prof:
+            py_prof.enable()
+            try:
+                t0 = time.perf_counter()
+                with record_function("preprocess_image"):
+                    img_tensor = preprocess_image(image_bytes)
+                t1 = time.perf_counter()
+                with record_function("predict_imt_batch"):
+                    result = predict_imt_batch(img_tensor, [spacing_mm_per_pixel], stats=stats)[0]
+                t2 = time.perf_counter()
+            finally:
+                py_prof.disable()
+        stages = {"preprocess_ms": round((t1 - t0) * 1000.0, 3), "predict_ms": round((t2 - t1) * 1000.0, 3)}
+
+        py_prof.dump_stats(str(out / "cprofile.pstats"))
+        torch_prof.export_chrome_trace(str(out / "trace.json"))
+        try:
+            torch_prof.export_stacks(str(out / "stacks.txt"), "self_cpu_time_total")
+        except Exception as e:
+            print(f"⚠️  Profile {profile_id}: no stack export ({e})")
+        summary = {
+            "id": profile_id,
+            "backend": INFERENCE_BACKEND,
+            "stages": stages,
+            "top_operators": _top_operators(torch_prof),
+            "top_functions": _top_functions(pstats.Stats(py_prof)),
+            "artifacts": [name for name in ARTIFACTS if (out / name).exists() or name == "summary.json"],
+        }
+        with open(out / "summary.json", "w") as f:
+            json.dump(summary, f, indent=2)
+        _prune()
+        return result, profile_id
+    finally:
+        _busy.release()
@@ -0,0 +1,123 @@
+"""
+Post-training INT8 quantization of the Swin-UNETR checkpoint, with an accuracy guardrail.
+
+Dynamic quantization of the Linear layers (Swin attention + MLP, the bulk of the weights); activations
+stay float. The float and INT8 models are run on frames under data/ and compared on what the clinic
+sees: IMT (carotid.imt_utils.imt_mae_mm) and mask Dice. The INT8 checkpoint is written next to the
+float one (<stem>_int8.pt, served with MODEL_QUANTIZED=1) only if the drift is within tolerance.
+
+Run from project root:
+    python -m backend.quantize_model --checkpoint models/carotid_swin_unetr_2d.pt --max_imt_mae_mm 0.02 --min_dice 0.98
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import io
+import json
+import resource
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import torch
+
+from carotid.imt_utils import imt_mae_mm
+from backend.export_model import load_eager, preprocess_files
+from backend.inference import (
+    DEFAULT_SPACING_MM_PER_PIXEL,
+    MODEL_PATH,
+    quantize_dynamic_int8,
+    quantized_checkpoint_path,
+)
+
+
+def serialized_size_mb(net: torch.nn.Module) -> float:
+    buf = io.BytesIO()
+    torch.save(net.state_dict(), buf)
+    return buf.getbuffer().nbytes / 1e6
+
+
+def predict_masks(net: torch.nn.Module, x: torch.Tensor, batch_size: int) -> tuple:
+    """Argmax masks (N, H, W) and per-image latency (ms) over x in chunks of batch_size."""
+    masks = []
+    t0 = time.perf_counter()
+    with torch.inference_mode():
+        for i in range(0, x.shape[0], batch_size):
+            masks.append(net(x[i : i + batch_size]).argmax(dim=1).numpy())
+    ms_per_image = (time.perf_counter() - t0) * 1000.0 / x.shape[0]
+    return np.concatenate(masks, axis=0), ms_per_image
+
+
+def mean_dice(a: np.ndarray, b: np.ndarray, label: int = 1) -> float:
+    """Mean foreground Dice between two (N, H, W) mask stacks (1.0 where both are empty)."""
+    fa, fb = a == label, b == label
+    inter = (fa & fb).sum(axis=(1, 2))
+    denom = fa.sum(axis=(1, 2)) + fb.sum(axis=(1, 2))
+    dice = np.where(denom > 0, 2.0 * inter / np.maximum(denom, 1), 1.0)
+    return float(dice.mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 dynamic quantization with IMT / Dice guardrail")
+    parser.add_argument("--checkpoint", type=str, default=str(MODEL_PATH))
+    parser.add_argument("--images", type=str, default="data/Common Carotid Artery Ultrasound Images/US images/*.png")
+    parser.add_argument("--n_images", type=int, default=64)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--spacing_mm", type=float, default=DEFAULT_SPACING_MM_PER_PIXEL)
+    parser.add_argument("--max_imt_mae_mm", type=float, default=0.02, help="Max IMT drift vs float model")
+    parser.add_argument("--min_dice", type=float, default=0.98, help="Min mask Dice vs float model")
+    parser.add_argument("--force", action="store_true", help="Write the INT8 checkpoint even if the guardrail fails")
+    parser.add_argument("--report", type=str, default=None, help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    checkpoint = Path(args.checkpoint)
+    if not checkpoint.exists():
+        raise SystemExit(f"Checkpoint not found: {checkpoint}")
+    paths = sorted(glob.glob(args.images))[: args.n_images]
+    if not paths:
+        raise SystemExit(f"No evaluation images match {args.images}")
+    # The checkpoint's own preprocessing: the model under evaluation may not be the one the API serves
+    x = preprocess_files(checkpoint, paths)
+
+    float_net = load_eager(checkpoint)
+    float_masks, float_ms = predict_masks(float_net, x, args.batch_size)
+    float_size = serialized_size_mb(float_net)
+    rss_float_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    int8_net = quantize_dynamic_int8(float_net)
+    int8_masks, int8_ms = predict_masks(int8_net, x, args.batch_size)
+    int8_size = serialized_size_mb(int8_net)
+    rss_peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    imt_mae = imt_mae_mm(int8_masks, float_masks, args.spacing_mm, lumen_label=1, wall_label=1)
+    dice = mean_dice(int8_masks, float_masks)
+    passed = bool(np.isfinite(imt_mae) and imt_mae <= args.max_imt_mae_mm and dice >= args.min_dice)
+
+    report: Dict = {
+        "n_images": len(paths),
+        "float": {"ms_per_image": round(float_ms, 2), "size_mb": round(float_size, 2)},
+        "int8": {"ms_per_image": round(int8_ms, 2), "size_mb": round(int8_size, 2)},
+        "peak_rss_mb": {"after_float": round(rss_float_mb, 1), "after_int8": round(rss_peak_mb, 1)},
+        "imt_mae_mm_vs_float": None if not np.isfinite(imt_mae) else round(float(imt_mae), 4),
+        "dice_vs_float": round(dice, 4),
+        "guardrail": {"max_imt_mae_mm": args.max_imt_mae_mm, "min_dice": args.min_dice, "passed": passed},
+    }
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not passed and not args.force:
+        raise SystemExit("Guardrail failed: INT8 checkpoint not written (use --force to override)")
+    state = torch.load(checkpoint, map_location="cpu")
+    meta = {k: v for k, v in state.items() if k != "model"} if "model" in state else {}
+    out_path = quantized_checkpoint_path(checkpoint)
+    torch.save({**meta, "model": int8_net.state_dict(), "quantization": "dynamic_int8", "quantization_report": report}, out_path)
+    print(f"INT8 checkpoint written to {out_path} (serve with MODEL_QUANTIZED=1)")
+
+
+if __name__ == "__main__":
+    main()
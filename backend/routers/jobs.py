@@ -0,0 +1,64 @@
+"""Async inference jobs: status polling and server-sent events. Jobs are created by /predict* with async_job=true."""
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from backend.config import JOB_POLL_INTERVAL_S
+from backend.jobs import FINISHED, job_queue
+from backend.schemas.job import JobResponse
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# SSE comment line sent when nothing changed for a while, so proxies keep the connection open
+_KEEPALIVE_S = 15.0
+
+
+async def _get_job_or_404(job_id: str) -> dict:
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Job status; result holds the response of the synchronous endpoint once status is "done"."""
+    return await _get_job_or_404(job_id)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-sent events for one job: an event (named after the status) each time status or progress changes,
+    data = the job as in GET /jobs/{id}. The stream ends after the "done" or "failed" event.
+    """
+    await _get_job_or_404(job_id)
+
+    async def stream():
+        last = None
+        quiet_s = 0.0
+        while True:
+            job = await run_in_threadpool(job_queue.get, job_id)
+            if job is None:
+                yield "event: failed\ndata: {\"error\": \"Job not found\"}\n\n"
+                return
+            state = (job["status"], job["progress"])
+            if state != last:
+                last, quiet_s = state, 0.0
+                data = JobResponse(**job).model_dump_json()
+                yield f"event: {job['status']}\ndata: {data}\n\n"
+            elif quiet_s >= _KEEPALIVE_S:
+                quiet_s = 0.0
+                yield ": keep-alive\n\n"
+            if job["status"] in FINISHED or await request.is_disconnected():
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL_S)
+            quiet_s += JOB_POLL_INTERVAL_S
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
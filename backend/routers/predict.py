@@ -0,0 +1,455 @@
+"""Swin-UNETR IMT prediction: single image, multi-frame batch and cine-loop uploads. Images processed in-memory only."""
+import asyncio
+import io
+import os
+import tempfile
+import zipfile
+from contextlib import suppress
+from pathlib import Path, PurePath
+from typing import Annotated, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from fastapi import APIRouter, File, Header, HTTPException, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from backend.config import (
+    INFERENCE_RETRY_AFTER_S,
+    PREDICT_BATCH_MAX_FILES,
+    PREDICT_BATCH_MAX_UNZIPPED_MB,
+    VIDEO_MAX_FRAMES,
+    VIDEO_MAX_UPLOAD_MB,
+    VIDEO_SKIP_THRESHOLD,
+)
+from backend.cache import CACHED_FIELDS, cache_key, result_cache
+from backend.inference import (
+    DEFAULT_SPACING_MM_PER_PIXEL,
+    IMT_STATS_FIELDS,
+    model_version,
+    preprocess_array,
+    preprocess_image,
+    risk_level_from_imt,
+)
+from backend.jobs import job_queue
+from backend.profiling import profile_prediction, should_profile
+from backend.scheduler import QueueFullError, batcher
+from backend.schemas.job import JobResponse
+from backend.schemas.prediction import (
+    BatchAggregate,
+    BatchPredictionItem,
+    BatchPredictionResponse,
+    PredictionResponse,
+    VideoAggregate,
+    VideoFramePrediction,
+    VideoPredictionResponse,
+)
+from backend.video import TIFF_EXTS, FrameStream, frame_rate
+
+router = APIRouter(prefix="/predict", tags=["predict"])
+
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+
+def server_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server busy, retry shortly",
+        headers={"Retry-After": str(INFERENCE_RETRY_AFTER_S)},
+    )
+
+
+async def _enqueue(kind: str, payload: bytes, params: dict) -> JSONResponse:
+    """Queue the upload as an async job: 202 with the job, Location points at GET /jobs/{id}."""
+    try:
+        job = await job_queue.enqueue(kind, payload, params)
+    except QueueFullError:
+        raise server_busy()
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=JobResponse(**job).model_dump(mode="json"),
+        headers={"Location": f"/jobs/{job['id']}"},
+    )
+
+
+ASYNC_JOB_RESPONSES = {202: {"model": JobResponse, "description": "async_job=true: queued, poll GET /jobs/{id}"}}
+
+
+@router.post("", response_model=PredictionResponse, response_model_exclude_none=True, responses=ASYNC_JOB_RESPONSES)
+async def predict(
+    response: Response,
+    file: UploadFile = File(...),
+    stats: bool = False,
+    async_job: bool = False,
+    x_profile: Annotated[str | None, Header()] = None,
+):
+    """
+    Upload ultrasound image, get IMT prediction from Swin-UNETR model.
+    With stats=true the response adds max and 75th-percentile IMT and the fraction of image columns where the
+    wall could be measured (imt_max_mm, imt_p75_mm, imt_coverage), from the same segmentation pass.
+    With async_job=true the upload is queued and a job id is returned immediately (202); the job row holds the
+    image only until it is processed, or for at most JOB_QUEUED_TTL_S if no worker picks it up.
+    Profiled requests (X-Profile header / PROFILE_SAMPLE_RATE) return X-Profile-Id; see GET /profiles/{id}.
+
+    🔒 PRIVACY: Image processed in-memory only. Image bytes are NOT stored permanently.
+    Only IMT result (metadata) is saved to database.
+    Complies with ALU data minimization requirement.
+    """
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    contents = await file.read()
+    if async_job:
+        return await _enqueue("image", contents, {"filename": file.filename, "stats": stats})
+
+    try:
+        if should_profile(x_profile):
+            # Unbatched, but in an inference worker slot so it is bounded and shed like any other prediction
+            profiled = await batcher.run_exclusive(profile_prediction, contents, DEFAULT_SPACING_MM_PER_PIXEL, stats)
+            if profiled is not None:
+                result, profile_id = profiled
+                response.headers["X-Profile-Id"] = profile_id
+                return PredictionResponse(**result)
+        return PredictionResponse(**await predict_upload(contents, stats=stats))
+    except QueueFullError:
+        raise server_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+
+async def predict_upload(
+    contents: bytes, spacing_mm_per_pixel: float = DEFAULT_SPACING_MM_PER_PIXEL, stats: bool = False
+) -> dict:
+    """
+    Cached, micro-batched prediction for one uploaded image (shared by /predict and /scans/{id}/analyze).
+    stats adds the IMT statistics fields. Raises ValueError if the image cannot be decoded, QueueFullError
+    when the inference queue is full.
+    """
+    # Hash + cache lookup + decode off the event loop; a re-submitted frame skips the model
+    frame = await run_in_threadpool(_prepare, contents, spacing_mm_per_pixel, stats)
+    if frame["error"] is not None:
+        raise ValueError(frame["error"])
+    if frame["result"] is None:
+        # Concurrent uploads are grouped into one batched forward pass
+        frame["result"] = await batcher.submit((frame["tensor"], spacing_mm_per_pixel, stats))
+        result_cache.put(frame["key"], frame["result"])
+    return frame["result"]
+
+
+@job_queue.handler("image")
+async def _image_job(payload: bytes, params: dict, report_progress) -> dict:
+    prediction = await predict_upload(payload, stats=params.get("stats", False))
+    result = PredictionResponse(**prediction).model_dump(exclude_none=True)
+    await report_progress(1)
+    return result
+
+
+def _unpack_zip(contents: bytes) -> List[Tuple[str, bytes]]:
+    """
+    Image entries of a zip archive as (name, bytes), in archive order. Raises HTTPException 413 before
+    extracting anything if the archive holds more than PREDICT_BATCH_MAX_FILES images or their declared
+    uncompressed size exceeds PREDICT_BATCH_MAX_UNZIPPED_MB (zipfile never reads past the declared size).
+    """
+    max_bytes = PREDICT_BATCH_MAX_UNZIPPED_MB * 1024 * 1024
+    with zipfile.ZipFile(io.BytesIO(contents)) as zf:
+        entries = [
+            info for info in zf.infolist()
+            if not info.is_dir() and PurePath(info.filename).suffix.lower() in IMAGE_EXTS
+        ]
+        if len(entries) > PREDICT_BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"At most {PREDICT_BATCH_MAX_FILES} frames per request")
+        if sum(info.file_size for info in entries) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Zip images larger than {PREDICT_BATCH_MAX_UNZIPPED_MB} MB uncompressed")
+        return [(info.filename, zf.read(info)) for info in entries]
+
+
+@router.get("/cache")
+def cache_stats():
+    """Result-cache counters (hits, misses, entries). The cache holds results only, never images."""
+    return result_cache.stats()
+
+
+def _prepare(
+    contents: bytes, spacing_mm_per_pixel: float = DEFAULT_SPACING_MM_PER_PIXEL, stats: bool = False
+) -> dict:
+    """
+    One frame ready for the batcher: {"key", "result", "tensor", "error"}.
+    result is set on a cache hit (no decode needed), tensor otherwise; error if the image cannot be decoded.
+    A cached result without IMT statistics is a miss when stats are requested; cached statistics are dropped
+    when they are not.
+    """
+    frame = {"key": None, "result": None, "tensor": None, "error": None}
+    frame["key"] = cache_key(contents, spacing_mm_per_pixel, model_version())
+    cached = result_cache.get(frame["key"], required=CACHED_FIELDS + IMT_STATS_FIELDS if stats else CACHED_FIELDS)
+    if cached is not None:
+        frame["result"] = cached if stats else {k: v for k, v in cached.items() if k not in IMT_STATS_FIELDS}
+    if frame["result"] is None:
+        try:
+            frame["tensor"] = preprocess_image(contents)
+        except Exception as e:
+            frame["error"] = str(e)
+    return frame
+
+
+@router.post("/batch", response_model=BatchPredictionResponse, responses=ASYNC_JOB_RESPONSES)
+async def predict_batch(files: List[UploadFile] = File(...), async_job: bool = False):
+    """
+    Upload many frames of one patient (image files and/or a zip of images) in a single request.
+    Frames are decoded in parallel and run through the model as stacked batches.
+    Returns per-frame predictions plus a patient-level aggregate (median / max IMT).
+    With async_job=true the frames are queued and a job id is returned immediately (202).
+
+    🔒 PRIVACY: Frames processed in-memory only, same as POST /predict.
+    """
+    # (filename, bytes or None, error) in upload order
+    frames: List[Tuple[str, bytes | None, str | None]] = []
+    for file in files:
+        name = file.filename or f"frame_{len(frames)}"
+        contents = await file.read()
+        if file.content_type in ZIP_CONTENT_TYPES or name.lower().endswith(".zip"):
+            try:
+                frames.extend((n, c, None) for n, c in await run_in_threadpool(_unpack_zip, contents))
+            except zipfile.BadZipFile:
+                frames.append((name, None, "Invalid zip archive"))
+        elif file.content_type and file.content_type.startswith("image/"):
+            frames.append((name, contents, None))
+        else:
+            frames.append((name, None, "File must be an image or zip"))
+
+    if len(frames) > PREDICT_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {PREDICT_BATCH_MAX_FILES} frames per request")
+    if async_job:
+        payload = await run_in_threadpool(_pack_frames, frames)
+        return await _enqueue("batch", payload, {"frames": [[name, err] for name, _, err in frames]})
+
+    try:
+        return await run_batch(frames)
+    except QueueFullError:
+        raise server_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+
+async def run_batch(frames: List[Tuple[str, bytes | None, str | None]]) -> BatchPredictionResponse:
+    """Per-frame predictions + aggregate for [(filename, bytes or None, error), ...]. Raises QueueFullError."""
+    # Hash, cache lookup and decode in parallel on the threadpool
+    prepared: List[dict] = [{"result": None, "tensor": None, "error": err} for _, _, err in frames]
+    pending = [i for i, (_, contents, _) in enumerate(frames) if contents is not None]
+    for i, frame in zip(pending, await asyncio.gather(
+        *(run_in_threadpool(_prepare, frames[i][1]) for i in pending)
+    )):
+        prepared[i] = frame
+    todo = [i for i, frame in enumerate(prepared) if frame["tensor"] is not None]
+    predictions = await batcher.submit_many(
+        [(prepared[i]["tensor"], DEFAULT_SPACING_MM_PER_PIXEL, False) for i in todo]
+    )
+    for i, pred in zip(todo, predictions):
+        prepared[i]["result"] = pred
+        result_cache.put(prepared[i]["key"], pred)
+
+    results = [
+        BatchPredictionItem(
+            filename=name,
+            prediction=PredictionResponse(**frame["result"]) if frame["result"] is not None else None,
+            error=frame["error"],
+        )
+        for (name, _, _), frame in zip(frames, prepared)
+    ]
+    predictions = [frame["result"] for frame in prepared if frame["result"] is not None]
+
+    aggregate = None
+    if predictions:
+        imts = np.array([p["imt_mm"] for p in predictions])
+        median = float(np.median(imts))
+        aggregate = BatchAggregate(
+            n_frames=len(predictions),
+            imt_median_mm=round(median, 2),
+            imt_max_mm=round(float(imts.max()), 2),
+            risk_level=risk_level_from_imt(median),
+        )
+    return BatchPredictionResponse(results=results, aggregate=aggregate)
+
+
+def _pack_frames(frames: List[Tuple[str, bytes | None, str | None]]) -> bytes:
+    """Frame bytes of a batch as one uncompressed zip (entry i = frame i) for the job payload."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for i, (_, contents, _) in enumerate(frames):
+            if contents is not None:
+                zf.writestr(f"{i:05d}", contents)
+    return buf.getvalue()
+
+
+@job_queue.handler("batch")
+async def _batch_job(payload: bytes, params: dict, report_progress) -> dict:
+    with zipfile.ZipFile(io.BytesIO(payload)) as zf:
+        stored = set(zf.namelist())
+        frames = [
+            (name, zf.read(f"{i:05d}") if f"{i:05d}" in stored else None, err)
+            for i, (name, err) in enumerate(params["frames"])
+        ]
+    response = await run_batch(frames)
+    await report_progress(response.aggregate.n_frames if response.aggregate else 0)
+    return response.model_dump()
+
+
+VIDEO_CONTENT_TYPES = ("image/tiff", "image/gif")
+_SPOOL_CHUNK_BYTES = 1 << 20
+
+
+def _next_frames(frames: Iterator, n: int) -> List[Tuple[int, object]]:
+    """Decode + preprocess up to n more frames of the stream: [(frame_index, tensor), ...]."""
+    chunk = []
+    for index, frame in frames:
+        chunk.append((index, preprocess_array(frame)))
+        if len(chunk) >= n:
+            break
+    return chunk
+
+
+@router.post("/video", response_model=VideoPredictionResponse, responses=ASYNC_JOB_RESPONSES)
+async def predict_video(
+    file: UploadFile = File(...),
+    skip_similar: bool = True,
+    frame_stride: int = 1,
+    async_job: bool = False,
+):
+    """
+    Upload a cine loop (video, or multi-frame TIFF / GIF) and get a per-frame IMT series plus a clip-level
+    aggregate (median, max and end-diastolic IMT).
+
+    Frames are decoded as a stream and sent to the model one batch at a time, so memory stays bounded
+    regardless of clip length; at most VIDEO_MAX_FRAMES frames are analysed (truncated=true beyond that).
+    skip_similar drops frames nearly identical to the previous analysed one (e.g. frozen or paused loops);
+    frame_stride analyses every n-th frame. With async_job=true the clip is queued and a job id is returned
+    immediately (202).
+
+    🔒 PRIVACY: The clip is spooled to a temporary file only because video decoders need a seekable file;
+    it is deleted before the response is sent. Only IMT results leave this endpoint.
+    """
+    content_type = file.content_type or ""
+    if not (content_type.startswith("video/") or content_type in VIDEO_CONTENT_TYPES):
+        raise HTTPException(status_code=400, detail="File must be a video or multi-frame image")
+    suffix = _clip_suffix(file.filename, content_type)
+
+    if async_job:
+        contents = await file.read(VIDEO_MAX_UPLOAD_MB * 1024 * 1024 + 1)
+        if len(contents) > VIDEO_MAX_UPLOAD_MB * 1024 * 1024:
+            raise HTTPException(status_code=413, detail=f"Clip larger than {VIDEO_MAX_UPLOAD_MB} MB")
+        params = {"filename": file.filename, "suffix": suffix, "skip_similar": skip_similar, "frame_stride": frame_stride}
+        return await _enqueue("video", contents, params)
+
+    fd, tmp_name = tempfile.mkstemp(prefix="cine_", suffix=suffix)
+    path = Path(tmp_name)
+    try:
+        size = 0
+        with os.fdopen(fd, "wb") as tmp:
+            while data := await file.read(_SPOOL_CHUNK_BYTES):
+                size += len(data)
+                if size > VIDEO_MAX_UPLOAD_MB * 1024 * 1024:
+                    raise HTTPException(status_code=413, detail=f"Clip larger than {VIDEO_MAX_UPLOAD_MB} MB")
+                await run_in_threadpool(tmp.write, data)
+        try:
+            return await analyze_clip(path, skip_similar, frame_stride)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except QueueFullError:
+            raise server_busy()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+    finally:
+        with suppress(OSError):
+            path.unlink()
+
+
+def _clip_suffix(filename: Optional[str], content_type: str) -> str:
+    """File extension for the spooled clip; decoders pick the container / TIFF reader from it."""
+    suffix = PurePath(filename or "").suffix.lower() or (".tif" if content_type == "image/tiff" else ".mp4")
+    if content_type == "image/tiff" and suffix not in TIFF_EXTS:
+        suffix = ".tif"
+    return suffix
+
+
+async def analyze_clip(
+    path: Path,
+    skip_similar: bool = True,
+    frame_stride: int = 1,
+    report_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> VideoPredictionResponse:
+    """
+    Per-frame IMT series + aggregate for a clip on disk. Raises ValueError if it cannot be decoded,
+    QueueFullError when the inference queue is full. report_progress(n) is awaited after each chunk.
+    """
+    stream = FrameStream(path, stride=frame_stride, skip_threshold=VIDEO_SKIP_THRESHOLD if skip_similar else 0.0)
+    frames = iter(stream)
+    pending = None
+    fps = await run_in_threadpool(frame_rate, path)
+    series: List[VideoFramePrediction] = []
+    truncated = False
+    try:
+        # Decode the next chunk while the current one is in the model: at most two chunks in memory
+        pending = asyncio.ensure_future(run_in_threadpool(_next_frames, frames, batcher.max_batch_size))
+        while True:
+            chunk = await pending
+            pending = None
+            if not chunk:
+                break
+            room = VIDEO_MAX_FRAMES - len(series)
+            truncated = len(chunk) > room
+            chunk = chunk[:room]
+            if not truncated:
+                pending = asyncio.ensure_future(run_in_threadpool(_next_frames, frames, batcher.max_batch_size))
+            if chunk:
+                predictions = await batcher.submit_many([(t, DEFAULT_SPACING_MM_PER_PIXEL, False) for _, t in chunk])
+                series.extend(
+                    VideoFramePrediction(frame_index=index, **pred) for (index, _), pred in zip(chunk, predictions)
+                )
+                if report_progress is not None:
+                    await report_progress(len(series))
+            if truncated:
+                break
+    finally:
+        if pending is not None:
+            # Let an in-flight decode finish before the file goes away
+            with suppress(Exception):
+                await pending
+        frames.close()  # releases the decoder
+
+    if stream.n_decoded == 0:
+        raise ValueError("No frames could be decoded")
+
+    aggregate = None
+    if series:
+        imts = np.array([f.imt_mm for f in series])
+        median = float(np.median(imts))
+        ed = min(series, key=lambda f: f.foreground_prob)
+        aggregate = VideoAggregate(
+            n_frames=len(series),
+            imt_median_mm=round(median, 2),
+            imt_max_mm=round(float(imts.max()), 2),
+            imt_end_diastolic_mm=ed.imt_mm,
+            end_diastolic_frame=ed.frame_index,
+            risk_level=risk_level_from_imt(median),
+        )
+    return VideoPredictionResponse(
+        fps=fps,
+        n_frames_decoded=stream.n_decoded,
+        n_frames_skipped=stream.n_skipped,
+        truncated=truncated,
+        frames=series,
+        aggregate=aggregate,
+    )
+
+
+@job_queue.handler("video")
+async def _video_job(payload: bytes, params: dict, report_progress) -> dict:
+    fd, tmp_name = tempfile.mkstemp(prefix="cine_", suffix=params.get("suffix", ".mp4"))
+    path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            await run_in_threadpool(tmp.write, payload)
+        response = await analyze_clip(path, params.get("skip_similar", True), params.get("frame_stride", 1), report_progress)
+        return response.model_dump()
+    finally:
+        with suppress(OSError):
+            path.unlink()
@@ -0,0 +1,37 @@
+"""Stored /predict request profiles (see backend.profiling). Requires X-Profile: <PROFILE_TOKEN>."""
+import json
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+
+from backend.config import PROFILE_TOKEN
+from backend.profiling import ARTIFACTS, profile_dir
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+def _check_token(x_profile: str | None) -> None:
+    if not PROFILE_TOKEN or x_profile != PROFILE_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Profiling token required")
+
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str, x_profile: Annotated[str | None, Header()] = None):
+    """Summary of one profiled request: stage timings, top torch operators, top Python functions, artifact names."""
+    _check_token(x_profile)
+    path = profile_dir(profile_id)
+    if path is None or not (path / "summary.json").exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return await run_in_threadpool(lambda: json.loads((path / "summary.json").read_text()))
+
+
+@router.get("/{profile_id}/{artifact}")
+def get_profile_artifact(profile_id: str, artifact: str, x_profile: Annotated[str | None, Header()] = None):
+    """Download cprofile.pstats, trace.json (Chrome / Perfetto) or stacks.txt (flame graph input)."""
+    _check_token(x_profile)
+    path = profile_dir(profile_id)
+    if path is None or artifact not in ARTIFACTS or not (path / artifact).exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile artifact not found")
+    return FileResponse(path / artifact, filename=f"{profile_id}-{artifact}")
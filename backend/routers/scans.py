@@ -2,13 +2,18 @@
 from uuid import uuid4
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from backend.database import get_db
 from backend.models import User, Patient, Scan, Result
 from backend.schemas.scan import ScanCreate, ScanResponse, ResultCreate, ResultResponse
 from backend.auth import get_current_user
+from backend.inference import model_version
+from backend.routers.predict import predict_upload, server_busy
+from backend.scheduler import QueueFullError
 
 router = APIRouter(prefix="/scans", tags=["scans"])
 
@@ -106,6 +111,71 @@ def create_result(
     return result
 
 
+def _check_analyzable(scan_id: str, user_id: str, db: Session) -> None:
+    scan = _get_scan_or_404(scan_id, user_id, db)
+    if scan.result is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Scan already has a result")
+
+
+def _start_analysis(scan_id: str, user_id: str, db: Session) -> None:
+    _check_analyzable(scan_id, user_id, db)
+    # Hand the pooled connection back while the image waits for the model
+    db.close()
+
+
+def _store_analysis(scan_id: str, user_id: str, prediction: dict, db: Session) -> Result:
+    # Re-check: the scan may have been deleted or analysed by a concurrent request meanwhile
+    _check_analyzable(scan_id, user_id, db)
+    result = Result(
+        id=str(uuid4()),
+        scan_id=scan_id,
+        imt_mm=prediction["imt_mm"],
+        risk_level=prediction["risk_level"],
+        is_high_risk=prediction["risk_level"] == "High",
+        model_version=model_version(),
+    )
+    db.add(result)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Scan already has a result")
+    db.refresh(result)
+    return result
+
+
+@router.post("/{scan_id}/analyze", response_model=ResultResponse, status_code=status.HTTP_201_CREATED)
+async def analyze_scan(
+    scan_id: str,
+    db: Annotated[Session, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    file: UploadFile = File(...),
+):
+    """
+    Upload the scan image, run the Swin-UNETR model and store its Result in one call
+    (replaces POST /predict + POST /scans/results). imt_mm, risk_level and model_version are set server-side.
+
+    🔒 PRIVACY: Image processed in-memory only, same as POST /predict. Only the IMT result is saved.
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    user_id = current_user.id
+    # Sync SQLAlchemy: database steps run on the threadpool, only the prediction is awaited on the event loop
+    await run_in_threadpool(_start_analysis, scan_id, user_id, db)
+
+    contents = await file.read()
+    try:
+        prediction = await predict_upload(contents)
+    except QueueFullError:
+        raise server_busy()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+    return await run_in_threadpool(_store_analysis, scan_id, user_id, prediction, db)
+
+
 @router.get("/{scan_id}/result", response_model=ResultResponse | None)
 def get_scan_result(
     scan_id: str,
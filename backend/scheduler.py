@@ -0,0 +1,195 @@
+"""Micro-batching scheduler: groups concurrent /predict requests into one batched Swin-UNETR forward pass."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import torch
+
+from backend.config import (
+    INFERENCE_MAX_BATCH_SIZE,
+    INFERENCE_MAX_WAIT_MS,
+    INFERENCE_QUEUE_SIZE,
+    INFERENCE_WORKERS,
+)
+from backend.inference import predict_imt_batch
+from backend.metrics import Gauge
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit() when the wait queue is full; callers should shed load (HTTP 503)."""
+
+
+class _Exclusive(NamedTuple):
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...]
+
+
+class MicroBatcher:
+    """
+    Collect items submitted within a short window and run them through batch_fn together.
+    A batch is flushed once it holds max_batch_size items or max_wait_ms after its first item arrived.
+    batch_fn(items) -> results (same order); it runs on a dedicated thread pool of max_concurrency workers,
+    so the event loop (and every CRUD route) stays responsive while a forward pass runs.
+    At most max_queue_size items may wait for a worker; further submits fail fast with QueueFullError.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_concurrency: int = 1,
+        max_queue_size: int = 32,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue_size = max(1, max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="inference")
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self._held: List[Tuple[Any, asyncio.Future]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Items waiting for a worker (not yet in a running batch)."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """Start the collector task on the running event loop (no-op if already running there)."""
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and not self._worker.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._held = []
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._worker = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the collector task, let running batches finish, fail requests still waiting in the queue."""
+        if self._worker is not None:
+            self._worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        while self._held or (self._queue is not None and not self._queue.empty()):
+            _, fut = self._held.pop() if self._held else self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result from the next batch. Raises QueueFullError when saturated."""
+        self.start()
+        fut = self._loop.create_future()
+        try:
+            self._queue.put_nowait((item, fut))
+        except asyncio.QueueFull:
+            raise QueueFullError("Inference queue is full") from None
+        return await fut
+
+    async def submit_many(self, items: Sequence[Any]) -> List[Any]:
+        """
+        Queue several items (e.g. all frames of one upload) and wait for all results.
+        Fails fast only if the queue is already full; otherwise waits for space, so a large
+        upload applies backpressure instead of being rejected for exceeding max_queue_size.
+        """
+        self.start()
+        if self._queue.full():
+            raise QueueFullError("Inference queue is full")
+        futs = []
+        for item in items:
+            fut = self._loop.create_future()
+            futs.append(fut)
+            await self._queue.put((item, fut))
+        return list(await asyncio.gather(*futs))
+
+    async def run_exclusive(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Queue fn(*args) to run on its own, in place of one batch, for work that must not be batched (a
+        profiled request). It waits in the same queue, takes a worker slot like a batch does and fails fast
+        with QueueFullError when saturated, so it is bounded and load-shed like any other prediction.
+        """
+        return await self.submit(_Exclusive(fn, args))
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [self._held.pop() if self._held else await self._queue.get()]
+        if isinstance(batch[0][0], _Exclusive):
+            return batch
+        deadline = self._loop.time() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                entry = self._queue.get_nowait()
+            else:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if isinstance(entry[0], _Exclusive):
+                # Runs alone, as the next batch
+                self._held.append(entry)
+                break
+            batch.append(entry)
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            # Wait for a free worker first so the batch keeps filling while all workers are busy
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = self._loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            # Drop requests whose client already went away
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                return
+            items = [item for item, _ in batch]
+            try:
+                if isinstance(items[0], _Exclusive):
+                    results = [await self._loop.run_in_executor(self._executor, items[0].fn, *items[0].args)]
+                else:
+                    results = await self._loop.run_in_executor(self._executor, self.batch_fn, items)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+        finally:
+            self._slots.release()
+
+
+def _predict_batch(items: List[Tuple[torch.Tensor, float, bool]]) -> List[dict]:
+    """items: [(img_tensor (1, 1, H, W), spacing_mm_per_pixel, stats), ...]."""
+    tensors, spacings, stats = zip(*items)
+    return predict_imt_batch(torch.cat(tensors, dim=0), spacings, stats=stats)
+
+
+batcher = MicroBatcher(
+    _predict_batch,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    max_concurrency=INFERENCE_WORKERS,
+    max_queue_size=INFERENCE_QUEUE_SIZE,
+)
+Gauge("strokelink_inference_queue_depth", "Images waiting for an inference worker", fn=lambda: batcher.queue_depth)
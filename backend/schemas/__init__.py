@@ -1,10 +1,18 @@
 """Pydantic v2 schemas for API request/response."""
-from backend.schemas.user import UserCreate, UserResponse, Token, TokenPayload
+from backend.schemas.user import UserCreate, UserResponse
 from backend.schemas.patient import PatientCreate, PatientUpdate, PatientResponse
 from backend.schemas.scan import ScanCreate, ScanResponse, ResultCreate, ResultResponse
+from backend.schemas.prediction import (
+    PredictionResponse, BatchPredictionItem, BatchAggregate, BatchPredictionResponse,
+    VideoFramePrediction, VideoAggregate, VideoPredictionResponse,
+)
+from backend.schemas.job import JobResponse
 
 __all__ = [
-    "UserCreate", "UserResponse", "Token", "TokenPayload",
+    "UserCreate", "UserResponse",
     "PatientCreate", "PatientUpdate", "PatientResponse",
     "ScanCreate", "ScanResponse", "ResultCreate", "ResultResponse",
+    "PredictionResponse", "BatchPredictionItem", "BatchAggregate", "BatchPredictionResponse",
+    "VideoFramePrediction", "VideoAggregate", "VideoPredictionResponse",
+    "JobResponse",
 ]
@@ -0,0 +1,18 @@
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class JobResponse(BaseModel):
+    """Async inference job. result holds the body the synchronous endpoint would have returned."""
+    id: str
+    kind: str
+    status: str  # queued, running, done, failed
+    progress: int = 0  # Frames analysed so far
+    attempts: int = 0  # Times a worker has started the job
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
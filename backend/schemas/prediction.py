@@ -0,0 +1,68 @@
+from pydantic import BaseModel, model_serializer
+
+_STATS_FIELDS = ("imt_max_mm", "imt_p75_mm", "imt_coverage")
+
+
+class PredictionResponse(BaseModel):
+    imt_mm: float
+    risk_level: str
+    foreground_prob: float
+    # Only with stats=true: max / 75th-percentile IMT over the measured columns (None if no column had a
+    # measurable wall, i.e. imt_mm is the foreground-probability fallback) and fraction of columns measured
+    imt_max_mm: float | None = None
+    imt_p75_mm: float | None = None
+    imt_coverage: float | None = None
+
+    @model_serializer(mode="wrap")
+    def _omit_missing_stats(self, handler):
+        # Statistics not requested are left out (also inside batch, video and job results), not sent as null
+        data = handler(self)
+        for field in _STATS_FIELDS:
+            if data.get(field) is None:
+                data.pop(field, None)
+        return data
+
+
+class BatchPredictionItem(BaseModel):
+    filename: str
+    prediction: PredictionResponse | None = None
+    error: str | None = None
+
+
+class BatchAggregate(BaseModel):
+    """Patient-level summary across all frames that were analysed successfully."""
+    n_frames: int
+    imt_median_mm: float
+    imt_max_mm: float
+    risk_level: str
+
+
+class BatchPredictionResponse(BaseModel):
+    results: list[BatchPredictionItem]
+    aggregate: BatchAggregate | None = None
+
+
+class VideoFramePrediction(PredictionResponse):
+    frame_index: int
+
+
+class VideoAggregate(BaseModel):
+    """
+    Clip-level summary. End-diastole is taken as the analysed frame with the smallest segmented vessel
+    area (lowest foreground_prob), a proxy for minimal arterial distension when no ECG is available.
+    """
+    n_frames: int
+    imt_median_mm: float
+    imt_max_mm: float
+    imt_end_diastolic_mm: float
+    end_diastolic_frame: int
+    risk_level: str
+
+
+class VideoPredictionResponse(BaseModel):
+    fps: float | None = None
+    n_frames_decoded: int
+    n_frames_skipped: int
+    truncated: bool = False
+    frames: list[VideoFramePrediction]
+    aggregate: VideoAggregate | None = None
@@ -0,0 +1,81 @@
+"""
+Cine-loop decoding for POST /predict/video: frames are read one at a time from a spooled temp file
+(video container via cv2.VideoCapture, or multi-page TIFF page by page), so memory does not grow with clip length.
+"""
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+TIFF_EXTS = (".tif", ".tiff")
+
+# Near-duplicate check runs on a small thumbnail: cheap, and insensitive to speckle noise
+_THUMB_SIZE = (64, 64)
+
+
+def _read_frames(path: Path) -> Iterator[np.ndarray]:
+    """Decoded grayscale frames (H, W) uint8, in acquisition order."""
+    if path.suffix.lower() in TIFF_EXTS:
+        n_pages = cv2.imcount(str(path))
+        if n_pages <= 0:
+            raise ValueError("Invalid multi-frame TIFF")
+        for i in range(n_pages):
+            ok, pages = cv2.imreadmulti(str(path), start=i, count=1, flags=cv2.IMREAD_GRAYSCALE)
+            if not ok or not pages:
+                raise ValueError(f"Could not decode TIFF page {i}")
+            yield pages[0]
+        return
+
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise ValueError("Invalid or unsupported video")
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    finally:
+        cap.release()
+
+
+def frame_rate(path: Path) -> Optional[float]:
+    """Frames per second from the container header, if it has one."""
+    if path.suffix.lower() in TIFF_EXTS:
+        return None
+    cap = cv2.VideoCapture(str(path))
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0.0
+    finally:
+        cap.release()
+    return float(fps) if fps and np.isfinite(fps) else None
+
+
+class FrameStream:
+    """
+    Iterate (frame_index, frame) over a clip, keeping every `stride`-th frame and dropping frames whose
+    mean absolute difference to the last kept frame (grey levels, on a 64x64 thumbnail) is below
+    `skip_threshold` (0 keeps all). Counters are updated as the stream is consumed.
+    """
+
+    def __init__(self, path: Path, stride: int = 1, skip_threshold: float = 0.0):
+        self.path = Path(path)
+        self.stride = max(1, stride)
+        self.skip_threshold = max(0.0, skip_threshold)
+        self.n_decoded = 0
+        self.n_skipped = 0
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        last_thumb: Optional[np.ndarray] = None
+        for index, frame in enumerate(_read_frames(self.path)):
+            self.n_decoded += 1
+            if index % self.stride:
+                continue
+            if self.skip_threshold > 0:
+                thumb = cv2.resize(frame, _THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+                if last_thumb is not None and float(np.abs(thumb - last_thumb).mean()) < self.skip_threshold:
+                    self.n_skipped += 1
+                    continue
+                last_thumb = thumb
+            yield index, frame
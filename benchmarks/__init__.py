@@ -0,0 +1 @@
+# Offline benchmarks for the StrokeLink API and carotid pipeline.
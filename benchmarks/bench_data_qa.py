@@ -0,0 +1,167 @@
+"""
+Dataset QA: previous carotid.data_qa (each image and mask decoded twice, pairs walked serially) vs the
+single-decode engine (filter_and_flag_pairs), in this process and across a process pool, over the
+Common Carotid Artery Ultrasound Images set (US images/ + Expert mask images/, ~1,100 pairs).
+
+A few broken pairs (undecodable file, constant image, empty / full mask, shape mismatch, missing mask) are
+written to a temp dir and appended, so every flag path is exercised. Every run checks that (valid_pairs,
+flagged) is identical to the previous implementation.
+
+Run from project root:
+    python -m benchmarks.bench_data_qa --workers 1 4 --chunksize 16 [--json bench_data_qa.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from carotid.data_qa import check_mask_consistency, filter_and_flag_pairs
+
+DATA_DIR = Path("data/Common Carotid Artery Ultrasound Images")
+
+
+def _legacy_readable(path, kind: str, check_constant: bool) -> Tuple[bool, Optional[str]]:
+    try:
+        img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            img = cv2.imread(str(path))
+            if img is None:
+                return False, f"Failed to load {kind}"
+            img = img[:, :, 0] if img.ndim == 3 else img
+        if img.size == 0 or img.ndim != 2:
+            return False, f"Invalid shape: {getattr(img, 'shape', 'unknown')}"
+        if check_constant and np.all(img == img.flat[0]):
+            return False, "Image is constant (possibly corrupted)"
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+
+def legacy_filter_and_flag_pairs(pairs, min_coverage_pct: float = 0.001, max_coverage_pct: float = 0.95):
+    """Reference: the previous serial, double-decode implementation."""
+    valid, flagged = [], []
+    for img_path, mask_path in pairs:
+        ok, err = _legacy_readable(img_path, "image", True)
+        if not ok:
+            flagged.append({"img": img_path, "mask": mask_path, "reason": f"Image: {err}"})
+            continue
+        img = cv2.imread(str(img_path), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            img = cv2.imread(str(img_path))[:, :, 0]
+        ok, err = _legacy_readable(mask_path, "mask", False)
+        if not ok:
+            flagged.append({"img": img_path, "mask": mask_path, "reason": f"Mask: {err}"})
+            continue
+        mask = cv2.imread(str(mask_path), cv2.IMREAD_GRAYSCALE)
+        if mask is None:
+            mask = cv2.imread(str(mask_path))[:, :, 0]
+        h, w = mask.shape
+        foreground = np.sum(mask > 0)
+        coverage = foreground / (h * w)
+        if (h, w) != img.shape[:2]:
+            err = f"Mask shape {mask.shape} != image shape {img.shape[:2]}"
+        elif coverage < min_coverage_pct:
+            err = f"Mask nearly empty (coverage={coverage:.4f})"
+        elif coverage > max_coverage_pct:
+            err = f"Mask nearly full (coverage={coverage:.4f})"
+        else:
+            err = None
+        if err is None:
+            valid.append((img_path, mask_path))
+        else:
+            flagged.append({"img": img_path, "mask": mask_path, "reason": err})
+    return valid, flagged
+
+
+def dataset_pairs(limit: Optional[int]) -> List[Tuple[str, str]]:
+    images = sorted((DATA_DIR / "US images").glob("*.png"))[:limit]
+    return [(str(p), str(DATA_DIR / "Expert mask images" / p.name)) for p in images]
+
+
+def broken_pairs(tmp: Path, template: Optional[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    rng = np.random.default_rng(0)
+    img = cv2.imread(template[0], cv2.IMREAD_GRAYSCALE) if template else rng.integers(0, 256, (64, 64), dtype=np.uint8)
+    h, w = img.shape
+    files = {
+        "image.png": img,
+        "constant.png": np.full((h, w), 7, np.uint8),
+        "empty_mask.png": np.zeros((h, w), np.uint8),
+        "full_mask.png": np.full((h, w), 255, np.uint8),
+        "small_mask.png": np.full((h // 2, w // 2), 255, np.uint8),
+        "good_mask.png": (rng.random((h, w)) < 0.05).astype(np.uint8) * 255,
+        "colour.png": cv2.cvtColor(img, cv2.COLOR_GRAY2BGR),
+    }
+    for name, arr in files.items():
+        cv2.imwrite(str(tmp / name), arr)
+    (tmp / "corrupt.png").write_bytes(b"\x89PNG not really")
+    p = lambda name: str(tmp / name)  # noqa: E731
+    return [
+        (p("corrupt.png"), p("good_mask.png")),
+        (p("constant.png"), p("good_mask.png")),
+        (p("image.png"), p("corrupt.png")),
+        (p("image.png"), p("missing_mask.png")),
+        (p("image.png"), p("empty_mask.png")),
+        (p("image.png"), p("full_mask.png")),
+        (p("image.png"), p("small_mask.png")),
+        (p("colour.png"), p("good_mask.png")),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset QA: serial double-decode vs single-decode process pool")
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N dataset pairs")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, min(os.cpu_count() or 1, 8)])
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_data_qa_") as tmp:
+        pairs = dataset_pairs(args.limit)
+        pairs += broken_pairs(Path(tmp), pairs[0] if pairs else None)
+        print(f"{len(pairs)} pairs ({len(pairs) - 8} from {DATA_DIR}, 8 synthetic broken), {os.cpu_count()} CPUs")
+
+        t0 = time.perf_counter()
+        reference = legacy_filter_and_flag_pairs(pairs)
+        legacy_s = time.perf_counter() - t0
+        print(f"{'legacy serial':18s} {legacy_s:7.2f} s  {len(pairs) / legacy_s:7.1f} pairs/s  "
+              f"valid={len(reference[0])} flagged={len(reference[1])}")
+
+        rows: List[Dict] = [{"engine": "legacy", "seconds": round(legacy_s, 3), "pairs_per_s": round(len(pairs) / legacy_s, 1)}]
+        ok = True
+        for workers in dict.fromkeys(args.workers):
+            streamed: List[Dict] = []
+            t0 = time.perf_counter()
+            result = filter_and_flag_pairs(pairs, workers=workers, chunksize=args.chunksize, on_flagged=streamed.append)
+            seconds = time.perf_counter() - t0
+            parity = result == reference and streamed == result[1]
+            ok &= parity
+            rows.append({
+                "engine": f"single_decode_workers{workers}",
+                "seconds": round(seconds, 3),
+                "pairs_per_s": round(len(pairs) / seconds, 1),
+                "speedup": round(legacy_s / seconds, 2),
+                "parity": parity,
+            })
+            print(f"{'workers=' + str(workers):18s} {seconds:7.2f} s  {len(pairs) / seconds:7.1f} pairs/s  "
+                  f"x{legacy_s / seconds:.2f}  parity={'ok' if parity else 'FAIL'}")
+        for record in reference[1]:
+            print(f"  flagged: {Path(record['img']).name} / {Path(record['mask']).name}: {record['reason']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "n_pairs": len(pairs), "results": rows}, f, indent=2)
+    if not ok:
+        raise SystemExit("QA engine result differs from the previous implementation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Near-duplicate / leakage detection (carotid/dedup.py).
+
+- Search: multi-index hashing vs all-pairs Hamming comparison over the dataset's pHashes and over
+  --n_synthetic random 64-bit hashes with planted near-duplicates; the links found must be identical.
+- Leakage: for the previous random train_test_split and for dedup.grouped_split, the val frames that share an
+  acquisition with train or are within --threshold bits of a train frame. The grouped split must have none.
+
+Run from project root:
+    python -m benchmarks.bench_dedup --n_synthetic 20000 [--threshold 6] [--json bench_dedup.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from benchmarks.bench_data_qa import dataset_pairs
+from carotid.dedup import DEFAULT_THRESHOLD, acquisition_id, duplicate_links, grouped_split, image_hashes
+
+
+def brute_force_links(hashes: Sequence[int], threshold: int) -> List[Tuple[int, int, int]]:
+    """Reference: every pair compared, vectorised with numpy (popcount of XOR)."""
+    values = np.array(hashes, dtype=np.uint64)
+    links = []
+    for i in range(1, len(values)):
+        x = values[:i] ^ values[i]
+        d = np.bitwise_count(x) if hasattr(np, "bitwise_count") else np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        links.extend((int(j), i, int(d[j])) for j in np.flatnonzero(d <= threshold))
+    return sorted(links)
+
+
+def synthetic_hashes(n: int, seed: int = 0) -> List[int]:
+    """Random hashes; every 10th is a copy of an earlier one with 0-8 bits flipped."""
+    rng = np.random.default_rng(seed)
+    hashes: List[int] = []
+    for i in range(n):
+        if i and i % 10 == 0:
+            h = hashes[int(rng.integers(0, i))]
+            for bit in rng.choice(64, size=int(rng.integers(0, 9)), replace=False):
+                h ^= 1 << int(bit)
+        else:
+            h = int(rng.integers(0, 2**63)) << 1 | int(rng.integers(0, 2))
+        hashes.append(h)
+    return hashes
+
+
+def leaked(train: List[Tuple[str, str]], val: List[Tuple[str, str]], hashes: Dict[str, int], threshold: int) -> Dict:
+    train_acq = {acquisition_id(img) for img, _ in train}
+    train_hashes = [hashes[img] for img, _ in train]
+    same_acq = sum(acquisition_id(img) in train_acq for img, _ in val)
+    near = sum(
+        any((hashes[img] ^ h).bit_count() <= threshold for h in train_hashes) for img, _ in val
+    )
+    return {"val": len(val), "same_acquisition_as_train": same_acq, "near_duplicate_of_train": near}
+
+
+def _best_s(fn, repeats: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate search (multi-index hashing vs all pairs) and split leakage")
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N dataset pairs")
+    parser.add_argument("--n_synthetic", type=int, default=20000)
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    pairs = dataset_pairs(args.limit)
+    t0 = time.perf_counter()
+    dataset_hashes = image_hashes([img for img, _ in pairs])
+    hash_s = time.perf_counter() - t0
+    print(f"{len(pairs)} dataset images hashed in {hash_s:.2f} s ({os.cpu_count()} CPUs)")
+
+    rows: List[Dict] = []
+    ok = True
+    for name, hashes in (("dataset", dataset_hashes), ("synthetic", synthetic_hashes(args.n_synthetic))):
+        index_s, links = _best_s(lambda: duplicate_links(hashes, args.threshold))
+        brute_s, reference = _best_s(lambda: brute_force_links(hashes, args.threshold), repeats=1)
+        parity = links == reference
+        ok &= parity
+        rows.append({
+            "hashes": name, "n": len(hashes), "links": len(links), "multi_index_s": round(index_s, 4),
+            "all_pairs_s": round(brute_s, 4), "speedup": round(brute_s / index_s, 2), "parity": parity,
+        })
+        print(f"{name:9s} n={len(hashes):6d}  links={len(links):6d}  multi-index {index_s:7.3f} s  all pairs {brute_s:7.3f} s  "
+              f"x{brute_s / index_s:.1f}  parity={'ok' if parity else 'FAIL'}")
+
+    by_path = {img: h for (img, _), h in zip(pairs, dataset_hashes)}
+    random_train, random_val = train_test_split(pairs, test_size=0.15, random_state=args.seed)
+    split_s, (group_train, group_val, report) = _best_s(
+        lambda: grouped_split(pairs, test_size=0.15, seed=args.seed, hashes=dataset_hashes, threshold=args.threshold)
+    )
+    leakage = {
+        "random": leaked(random_train, random_val, by_path, args.threshold),
+        "grouped": leaked(group_train, group_val, by_path, args.threshold),
+    }
+    ok &= leakage["grouped"]["same_acquisition_as_train"] == 0 and leakage["grouped"]["near_duplicate_of_train"] == 0
+    for split, counts in leakage.items():
+        print(f"{split:8s} split: {counts['val']} val frames, {counts['same_acquisition_as_train']} share an acquisition "
+              f"with train, {counts['near_duplicate_of_train']} within {args.threshold} bits of a train frame")
+    print(f"grouped_split with stored hashes: {split_s * 1e3:.1f} ms, {report['groups']} groups, "
+          f"{len(report['duplicate_clusters'])} duplicate clusters ({report['cross_acquisition_clusters']} across acquisitions)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "cpu_count": os.cpu_count(), "threshold": args.threshold, "hash_s": round(hash_s, 3),
+                "search": rows, "leakage": leakage, "grouped_split_s": round(split_s, 4),
+            }, f, indent=2)
+    if not ok:
+        raise SystemExit("Multi-index links differ from the all-pairs search, or the grouped split leaks")
+
+
+if __name__ == "__main__":
+    main()
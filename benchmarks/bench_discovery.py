@@ -0,0 +1,149 @@
+"""
+Image/mask pair discovery: previous find_image_mask_pairs (rglob + up to seven Path.exists per image) vs
+carotid.discovery.discover_pairs (one os.scandir pass + name index).
+
+Synthetic trees (empty files) are written to a temp dir for each layout the previous code handled -- root
+Masks/ or Labels/ folder, <stem>_mask suffix -- plus the dataset's US images/ + Expert mask images/ layout,
+which it did not. Wherever the previous code found pairs, the result must equal the previous result (same order) apart from the
+files inside mask folders it used to pair with themselves. --data_root adds a real tree to the timings.
+
+Run from project root:
+    python -m benchmarks.bench_discovery --n_images 5000 [--data_root data] [--json bench_discovery.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from carotid.discovery import SIBLING_MASK_DIRS, discover_pairs
+
+
+def legacy_find_image_mask_pairs(root: Path, exts: Tuple[str, ...] = (".png", ".jpg", ".jpeg")) -> List[Tuple[str, str]]:
+    """Reference: the previous train_carotid.find_image_mask_pairs."""
+    root = Path(root)
+    images = [p for p in root.rglob("*") if p.suffix.lower() in exts and "mask" not in p.name.lower()]
+    pairs = []
+    for img_path in images:
+        for mask_dir in ("Masks", "masks", "Labels", "labels", "Mask", "mask"):
+            mask_path = root / mask_dir / img_path.name
+            if mask_path.exists():
+                pairs.append((str(img_path), str(mask_path)))
+                break
+        else:
+            stem, suf = img_path.stem, img_path.suffix
+            mask_path = img_path.parent / f"{stem}_mask{suf}"
+            if mask_path.exists():
+                pairs.append((str(img_path), str(mask_path)))
+    return pairs
+
+
+def _touch(path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+def make_tree(root: Path, layout: str, n_images: int) -> Dict[str, int]:
+    """Write n_images images (about 1 in 20 without a mask) plus 5 orphan masks; returns the expected counts."""
+    n_subjects = max(1, n_images // 50)
+    unmatched = 0
+    for i in range(n_images):
+        name = f"subject{i % n_subjects:03d}_slice_{i:05d}.png"
+        has_mask = i % 20 != 7
+        unmatched += not has_mask
+        if layout == "masks_dir":
+            _touch(root / "Images" / f"subject{i % n_subjects:03d}" / name)
+            if has_mask:
+                _touch(root / "Masks" / name)
+        elif layout == "mask_suffix":
+            _touch(root / f"subject{i % n_subjects:03d}" / name)
+            if has_mask:
+                _touch(root / f"subject{i % n_subjects:03d}" / name.replace(".png", "_mask.png"))
+        else:
+            dataset = root / "Common Carotid Artery Ultrasound Images"
+            _touch(dataset / "US images" / name)
+            if has_mask:
+                _touch(dataset / "Expert mask images" / name)
+    for j in range(5):
+        orphan = f"orphan_{j}.png"
+        if layout == "masks_dir":
+            _touch(root / "Masks" / orphan)
+        elif layout == "mask_suffix":
+            _touch(root / "subject000" / orphan.replace(".png", "_mask.png"))
+        else:
+            _touch(root / "Common Carotid Artery Ultrasound Images" / "Expert mask images" / orphan)
+    return {"pairs": n_images - unmatched, "unmatched_images": unmatched, "orphan_masks": 5}
+
+
+def _best_s(fn: Callable, repeats: int):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pair discovery: rglob + exists probes vs one scandir pass")
+    parser.add_argument("--n_images", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--data_root", type=str, default=None, help="Also time discovery on this real tree")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    rows: List[Dict] = []
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="bench_discovery_") as tmp:
+        trees = []
+        for layout in ("masks_dir", "mask_suffix", "expert_masks"):
+            root = Path(tmp) / layout
+            trees.append((layout, root, make_tree(root, layout, args.n_images)))
+        if args.data_root:
+            trees.append(("data_root", Path(args.data_root), None))
+
+        for layout, root, expected in trees:
+            legacy_s, legacy = _best_s(lambda: legacy_find_image_mask_pairs(root), args.repeats)
+            new_s, found = _best_s(lambda: discover_pairs(root), args.repeats)
+            counts = {k: len(found[k]) for k in ("pairs", "unmatched_images", "orphan_masks")}
+            # The previous code also paired files inside mask folders with themselves
+            legacy_kept = [
+                (img, mask) for img, mask in legacy
+                if not any(part in SIBLING_MASK_DIRS for part in Path(img).relative_to(root).parts[:-1])
+            ]
+            # Layouts the previous code found nothing in (Expert mask images/) are only checked against expected
+            parity = not legacy_kept or found["pairs"] == legacy_kept
+            if expected is not None:
+                parity &= counts == expected
+            ok &= parity
+            rows.append({
+                "layout": layout,
+                "files": found["files"],
+                "directories": found["directories"],
+                "legacy_s": round(legacy_s, 4),
+                "scandir_s": round(new_s, 4),
+                "speedup": round(legacy_s / new_s, 2),
+                "legacy_pairs": len(legacy),
+                **counts,
+                "parity": parity,
+            })
+            print(
+                f"{layout:13s} {found['files']:6d} files  legacy {legacy_s * 1e3:8.1f} ms ({len(legacy):5d} pairs)  "
+                f"scandir {new_s * 1e3:7.1f} ms ({counts['pairs']:5d} pairs, {counts['unmatched_images']} unmatched, "
+                f"{counts['orphan_masks']} orphans)  x{legacy_s / new_s:.1f}  parity={'ok' if parity else 'FAIL'}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "n_images": args.n_images, "results": rows}, f, indent=2)
+    if not ok:
+        raise SystemExit("Pair discovery differs from the previous implementation")
+
+
+if __name__ == "__main__":
+    main()
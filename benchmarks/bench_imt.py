@@ -0,0 +1,163 @@
+"""
+IMT from segmentation masks: per-column Python loop (previous carotid/imt_utils.py) vs the vectorised,
+batched engine (carotid.imt_utils.imt_mm_batch), at serving size (224x224) and native size (709x749).
+Also times imt_summary_batch (mean / max / p75 / coverage from the same pass) against the mean alone.
+
+Masks: the Expert mask images when present (binarised, wall_label=1, as in the notebooks), plus synthetic
+3-class masks (lumen band between two walls, 1=lumen / 2=wall) so the lumen-centre path is exercised too.
+Every run checks parity: per-mask IMT must match the loop exactly (NaN where the loop gives NaN).
+
+Run from project root:
+    python -m benchmarks.bench_imt --n_masks 64 --repeats 3 [--json bench_imt.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import time
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+import torch
+
+from carotid.imt_utils import imt_mm_batch, imt_summary_batch
+
+MASK_GLOB = "data/Common Carotid Artery Ultrasound Images/Expert mask images/*.png"
+SPACING_MM_PER_PIXEL = 0.04
+
+
+def loop_imt_mm(mask: np.ndarray, spacing_mm_per_pixel: float, lumen_label: int, wall_label: int) -> float:
+    """Reference: the per-column loop the engine replaces."""
+    h, w = mask.shape
+    lumen_intima = np.full(w, np.nan)
+    media_adventitia = np.full(w, np.nan)
+    for x in range(w):
+        col = mask[:, x]
+        lumen_idx = np.where(col == lumen_label)[0]
+        wall_idx = np.where(col == wall_label)[0]
+        if len(lumen_idx) and len(wall_idx):
+            lumen_center = np.mean(lumen_idx)
+            lumen_intima[x] = float(wall_idx[np.argmin(np.abs(wall_idx - lumen_center))])
+            media_adventitia[x] = float(wall_idx[np.argmax(np.abs(wall_idx - lumen_center))])
+        elif len(wall_idx) >= 2:
+            lumen_intima[x] = float(np.min(wall_idx))
+            media_adventitia[x] = float(np.max(wall_idx))
+    thickness = np.abs(media_adventitia - lumen_intima)
+    if not np.any(np.isfinite(thickness)):
+        return np.nan
+    return float(np.nanmean(thickness) * spacing_mm_per_pixel)
+
+
+def synthetic_masks(rng: np.random.Generator, n: int, height: int, width: int) -> np.ndarray:
+    """0=background, 1=lumen, 2=wall: curved lumen band with a wall above and below, some empty columns."""
+    y = np.arange(height)[:, None]
+    x = np.arange(width)[None, :]
+    masks = np.zeros((n, height, width), dtype=np.uint8)
+    for i in range(n):
+        centre = height * rng.uniform(0.4, 0.6) + 0.03 * height * np.sin(x / width * np.pi * rng.uniform(0.5, 2.0))
+        half = height * rng.uniform(0.05, 0.1)
+        wall = height * rng.uniform(0.01, 0.03)
+        dist = np.abs(y - centre)
+        masks[i][(dist >= half) & (dist < half + wall)] = 2
+        masks[i][dist < half] = 1
+        masks[i][:, : rng.integers(0, width // 4)] = 0  # partial vessel: leading columns without labels
+        masks[i][rng.random((height, width)) < 0.002] = 2  # speckle-like stray wall pixels
+    return masks
+
+
+def expert_masks(n: int) -> np.ndarray:
+    paths = sorted(glob.glob(MASK_GLOB))[:n]
+    masks = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in paths]
+    masks = [m for m in masks if m is not None]
+    if not masks:
+        return np.zeros((0, 0, 0), dtype=np.uint8)
+    h, w = masks[0].shape
+    return np.stack([(cv2.resize(m, (w, h), interpolation=cv2.INTER_NEAREST) > 127).astype(np.uint8) for m in masks])
+
+
+def _resize(masks: np.ndarray, height: int, width: int) -> np.ndarray:
+    return np.stack([cv2.resize(m, (width, height), interpolation=cv2.INTER_NEAREST) for m in masks])
+
+
+def _best_ms(fn: Callable[[], object], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IMT from masks: per-column loop vs vectorised batch engine")
+    parser.add_argument("--n_masks", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--sizes", type=str, nargs="+", default=["224x224", "709x749"], help="HxW")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    rng = np.random.default_rng(0)
+    expert = expert_masks(args.n_masks)
+    print(f"Expert masks: {len(expert)}" + ("" if len(expert) else " (none found, synthetic only)"))
+
+    rows: List[Dict] = []
+    ok = True
+    for size in args.sizes:
+        height, width = (int(v) for v in size.split("x"))
+        sets = {"synthetic_3class": (synthetic_masks(rng, args.n_masks, height, width), [(1, 2), (2, 1)])}
+        if len(expert):
+            # Binary masks: (1, 1) is the serving configuration, (2, 1) the notebooks' (no lumen label)
+            sets["expert_binary"] = (_resize(expert, height, width), [(1, 1), (2, 1)])
+        for set_name, (masks, configs) in sets.items():
+            for lumen_label, wall_label in configs:
+                ref = np.array([loop_imt_mm(m, SPACING_MM_PER_PIXEL, lumen_label, wall_label) for m in masks])
+                out = imt_mm_batch(masks, SPACING_MM_PER_PIXEL, lumen_label, wall_label)
+                out_torch = imt_mm_batch(torch.from_numpy(masks).long(), SPACING_MM_PER_PIXEL, lumen_label, wall_label)
+                same_nan = bool(np.array_equal(np.isnan(ref), np.isnan(out)) and np.array_equal(np.isnan(ref), np.isnan(out_torch)))
+                finite = np.isfinite(ref)
+                max_diff = float(max(np.abs(ref - out)[finite].max(initial=0.0), np.abs(ref - out_torch)[finite].max(initial=0.0)))
+                parity = same_nan and max_diff <= 1e-12
+                ok &= parity
+
+                loop_ms = _best_ms(
+                    lambda: [loop_imt_mm(m, SPACING_MM_PER_PIXEL, lumen_label, wall_label) for m in masks], args.repeats
+                )
+                batch_ms = _best_ms(lambda: imt_mm_batch(masks, SPACING_MM_PER_PIXEL, lumen_label, wall_label), args.repeats)
+                summary_ms = _best_ms(
+                    lambda: imt_summary_batch(masks, SPACING_MM_PER_PIXEL, lumen_label, wall_label), args.repeats
+                )
+                row = {
+                    "size": size,
+                    "masks": set_name,
+                    "labels": [lumen_label, wall_label],
+                    "n": len(masks),
+                    "loop_ms_per_mask": round(loop_ms / len(masks), 3),
+                    "batch_ms_per_mask": round(batch_ms / len(masks), 3),
+                    "speedup": round(loop_ms / batch_ms, 1),
+                    "summary_ms_per_mask": round(summary_ms / len(masks), 3),
+                    "nan_masks": int((~finite).sum()),
+                    "max_abs_diff_mm": max_diff,
+                    "parity": parity,
+                }
+                rows.append(row)
+                print(
+                    f"{size:8s} {set_name:17s} labels=({lumen_label},{wall_label}) "
+                    f"loop {row['loop_ms_per_mask']:8.3f} ms/mask  batch {row['batch_ms_per_mask']:7.3f} ms/mask  "
+                    f"x{row['speedup']:<6} summary {row['summary_ms_per_mask']:7.3f} ms/mask  parity={'ok' if parity else 'FAIL'}"
+                )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"threads": torch.get_num_threads(), "results": rows}, f, indent=2)
+    if not ok:
+        raise SystemExit("IMT parity check failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Per-image CPU latency of Swin-UNETR inference: legacy path vs serving build.
+legacy  = use_checkpoint=True, torch.no_grad(), full softmax then argmax (pre-serving-build backend)
+serving = backend.inference.build_model (no checkpointing), torch.inference_mode(), argmax on logits
+Optional variants: channels-last and torch.compile.
+
+Run from project root:
+    python -m benchmarks.bench_inference --batch_sizes 1 8 --repeats 10 [--checkpoint models/carotid_swin_unetr_2d.pt]
+Random weights are used when no checkpoint is given (latency does not depend on weights).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+import torch
+
+from backend.inference import build_model, foreground_probability
+
+
+def _legacy_step(model: torch.nn.Module, x: torch.Tensor) -> None:
+    with torch.no_grad():
+        pred_soft = torch.softmax(model(x), dim=1)
+        pred_soft.argmax(dim=1).cpu().numpy()
+        pred_soft[:, 1].mean(dim=(1, 2)).cpu().tolist()
+
+
+def _serving_step(model: torch.nn.Module, x: torch.Tensor) -> None:
+    with torch.inference_mode():
+        logits = model(x)
+        logits.argmax(dim=1).cpu().numpy()
+        foreground_probability(logits).mean(dim=(1, 2)).cpu().tolist()
+
+
+def time_per_image_ms(step: Callable, model: torch.nn.Module, x: torch.Tensor, repeats: int, warmup: int = 2) -> float:
+    for _ in range(warmup):
+        step(model, x)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        step(model, x)
+    return (time.perf_counter() - t0) * 1000.0 / (repeats * x.shape[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Swin-UNETR CPU inference latency: legacy vs serving build")
+    parser.add_argument("--checkpoint", type=str, default=None)
+    parser.add_argument("--img_size", type=int, default=224)
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--channels_last", action="store_true")
+    parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    serving = build_model().eval()
+    state = torch.load(args.checkpoint, map_location="cpu") if args.checkpoint else None
+    if state is not None:
+        serving.load_state_dict(state.get("model", state), strict=False)
+    legacy = build_model().eval()
+    legacy.load_state_dict(serving.state_dict())
+    for m in legacy.modules():
+        if hasattr(m, "use_checkpoint"):
+            m.use_checkpoint = True
+
+    variants: Dict[str, tuple] = {
+        "legacy": (_legacy_step, legacy, False),
+        "serving": (_serving_step, serving, False),
+    }
+    if args.channels_last:
+        variants["serving+channels_last"] = (
+            _serving_step, build_model().eval().to(memory_format=torch.channels_last), True,
+        )
+        variants["serving+channels_last"][1].load_state_dict(serving.state_dict())
+    if args.compile:
+        variants["serving+compile"] = (_serving_step, torch.compile(serving), False)
+
+    rows: List[Dict] = []
+    for bs in args.batch_sizes:
+        x = torch.rand(bs, 1, args.img_size, args.img_size)
+        for name, (step, model, channels_last) in variants.items():
+            inp = x.contiguous(memory_format=torch.channels_last) if channels_last else x
+            ms = time_per_image_ms(step, model, inp, args.repeats)
+            rows.append({"variant": name, "batch_size": bs, "ms_per_image": round(ms, 2), "images_per_s": round(1000.0 / ms, 2)})
+            print(f"{name:24s} batch={bs:<3d} {ms:8.2f} ms/image  {1000.0 / ms:7.2f} images/s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"threads": torch.get_num_threads(), "img_size": args.img_size, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
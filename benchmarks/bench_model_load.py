@@ -0,0 +1,64 @@
+"""
+Model startup time and per-worker memory: memory-mapped weights (MODEL_MMAP=1) vs a private copy (MODEL_MMAP=0).
+Each mode runs in fresh worker-like subprocesses that call backend.inference.warm_up(), as the FastAPI lifespan does.
+rss_file_mb is file-backed (shared by all workers mapping the checkpoint); rss_anon_mb is private per worker.
+
+Run from project root:
+    python -m benchmarks.bench_model_load --checkpoint models/carotid_swin_unetr_2d.pt --workers 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+
+def _child(checkpoint: str) -> None:
+    import backend.inference as inference
+
+    inference.MODEL_PATH = Path(checkpoint)
+    stats = inference.warm_up()
+    print("RESULT " + json.dumps(stats))
+
+
+def run_worker(checkpoint: str, mmap: bool) -> Dict:
+    env = {**os.environ, "MODEL_MMAP": "1" if mmap else "0", "INFERENCE_BACKEND": "torch", "MODEL_QUANTIZED": "0"}
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_model_load", "--_child", checkpoint],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    line = next(l for l in out.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time / memory: mmap'ed vs copied weights")
+    parser.add_argument("--checkpoint", type=str, default="models/carotid_swin_unetr_2d.pt")
+    parser.add_argument("--workers", type=int, default=2, help="Sequential worker processes per mode")
+    parser.add_argument("--json", type=str, default=None)
+    parser.add_argument("--_child", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._child:
+        _child(args._child)
+        return
+    if not Path(args.checkpoint).exists():
+        raise SystemExit(f"Checkpoint not found: {args.checkpoint}")
+
+    results: Dict[str, List[Dict]] = {}
+    for mode, mmap in (("copy", False), ("mmap", True)):
+        results[mode] = [run_worker(args.checkpoint, mmap) for _ in range(args.workers)]
+        for i, r in enumerate(results[mode]):
+            print(f"{mode:5s} worker {i}: {r}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Packed dataset (carotid/packed_dataset.py) vs per-file loading, over the first --limit dataset pairs.
+
+- load: get one sample's image and mask arrays and touch every byte (PNG decode for files, mmap view for packs)
+- sample: the full pre-transform sample MomotCarotidDataset builds (decode + max-normalise + CLAHE + DWT for
+  files and decoded packs; nothing left to do for a cleaned pack), in shuffled order and streamed
+Timings are with a warm page cache (dropping it needs root); on a cold or network disk the gap is larger, since
+a pack is read in a few long sequential runs instead of two small files per sample. Parity: every packed sample
+equals the per-file result (decoded: exactly; cleaned: float32 of the same computation), and for --dataset_parity
+random pairs the packed sample equals MomotCarotidDataset's own (image, label and spacing).
+
+Run from project root:
+    python -m benchmarks.bench_packed --limit 100 [--json bench_packed.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.bench_data_qa import dataset_pairs
+from carotid.packed_dataset import PackedCarotidDataset, PackedCarotidStream, clean_image, pack
+from carotid.pipeline import load_array
+from carotid.preprocessing import MedicalDataCleaner
+from carotid.train_carotid import MomotCarotidDataset
+
+
+def _per_sample_ms(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1e3 / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packed mmap dataset vs per-file decoding")
+    parser.add_argument("--limit", type=int, default=100, help="Number of dataset pairs to pack")
+    parser.add_argument("--dataset_parity", type=int, default=16, help="Pairs checked against MomotCarotidDataset")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    pairs = dataset_pairs(args.limit)
+    items = [{"image": i, "label": m, "spacing_mm_per_pixel": 0.04} for i, m in pairs]
+    cleaner = MedicalDataCleaner(clahe_clip_limit=2.0, dwt_wavelet="db4", dwt_level=2)
+    order = np.random.default_rng(0).permutation(len(items))
+    rows: List[Dict] = []
+    ok = True
+
+    with tempfile.TemporaryDirectory(prefix="bench_packed_") as tmp:
+        t0 = time.perf_counter()
+        pack(items, Path(tmp) / "decoded", shard_bytes=64 << 20)
+        pack_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        pack(items, Path(tmp) / "cleaned", cleaner=cleaner, shard_bytes=256 << 20)
+        pack_clean_s = time.perf_counter() - t0
+        decoded = PackedCarotidDataset(Path(tmp) / "decoded", cleaner=cleaner)
+        cleaned = PackedCarotidDataset(Path(tmp) / "cleaned", cleaner=cleaner)
+        sizes = {
+            name: sum(os.path.getsize(p) for p in (Path(tmp) / name).iterdir()) / 2**20 for name in ("decoded", "cleaned")
+        }
+        print(f"{len(items)} pairs packed in {pack_s:.1f} s (decoded, {sizes['decoded']:.0f} MiB) / "
+              f"{pack_clean_s:.1f} s (cleaned, {sizes['cleaned']:.0f} MiB)")
+
+        # Parity
+        for i in range(len(items)):
+            img, lbl = load_array(items[i]["image"]), load_array(items[i]["label"])
+            reference = np.asarray(clean_image(img, cleaner), dtype=np.float32)
+            ok &= np.array_equal(decoded.array(decoded.samples[i], "image"), img)
+            ok &= np.array_equal(decoded.sample(i)["label"][0], lbl)
+            ok &= np.array_equal(decoded.sample(i)["image"][0], clean_image(img, cleaner))
+            ok &= np.array_equal(cleaned.sample(i)["image"][0], reference)
+        dataset = MomotCarotidDataset(items, cleaner=cleaner)
+        checked = order[:args.dataset_parity]
+        mismatched = 0
+        for i in checked:
+            reference = dataset[int(i)]
+            same = True
+            for ds, dtype in ((decoded, None), (cleaned, np.float32)):
+                data = ds.sample(int(i))
+                image = reference["image"] if dtype is None else np.asarray(reference["image"], dtype=dtype)
+                same &= np.array_equal(data["image"], image)
+                same &= np.array_equal(data["label"], reference["label"])
+                same &= data["spacing_mm_per_pixel"] == reference["spacing_mm_per_pixel"]
+            mismatched += not same
+        ok &= mismatched == 0
+        print(f"parity: {'ok' if ok else 'FAIL'} ({mismatched}/{len(checked)} samples differ from MomotCarotidDataset)")
+
+        def load_files():
+            for i in order:
+                float(load_array(items[i]["image"]).max()), float(load_array(items[i]["label"]).max())
+
+        def load_packed(ds: PackedCarotidDataset):
+            for i in order:
+                s = ds.samples[i]
+                float(ds.array(s, "image").max()), float(ds.array(s, "label").max())
+
+        def samples_files():
+            for i in order:
+                clean_image(load_array(items[i]["image"]), cleaner), load_array(items[i]["label"])
+
+        def samples_packed(ds: PackedCarotidDataset):
+            for i in range(len(ds)):
+                float(ds[int(order[i])]["image"].max())
+
+        def stream_packed(ds: PackedCarotidDataset):
+            for data in PackedCarotidStream(ds):
+                float(data["image"].max())
+
+        n = len(items)
+        load_files()  # warm the page cache for every reader alike
+        cases = [
+            ("load", "files", lambda: load_files()),
+            ("load", "packed_decoded", lambda: load_packed(decoded)),
+            ("load", "packed_cleaned", lambda: load_packed(cleaned)),
+            ("sample", "files", lambda: samples_files()),
+            ("sample", "packed_decoded", lambda: samples_packed(decoded)),
+            ("sample", "packed_cleaned", lambda: samples_packed(cleaned)),
+            ("sample", "packed_cleaned_stream", lambda: stream_packed(cleaned)),
+        ]
+        baseline: Dict[str, float] = {}
+        for stage, reader, fn in cases:
+            ms = _per_sample_ms(fn, n)
+            baseline.setdefault(stage, ms)
+            rows.append({"stage": stage, "reader": reader, "ms_per_sample": round(ms, 3), "speedup": round(baseline[stage] / ms, 1)})
+            print(f"{stage:7s} {reader:22s} {ms:8.3f} ms/sample  x{baseline[stage] / ms:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "n_pairs": len(items), "pack_mib": sizes, "parity": bool(ok), "dataset_mismatches": mismatched, "results": rows}, f, indent=2)
+    if not ok:
+        raise SystemExit("Packed samples differ from per-file loading")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Shared train/serve preprocessing (carotid/pipeline.py): per-stage cost per image and parity with training.
+
+Parity: serving (pipeline.decode_image on the file bytes, then the compiled pipeline) vs what train_carotid.py feeds
+the model on validation (MomotCarotidDataset.__getitem__: load_array + MedicalDataCleaner per image in float64, then
+get_val_transforms), per image file, max abs diff <= --tolerance. Uses the dataset's first --n_images images when
+present, otherwise synthetic frames written to PNG.
+Cost: best-of-repeats ms per stage, for the training config and the legacy (max-normalise + resize) config,
+held against --budget_ms (default PREPROCESS_BUDGET_MS); exits non-zero when the mean total is over budget.
+With --checkpoint the config stored in that checkpoint is measured instead of the training default.
+
+Run from project root:
+    python -m benchmarks.bench_pipeline --n_images 16 [--checkpoint models/carotid_swin_unetr_2d.pt] [--json bench_pipeline.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+import torch
+from monai.transforms import Compose, EnsureChannelFirst, EnsureType, Resize
+
+from benchmarks.bench_preprocessing import IMAGE_GLOB
+from benchmarks.loadtest import synthetic_ultrasound
+from carotid.pipeline import LEGACY_PREPROCESSING, PreprocessingPipeline, decode_image, load_array, training_preprocessing
+from carotid.preprocessing import MedicalDataCleaner
+from carotid.train_carotid import MomotCarotidDataset, get_val_transforms
+
+
+def image_files(n: int, directory: str, seed: int = 0) -> List[str]:
+    """First n dataset images, or n synthetic PNGs written to `directory`."""
+    paths = sorted(glob.glob(IMAGE_GLOB))[:n]
+    if paths:
+        return paths
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        paths.append(os.path.join(directory, f"synthetic_{i:03d}.png"))
+        with open(paths[-1], "wb") as f:
+            f.write(synthetic_ultrasound(rng))
+    return paths
+
+
+def training_reference(pipeline: PreprocessingPipeline, path: str) -> np.ndarray:
+    """MomotCarotidDataset + get_val_transforms for one image file, with the pipeline's settings."""
+    intensity = pipeline.config["intensity"]
+    if pipeline.cleaner is None or intensity is None:
+        # Not a training config (LEGACY_PREPROCESSING): same decode, max-normalise, MONAI resize
+        img = load_array(path)
+        x = img.astype(np.float32) / (np.max(img) + 1e-8)
+        transform = Compose([
+            EnsureChannelFirst(channel_dim="no_channel"),
+            Resize(spatial_size=pipeline.img_size, mode="bilinear"),
+            EnsureType("tensor", dtype=torch.float32),
+        ])
+        return transform(x)[0].numpy()
+    dataset = MomotCarotidDataset([{"image": path, "label": path}], cleaner=pipeline.cleaner)
+    # The val transforms are array transforms: applied to the dataset's (1, H, W) image as in training
+    transform = get_val_transforms(pipeline.img_size, (intensity["lower"], intensity["upper"]))
+    return transform(dataset[0]["image"][0])[0].numpy()
+
+
+def served(pipeline: PreprocessingPipeline, path: str) -> np.ndarray:
+    """backend/inference.preprocess_image for one image file: decode_image on the raw bytes, then the pipeline."""
+    with open(path, "rb") as f:
+        return pipeline(decode_image(f.read()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared preprocessing pipeline: per-stage cost and training parity")
+    parser.add_argument("--n_images", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--checkpoint", type=str, default=None, help="Measure the preprocessing stored in this checkpoint")
+    parser.add_argument("--budget_ms", type=float, default=float(os.getenv("PREPROCESS_BUDGET_MS", "60")))
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.checkpoint:
+        state = torch.load(args.checkpoint, map_location="cpu", mmap=True, weights_only=True)
+        configs = {"checkpoint": PreprocessingPipeline.from_checkpoint(state).config}
+    else:
+        cleaner = MedicalDataCleaner(clahe_clip_limit=2.0, dwt_wavelet="db4", dwt_level=2)
+        configs = {"training": training_preprocessing(cleaner, (224, 224)), "legacy": LEGACY_PREPROCESSING}
+    tmp = tempfile.TemporaryDirectory()
+    paths = image_files(args.n_images, tmp.name)
+    frames = [load_array(p) for p in paths]
+    print(f"{len(frames)} frames of {frames[0].shape[0]}x{frames[0].shape[1]}, budget {args.budget_ms:g} ms/image")
+
+    rows: List[Dict] = []
+    ok = True
+    for name, config in configs.items():
+        pipeline = PreprocessingPipeline(config)
+        max_diff = max(float(np.abs(training_reference(pipeline, p) - served(pipeline, p)).max()) for p in paths)
+        per_image = [pipeline.measure(f, repeats=args.repeats) for f in frames]
+        stages = {stage: round(float(np.mean([m[stage] for m in per_image])), 3) for stage in per_image[0]}
+        within_budget = not args.budget_ms or stages["total"] <= args.budget_ms
+        parity = max_diff <= args.tolerance
+        ok &= parity and within_budget
+        rows.append({
+            "pipeline": name,
+            "stages": pipeline.describe(),
+            "ms_per_image": stages,
+            "p95_total_ms": round(float(np.percentile([m["total"] for m in per_image], 95)), 3),
+            "within_budget": within_budget,
+            "max_abs_diff_vs_training": max_diff,
+            "parity": parity,
+        })
+        print(f"{name:10s} {' -> '.join(pipeline.describe())}")
+        print(
+            f"{'':10s} " + "  ".join(f"{stage} {ms:.2f}" for stage, ms in stages.items()) + " ms  "
+            f"budget={'ok' if within_budget else 'OVER'}  max|diff| vs training={max_diff:.1e} parity={'ok' if parity else 'FAIL'}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "budget_ms": args.budget_ms, "results": rows}, f, indent=2)
+    tmp.cleanup()
+    if not ok:
+        raise SystemExit("Preprocessing pipeline over budget or out of parity with training")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+MedicalDataCleaner throughput: per-image __call__ (float64, one image at a time) vs clean_batch (float32 stacks,
+whole-chunk DWT, thread pool), on native-resolution frames.
+
+Uses the first --n_images frames of the dataset when present, otherwise synthetic ultrasound-like frames.
+Every run checks parity against the per-image output (max abs difference <= --tolerance, default 1e-5).
+
+Run from project root:
+    python -m benchmarks.bench_preprocessing --n_images 32 --workers 1 4 [--json bench_preprocessing.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+
+from benchmarks.loadtest import synthetic_ultrasound
+from carotid.preprocessing import MedicalDataCleaner
+
+IMAGE_GLOB = "data/Common Carotid Artery Ultrasound Images/US images/*.png"
+
+
+def load_frames(n: int, seed: int = 0) -> np.ndarray:
+    frames = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in sorted(glob.glob(IMAGE_GLOB))[:n]]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        rng = np.random.default_rng(seed)
+        frames = [cv2.imdecode(np.frombuffer(synthetic_ultrasound(rng), np.uint8), cv2.IMREAD_GRAYSCALE) for _ in range(n)]
+    h, w = frames[0].shape
+    return np.stack([cv2.resize(f, (w, h)) if f.shape != (h, w) else f for f in frames])
+
+
+def _best_s(fn: Callable[[], object], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedicalDataCleaner: per-image vs batched float32 throughput")
+    parser.add_argument("--n_images", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, min(os.cpu_count() or 1, 8)])
+    parser.add_argument("--chunk_size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    cleaner = MedicalDataCleaner(clahe_clip_limit=2.0, dwt_wavelet="db4", dwt_level=2)
+    frames = load_frames(args.n_images)
+    # uint8 frames as read from disk, and the float64 [0, 1] frames MomotCarotidDataset passes to the cleaner
+    inputs = {
+        "uint8": frames,
+        "float_normalised": np.stack([f.astype(np.float32) / (np.max(f) + 1e-8) for f in frames]),
+    }
+    print(f"{len(frames)} frames of {frames.shape[1]}x{frames.shape[2]}, {os.cpu_count()} CPUs")
+
+    rows: List[Dict] = []
+    ok = True
+    for name, stack in inputs.items():
+        reference = np.stack([cleaner(img) for img in stack])
+        per_image_s = _best_s(lambda: [cleaner(img) for img in stack], args.repeats)
+        row = {"input": name, "dtype": str(stack.dtype), "per_image_ms": round(per_image_s * 1000 / len(stack), 2)}
+        print(f"{name:17s} per-image           {row['per_image_ms']:8.2f} ms/image")
+        for workers in dict.fromkeys(args.workers):
+            out = cleaner.clean_batch(stack, workers=workers, chunk_size=args.chunk_size)
+            diff = np.abs(out - reference)
+            batch_s = _best_s(
+                lambda: cleaner.clean_batch(stack, workers=workers, chunk_size=args.chunk_size), args.repeats
+            )
+            parity = out.dtype == np.float32 and float(diff.max()) <= args.tolerance
+            ok &= parity
+            ms = batch_s * 1000 / len(stack)
+            row[f"batch_workers{workers}"] = {
+                "ms_per_image": round(ms, 2),
+                "images_per_s": round(1000.0 / ms, 1),
+                "speedup": round(per_image_s / batch_s, 2),
+                "max_abs_diff": float(diff.max()),
+                "mean_abs_diff": float(diff.mean()),
+                "parity": parity,
+            }
+            print(
+                f"{name:17s} clean_batch x{workers:<2d}     {ms:8.2f} ms/image  x{per_image_s / batch_s:.2f}  "
+                f"max|diff|={diff.max():.2e} parity={'ok' if parity else 'FAIL'}"
+            )
+        rows.append(row)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "shape": list(frames.shape), "results": rows}, f, indent=2)
+    if not ok:
+        raise SystemExit("clean_batch parity check failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+DWT denoising: PyWavelets one image at a time (MedicalDataCleaner._dwt_denoise_2d) vs the torch-native batched
+implementation (carotid.torch_dwt.dwt_denoise on (N, 1, H, W)), at serving size (224x224) and native size.
+
+Parity is checked on every run against pywt: decomposition coefficients, reconstruction and the denoised image,
+in float64 (max abs diff <= 1e-10) and float32 (<= 1e-5), for several wavelets / levels / threshold modes, and
+through MedicalDataCleaner(dwt_backend="torch"): per-image __call__ (float64) and clean_batch (float32), which
+are also timed against the default pywt backend.
+
+Run from project root:
+    python -m benchmarks.bench_torch_dwt --n_images 16 --repeats 3 [--threads 4] [--json bench_torch_dwt.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+import pywt
+import torch
+
+from benchmarks.bench_preprocessing import load_frames
+from carotid import torch_dwt
+from carotid.preprocessing import MedicalDataCleaner
+
+TOLERANCE = {torch.float64: 1e-10, torch.float32: 1e-5}
+PARITY_CONFIGS = [("db4", 2, "soft"), ("db4", 3, "hard"), ("haar", 1, "soft"), ("sym5", 2, "soft")]
+
+
+def _best_ms(fn: Callable[[], object], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def _max_diff(ref: np.ndarray, out: torch.Tensor) -> float:
+    return float(np.abs(ref - out.double().numpy()).max())
+
+
+def parity(images: np.ndarray) -> List[Dict]:
+    """pywt vs torch on the first two images of `images` (H, W), odd-sized crops included."""
+    rows = []
+    crops = [images[:2], images[:2, :-3, :-1]]
+    for wavelet, level, mode in PARITY_CONFIGS:
+        cleaner = MedicalDataCleaner(dwt_wavelet=wavelet, dwt_level=level, dwt_mode=mode)
+        for stack in crops:
+            for dtype in (torch.float64, torch.float32):
+                x = torch.from_numpy(stack).to(dtype)[:, None]
+                coeffs = torch_dwt.wavedec2(x, wavelet, level)
+                coeff_diff = rec_diff = denoise_diff = 0.0
+                for i, img in enumerate(stack):
+                    ref = pywt.wavedec2(img, wavelet, level=level)
+                    coeff_diff = max(coeff_diff, _max_diff(ref[0], coeffs[0][i, 0]), *(
+                        _max_diff(r, o[i, 0]) for ref_level, out_level in zip(ref[1:], coeffs[1:])
+                        for r, o in zip(ref_level, out_level)
+                    ))
+                    rec_diff = max(rec_diff, _max_diff(pywt.waverec2(ref, wavelet), torch_dwt.waverec2(coeffs, wavelet)[i, 0]))
+                    denoise_diff = max(denoise_diff, _max_diff(cleaner._dwt_denoise_2d(img), torch_dwt.dwt_denoise(x, wavelet, level, mode)[i, 0]))
+                ok = max(coeff_diff, rec_diff, denoise_diff) <= TOLERANCE[dtype]
+                rows.append({
+                    "wavelet": wavelet, "level": level, "mode": mode, "shape": list(stack.shape[1:]),
+                    "dtype": str(dtype).replace("torch.", ""), "coeff_max_abs_diff": coeff_diff,
+                    "reconstruction_max_abs_diff": rec_diff, "denoise_max_abs_diff": denoise_diff, "parity": ok,
+                })
+                print(
+                    f"{wavelet:5s} level={level} {mode:4s} {stack.shape[1]}x{stack.shape[2]} {rows[-1]['dtype']:7s} "
+                    f"coeffs {coeff_diff:.1e}  rec {rec_diff:.1e}  denoise {denoise_diff:.1e}  parity={'ok' if ok else 'FAIL'}"
+                )
+    return rows
+
+
+def cleaner_parity(frames: List[np.ndarray]) -> Dict:
+    """MedicalDataCleaner with dwt_backend="torch" vs "pywt": __call__ on each frame and clean_batch on the stack."""
+    pywt_cleaner, torch_cleaner = MedicalDataCleaner(), MedicalDataCleaner(dwt_backend="torch")
+    call_diff = max(float(np.abs(pywt_cleaner(f) - torch_cleaner(f)).max()) for f in frames[:2])
+    stack = np.stack(frames)
+    batch_diff = float(np.abs(pywt_cleaner.clean_batch(stack, workers=1) - torch_cleaner.clean_batch(stack, workers=1)).max())
+    ok = max(call_diff, batch_diff) <= TOLERANCE[torch.float32]
+    print(f"cleaner dwt_backend=torch vs pywt: __call__ {call_diff:.1e}  clean_batch {batch_diff:.1e}  parity={'ok' if ok else 'FAIL'}")
+    return {"call_max_abs_diff": call_diff, "clean_batch_max_abs_diff": batch_diff, "parity": ok}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DWT denoising: pywt per image vs torch batched")
+    parser.add_argument("--n_images", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--sizes", type=str, nargs="+", default=["224x224", "native"], help="HxW or 'native'")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    cleaner = MedicalDataCleaner()
+    frames = load_frames(args.n_images)
+    # The DWT sees CLAHE output in [0, 1]
+    images = np.stack([cleaner._clahe(f) for f in frames])
+    parity_rows = parity(images)
+    cleaner_row = cleaner_parity(frames)
+    ok = all(r["parity"] for r in parity_rows) and cleaner_row["parity"]
+
+    denoiser = torch_dwt.DWTDenoiser.from_cleaner(cleaner)
+    torch_cleaner = MedicalDataCleaner(dwt_backend="torch")
+    timing_rows = []
+    for size in args.sizes:
+        if size == "native":
+            stack = images
+        else:
+            height, width = (int(v) for v in size.split("x"))
+            stack = np.stack([cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA) for img in images])
+        x32 = torch.from_numpy(stack.astype(np.float32))[:, None]
+        raw = stack * 255.0
+        with torch.inference_mode():
+            pywt_ms = _best_ms(lambda: [cleaner._dwt_denoise_2d(img) for img in stack], args.repeats)
+            torch_ms = _best_ms(lambda: denoiser(x32), args.repeats)
+            pywt_batch_ms = _best_ms(lambda: cleaner.clean_batch(raw, workers=1), args.repeats)
+            torch_batch_ms = _best_ms(lambda: torch_cleaner.clean_batch(raw, workers=1), args.repeats)
+        row = {
+            "size": f"{stack.shape[1]}x{stack.shape[2]}",
+            "n": len(stack),
+            "pywt_ms_per_image": round(pywt_ms / len(stack), 3),
+            "torch_batch_ms_per_image": round(torch_ms / len(stack), 3),
+            "speedup": round(pywt_ms / torch_ms, 2),
+            "clean_batch_pywt_ms_per_image": round(pywt_batch_ms / len(stack), 3),
+            "clean_batch_torch_ms_per_image": round(torch_batch_ms / len(stack), 3),
+            "clean_batch_speedup": round(pywt_batch_ms / torch_batch_ms, 2),
+        }
+        timing_rows.append(row)
+        print(
+            f"{row['size']:9s} pywt {row['pywt_ms_per_image']:8.3f} ms/image  "
+            f"torch batch {row['torch_batch_ms_per_image']:8.3f} ms/image  x{row['speedup']}  |  clean_batch "
+            f"pywt {row['clean_batch_pywt_ms_per_image']:8.3f}  torch {row['clean_batch_torch_ms_per_image']:8.3f} "
+            f"ms/image  x{row['clean_batch_speedup']}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "threads": torch.get_num_threads(), "parity": parity_rows, "cleaner_parity": cleaner_row, "timing": timing_rows,
+            }, f, indent=2)
+    if not ok:
+        raise SystemExit("torch DWT parity check failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Offline load test for the API: boots backend.main:app with uvicorn in a child process against a throwaway
+SQLite file (or --database_url, e.g. a local Postgres), stubs Firebase token verification (the bearer token is
+taken as the Firebase UID, so get_current_user still hits the database), seeds users / patients / scans /
+results, and drives the endpoints with synthetic ultrasound-like frames at a fixed concurrency.
+
+Per scenario it reports p50 / p95 / p99 / mean latency (ms), throughput (req/s) and errors as JSON, plus the
+environment (git revision, torch, CPU count) so runs of two releases can be compared.
+
+Run from project root (no network, no Firebase project, no trained checkpoint needed):
+    python -m benchmarks.loadtest --concurrency 8 --requests 200 --json loadtest.json
+Without --checkpoint (or if models/carotid_swin_unetr_2d.pt is missing) a randomly initialised
+Swin-UNETR is used: latency is representative, IMT values are not.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+
+SCENARIOS = ("predict", "patients", "scans", "export")
+TOKEN_PREFIX = "loadtest-user-"
+
+
+def synthetic_ultrasound(rng: np.random.Generator, height: int = 709, width: int = 749) -> bytes:
+    """
+    PNG of a longitudinal carotid-like frame: Rayleigh speckle, a dark lumen band between two bright,
+    slightly curved walls, depth attenuation. Same size as the dataset frames.
+    """
+    y = np.arange(height, dtype=np.float32)[:, None]
+    x = np.arange(width, dtype=np.float32)[None, :]
+    centre = height * rng.uniform(0.4, 0.6) + 15.0 * np.sin(x / width * np.pi * rng.uniform(0.5, 1.5))
+    lumen_half = height * rng.uniform(0.06, 0.09)
+    wall = rng.uniform(6.0, 12.0)
+    dist = np.abs(y - centre)
+    tissue = np.full((height, width), 0.45, dtype=np.float32)
+    tissue[dist < lumen_half] = 0.05
+    wall_band = (dist >= lumen_half) & (dist < lumen_half + wall)
+    tissue[wall_band] = 0.95
+    tissue *= np.exp(-y / (height * 1.5))
+    speckle = rng.rayleigh(scale=0.6, size=(height, width)).astype(np.float32)
+    img = np.clip(tissue * speckle * 255.0, 0, 255).astype(np.uint8)
+    ok, buf = cv2.imencode(".png", cv2.GaussianBlur(img, (3, 3), 0))
+    return buf.tobytes()
+
+
+def random_checkpoint(path: Path) -> Path:
+    """Randomly initialised checkpoint in the format of carotid/train_carotid.py."""
+    import torch
+
+    from backend.inference import build_model
+
+    torch.manual_seed(0)
+    net = build_model()
+    torch.save({"model": net.state_dict(), "img_size": 224, "in_channels": 1, "out_channels": 2}, path)
+    return path
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+# Server side (child process)
+
+def _seed(n_users: int, patients_per_user: int, scans_per_patient: int) -> None:
+    from datetime import datetime, timedelta
+    from uuid import uuid4
+
+    from backend.database import Base, SessionLocal, engine
+    from backend.models import Patient, Result, Scan, User
+
+    Base.metadata.create_all(bind=engine)
+    rng = np.random.default_rng(0)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        for u in range(n_users):
+            uid = f"{TOKEN_PREFIX}{u}"
+            if db.query(User).filter(User.firebase_uid == uid).first():
+                continue
+            user = User(id=str(uuid4()), firebase_uid=uid, email=f"loadtest{u}@example.org", display_name=f"CHW {u}")
+            db.add(user)
+            for p in range(patients_per_user):
+                patient = Patient(id=str(uuid4()), user_id=user.id, identifier=f"LT-{u:03d}-{p:05d}", facility="Loadtest HC")
+                db.add(patient)
+                for s in range(scans_per_patient):
+                    scan = Scan(
+                        id=str(uuid4()),
+                        patient_id=patient.id,
+                        user_id=user.id,
+                        created_at=now - timedelta(days=int(rng.integers(0, 365))),
+                    )
+                    db.add(scan)
+                    imt = float(rng.normal(0.75, 0.15))
+                    db.add(Result(
+                        id=str(uuid4()),
+                        scan_id=scan.id,
+                        imt_mm=round(imt, 2),
+                        risk_level="High" if imt >= 0.9 else "Moderate" if imt >= 0.7 else "Low",
+                        is_high_risk=imt >= 0.9,
+                        model_version="loadtest",
+                    ))
+            db.commit()
+
+
+def _serve(port: int, checkpoint: str, n_users: int, patients_per_user: int, scans_per_patient: int) -> None:
+    import uvicorn
+
+    import backend.auth
+    import backend.inference
+
+    # Firebase stub: the bearer token is the Firebase UID of a seeded user
+    backend.auth.verify_firebase_token = lambda token: token
+    backend.inference.MODEL_PATH = Path(checkpoint)
+    from backend.main import app
+
+    _seed(n_users, patients_per_user, scans_per_patient)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# Client side
+
+async def _wait_ready(client, timeout_s: float = 300.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise SystemExit("API did not come up")
+
+
+async def _run_scenario(
+    client, make_request: Callable[[int], "asyncio.Future"], n_requests: int, concurrency: int, warmup: int
+) -> Dict:
+    for i in range(warmup):
+        await make_request(i)
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(n_requests))
+
+    async def worker():
+        for i in counter:
+            t0 = time.perf_counter()
+            try:
+                r = await make_request(i)
+                ok = r.status_code < 400
+                key = str(r.status_code)
+            except Exception as e:
+                ok, key = False, type(e).__name__
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            if not ok:
+                errors[key] = errors.get(key, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    lat = np.array(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "mean_ms": round(float(lat.mean()), 2),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "wall_s": round(wall, 2),
+    }
+
+
+def _pick(items: List[str], i: int) -> str:
+    return items[(i * 7919) % len(items)]  # spread requests over the seeded patients
+
+
+async def _drive(base_url: str, args, images: List[bytes]) -> Dict[str, Dict]:
+    import httpx
+
+    tokens = [f"{TOKEN_PREFIX}{u}" for u in range(args.users)]
+    auth = [{"Authorization": f"Bearer {t}"} for t in tokens]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout_s, limits=limits) as client:
+        await _wait_ready(client)
+        patient_ids = []
+        for headers in auth:
+            r = await client.get("/patients", headers=headers)
+            r.raise_for_status()
+            patient_ids.append([p["id"] for p in r.json()])
+
+        scenarios = {
+            "predict": lambda i: client.post(
+                "/predict", files={"file": (f"frame_{i}.png", images[i % len(images)], "image/png")}
+            ),
+            "patients": lambda i: client.get("/patients", headers=auth[i % len(auth)]),
+            "scans": lambda i: client.get(
+                "/scans", params={"patient_id": _pick(patient_ids[i % len(auth)], i)}, headers=auth[i % len(auth)]
+            ),
+            "export": lambda i: client.get("/auth/me/export", headers=auth[i % len(auth)]),
+        }
+        results = {}
+        for name in args.scenarios:
+            n = args.export_requests if name == "export" else args.requests
+            results[name] = await _run_scenario(client, scenarios[name], n, args.concurrency, args.warmup)
+            print(f"{name:9s} {results[name]}")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline API load test (p50/p95/p99 latency, throughput)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--export_requests", type=int, default=50, help="Measured requests for /auth/me/export")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--patients_per_user", type=int, default=50)
+    parser.add_argument("--scans_per_patient", type=int, default=4)
+    parser.add_argument("--n_images", type=int, default=32, help="Distinct synthetic frames for /predict")
+    parser.add_argument("--checkpoint", type=str, default="models/carotid_swin_unetr_2d.pt")
+    parser.add_argument("--database_url", type=str, default=None, help="Default: fresh SQLite file in a temp dir")
+    parser.add_argument("--result_cache", action="store_true", help="Keep the /predict result cache on")
+    parser.add_argument("--timeout_s", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None)
+    parser.add_argument("--_serve", nargs=5, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._serve:
+        port, checkpoint, users, patients, scans = args._serve
+        _serve(int(port), checkpoint, int(users), int(patients), int(scans))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as tmp:
+        checkpoint = Path(args.checkpoint)
+        if not checkpoint.exists():
+            print(f"Checkpoint {checkpoint} not found: using a randomly initialised model")
+            checkpoint = random_checkpoint(Path(tmp) / "random_init.pt")
+        env = {
+            **os.environ,
+            "DATABASE_URL": args.database_url or f"sqlite:///{Path(tmp) / 'loadtest.db'}",
+            "RESULT_CACHE_DB": "",
+            "PROFILE_SAMPLE_RATE": "0",
+        }
+        if not args.result_cache:
+            env["RESULT_CACHE_SIZE"] = "0"
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.loadtest", "--_serve", str(port), str(checkpoint),
+             str(args.users), str(args.patients_per_user), str(args.scans_per_patient)],
+            env=env,
+        )
+        try:
+            rng = np.random.default_rng(args.seed)
+            images = [synthetic_ultrasound(rng) for _ in range(args.n_images)]
+            results = asyncio.run(_drive(f"http://127.0.0.1:{port}", args, images))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    import torch
+
+    report = {
+        "environment": {
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "inference_backend": os.getenv("INFERENCE_BACKEND", "torch"),
+            "database": "custom" if args.database_url else "sqlite",
+            "checkpoint": "random_init" if checkpoint.name == "random_init.pt" else str(checkpoint),
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "_serve")},
+        "scenarios": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,48 +3,68 @@ Data quality assurance for carotid ultrasound dataset.
 - Removal/flagging of bad images
 - Mask consistency checks (non-empty, reasonable coverage, shape match)
 - Handling of corrupted or invalid files
+Each file is decoded once per check; filter_and_flag_pairs spreads pairs over a process pool in chunks.
 """
 
 from __future__ import annotations
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import numpy as np
 import cv2
 
+try:
+    from carotid.dedup import phash
+except ImportError:  # carotid/ scripts import their siblings directly
+    from dedup import phash
 
-def validate_image_readable(path: str | Path) -> Tuple[bool, Optional[str]]:
-    """Check if image loads and is not corrupted. Returns (ok, error_msg)."""
+DEFAULT_CHUNKSIZE = 16
+
+
+def _load_grayscale(path: str | Path, kind: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """Decode once (colour files fall back to their first channel). Returns (array, None) or (None, error_msg)."""
     try:
         img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
         if img is None:
             img = cv2.imread(str(path))
             if img is None:
-                return False, "Failed to load image"
+                return None, f"Failed to load {kind}"
             img = img[:, :, 0] if img.ndim == 3 else img
         if img.size == 0 or img.ndim != 2:
-            return False, f"Invalid shape: {getattr(img, 'shape', 'unknown')}"
-        if np.all(img == img.flat[0]):
-            return False, "Image is constant (possibly corrupted)"
-        return True, None
+            return None, f"Invalid shape: {getattr(img, 'shape', 'unknown')}"
+        return img, None
     except Exception as e:
-        return False, str(e)
+        return None, str(e)
+
+
+def _check_image(img: np.ndarray) -> Optional[str]:
+    # min == max is np.all(img == img.flat[0]) without a full-size boolean temporary
+    if img.min() == img.max():
+        return "Image is constant (possibly corrupted)"
+    return None
+
+
+def validate_image_readable(path: str | Path) -> Tuple[bool, Optional[str]]:
+    """Check if image loads and is not corrupted. Returns (ok, error_msg)."""
+    img, err = _load_grayscale(path, "image")
+    if err is None:
+        err = _check_image(img)
+    return err is None, err
 
 
 def validate_mask_readable(path: str | Path) -> Tuple[bool, Optional[str]]:
     """Check if mask loads and is not corrupted. Returns (ok, error_msg)."""
-    try:
-        mask = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
-        if mask is None:
-            mask = cv2.imread(str(path))
-            if mask is None:
-                return False, "Failed to load mask"
-            mask = mask[:, :, 0] if mask.ndim == 3 else mask
-        if mask.size == 0 or mask.ndim != 2:
-            return False, f"Invalid shape: {getattr(mask, 'shape', 'unknown')}"
-        return True, None
-    except Exception as e:
-        return False, str(e)
+    _, err = _load_grayscale(path, "mask")
+    return err is None, err
+
+
+def mask_coverage(mask: np.ndarray) -> float:
+    """Foreground fraction of a mask (> 0, or > 127 for float masks)."""
+    foreground = np.count_nonzero(mask > 127) if mask.dtype in (np.float32, np.float64) else np.count_nonzero(mask > 0)
+    return foreground / mask.size
 
 
 def check_mask_consistency(
@@ -63,9 +83,7 @@ def check_mask_consistency(
     h, w = mask.shape
     if img_shape is not None and (h, w) != img_shape:
         return False, f"Mask shape {mask.shape} != image shape {img_shape}"
-    foreground = np.sum(mask > 127) if mask.dtype in (np.float32, np.float64) else np.sum(mask > 0)
-    total = h * w
-    coverage = foreground / total
+    coverage = mask_coverage(mask)
     if coverage < min_coverage_pct:
         return False, f"Mask nearly empty (coverage={coverage:.4f})"
     if coverage > max_coverage_pct:
@@ -73,64 +91,135 @@ def check_mask_consistency(
     return True, None
 
 
-def validate_pair(
+def inspect_pair(
     img_path: str | Path,
     mask_path: str | Path,
     min_coverage_pct: float = 0.001,
     max_coverage_pct: float = 0.95,
     require_shape_match: bool = True,
-) -> Tuple[bool, Optional[str]]:
+    with_phash: bool = False,
+) -> Dict:
     """
-    Validate image/mask pair: readability + consistency.
-    Returns (ok, error_msg).
+    validate_pair plus what the checks measured:
+    {"ok", "reason", "image_shape": [h, w] or None, "mask_coverage": float or None,
+     "phash": 16-digit hex (dedup.phash) or None}. The pHash is only computed with with_phash=True (grouped
+    train/val split), while the image is decoded anyway.
     """
-    ok, err = validate_image_readable(img_path)
-    if not ok:
-        return False, f"Image: {err}"
-    img = cv2.imread(str(img_path), cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        img = cv2.imread(str(img_path))[:, :, 0]
-    img_shape = img.shape[:2]
-
-    ok, err = validate_mask_readable(mask_path)
-    if not ok:
-        return False, f"Mask: {err}"
-    mask = cv2.imread(str(mask_path), cv2.IMREAD_GRAYSCALE)
-    if mask is None:
-        mask = cv2.imread(str(mask_path))[:, :, 0]
+    record = {"ok": False, "reason": None, "image_shape": None, "mask_coverage": None, "phash": None}
+    img, err = _load_grayscale(img_path, "image")
+    if err is None:
+        record["image_shape"] = list(img.shape[:2])
+        err = _check_image(img)
+    if err is None and with_phash:
+        record["phash"] = f"{phash(img):016x}"
+    if err is not None:
+        record["reason"] = f"Image: {err}"
+        return record
+
+    mask, err = _load_grayscale(mask_path, "mask")
+    if err is not None:
+        record["reason"] = f"Mask: {err}"
+        return record
+    record["mask_coverage"] = float(mask_coverage(mask))
 
     ok, err = check_mask_consistency(
         mask,
-        img_shape=img_shape if require_shape_match else None,
+        img_shape=img.shape[:2] if require_shape_match else None,
         min_coverage_pct=min_coverage_pct,
         max_coverage_pct=max_coverage_pct,
     )
-    if not ok:
-        return False, err
-    return True, None
+    record["ok"], record["reason"] = ok, err
+    return record
+
+
+def validate_pair(
+    img_path: str | Path,
+    mask_path: str | Path,
+    min_coverage_pct: float = 0.001,
+    max_coverage_pct: float = 0.95,
+    require_shape_match: bool = True,
+) -> Tuple[bool, Optional[str]]:
+    """
+    Validate image/mask pair: readability + consistency, decoding each file once.
+    Returns (ok, error_msg).
+    """
+    record = inspect_pair(img_path, mask_path, min_coverage_pct, max_coverage_pct, require_shape_match)
+    return record["ok"], record["reason"]
+
+
+def _inspect_chunk(check: Callable, chunk: List[Tuple[str, str]]) -> List[Dict]:
+    return [check(img_path, mask_path) for img_path, mask_path in chunk]
+
+
+def iter_inspect_pairs(
+    pairs: List[Tuple[str, str]],
+    min_coverage_pct: float = 0.001,
+    max_coverage_pct: float = 0.95,
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    with_phash: bool = False,
+) -> Iterator[Tuple[Tuple[str, str], Dict]]:
+    """
+    Yield ((img_path, mask_path), inspect_pair record) for each pair, in input order, as results come in.
+    Chunks of `chunksize` pairs go to a process pool of `workers` (default: CPU count, at most 8;
+    1 = this process).
+    """
+    check = partial(
+        inspect_pair, min_coverage_pct=min_coverage_pct, max_coverage_pct=max_coverage_pct, with_phash=with_phash
+    )
+    workers = min(os.cpu_count() or 1, 8) if workers is None else max(1, workers)
+    chunksize = max(1, chunksize)
+    chunks = [pairs[i : i + chunksize] for i in range(0, len(pairs), chunksize)]
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from zip(chunk, _inspect_chunk(check, chunk))
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        for chunk, records in zip(chunks, pool.map(partial(_inspect_chunk, check), chunks)):
+            yield from zip(chunk, records)
+
+
+def iter_validate_pairs(
+    pairs: List[Tuple[str, str]],
+    min_coverage_pct: float = 0.001,
+    max_coverage_pct: float = 0.95,
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> Iterator[Tuple[Tuple[str, str], bool, Optional[str]]]:
+    """Yield ((img_path, mask_path), ok, error_msg) for each pair; see iter_inspect_pairs."""
+    for pair, record in iter_inspect_pairs(pairs, min_coverage_pct, max_coverage_pct, workers, chunksize):
+        yield pair, record["ok"], record["reason"]
 
 
 def filter_and_flag_pairs(
     pairs: List[Tuple[str, str]],
     min_coverage_pct: float = 0.001,
     max_coverage_pct: float = 0.95,
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    on_flagged: Optional[Callable[[Dict], None]] = None,
 ) -> Tuple[List[Tuple[str, str]], List[Dict]]:
     """
     Validate all pairs; keep valid, flag invalid with reason.
-    Returns (valid_pairs, flagged_list).
+    Returns (valid_pairs, flagged_list), both in input order.
     flagged_list: [{"img": ..., "mask": ..., "reason": ...}, ...]
+    on_flagged: called with each flagged record as soon as it is found (e.g. to log or write it out).
+    workers / chunksize: see iter_validate_pairs.
     """
     valid = []
     flagged = []
-    for img_path, mask_path in pairs:
-        ok, err = validate_pair(
-            img_path,
-            mask_path,
-            min_coverage_pct=min_coverage_pct,
-            max_coverage_pct=max_coverage_pct,
-        )
+    for (img_path, mask_path), ok, err in iter_validate_pairs(
+        pairs,
+        min_coverage_pct=min_coverage_pct,
+        max_coverage_pct=max_coverage_pct,
+        workers=workers,
+        chunksize=chunksize,
+    ):
         if ok:
             valid.append((img_path, mask_path))
         else:
-            flagged.append({"img": img_path, "mask": mask_path, "reason": err})
+            record = {"img": img_path, "mask": mask_path, "reason": err}
+            flagged.append(record)
+            if on_flagged is not None:
+                on_flagged(record)
     return valid, flagged
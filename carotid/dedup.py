@@ -0,0 +1,255 @@
+"""
+Near-duplicate and sequence-leakage detection for train/val splitting.
+
+Frames are grouped so that no group straddles train and val:
+- Acquisition ID: the file-name prefix before "_slice_<n>" (e.g. 202201121748100022VAS_slice_1069.png ->
+  202201121748100022VAS); adjacent slices of one acquisition are near-identical.
+- Perceptual hash: 64-bit pHash (DCT of a 32x32 thumbnail) or dHash; frames within `threshold` bits
+  (Hamming distance) are linked, which catches re-exports and copies across acquisitions.
+Neighbours are found with multi-index hashing instead of comparing all pairs; links are merged with union-find.
+With a grouped split, data_qa.inspect_pair (with_phash=True) records the pHash of the images it decodes and
+QAManifest.phashes fills in the rest, so hashes stored in the QA manifest are reused across runs.
+
+CLI (from project root):
+    python -m carotid.dedup "data/Common Carotid Artery Ultrasound Images" [--threshold 6] [--json dedup_report.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    from carotid.discovery import discover_pairs
+except ImportError:  # carotid/ scripts import their siblings directly
+    from discovery import discover_pairs
+
+DEFAULT_THRESHOLD = 6
+ACQUISITION_PATTERN = re.compile(r"^(?P<acquisition>.+?)_slice_\d+$")
+
+
+def phash(img: np.ndarray) -> int:
+    """64-bit DCT perceptual hash: low 8x8 frequencies of a 32x32 thumbnail against their median."""
+    small = cv2.resize(img.astype(np.float32), (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small)[:8, :8].ravel()
+    bits = low > np.median(low)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash(img: np.ndarray) -> int:
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 thumbnail."""
+    small = cv2.resize(img.astype(np.float32), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+HASHES = {"phash": phash, "dhash": dhash}
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def acquisition_id(path: str | Path) -> str:
+    """Acquisition a frame belongs to: the stem before "_slice_<n>", or the whole stem for other names."""
+    stem = Path(path).stem
+    match = ACQUISITION_PATTERN.match(stem)
+    return match.group("acquisition") if match else stem
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def _hash_chunk(method: str, paths: List[str]) -> List[Optional[int]]:
+    hashes = []
+    for path in paths:
+        img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        hashes.append(None if img is None or img.size == 0 else HASHES[method](img))
+    return hashes
+
+
+def image_hashes(
+    paths: Sequence[str],
+    method: str = "phash",
+    workers: Optional[int] = None,
+    chunksize: int = 16,
+) -> List[Optional[int]]:
+    """Hash of each image (None if it cannot be decoded), in input order; process pool as data_qa.iter_inspect_pairs."""
+    workers = min(os.cpu_count() or 1, 8) if workers is None else max(1, workers)
+    chunks = [list(paths[i : i + chunksize]) for i in range(0, len(paths), max(1, chunksize))]
+    if workers == 1 or len(chunks) <= 1:
+        return [h for chunk in chunks for h in _hash_chunk(method, chunk)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        return [h for hashes in pool.map(partial(_hash_chunk, method), chunks) for h in hashes]
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(x)
+    return np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def duplicate_links(hashes: Sequence[Optional[int]], threshold: int = DEFAULT_THRESHOLD) -> List[Tuple[int, int, int]]:
+    """
+    (i, j, distance) for every i < j whose hashes are within threshold bits (None entries are skipped).
+    Multi-index hashing: the 64 bits are cut into threshold + 1 slices, so any such pair agrees exactly on at
+    least one slice; only pairs sharing a slice value are compared.
+    """
+    index = np.array([i for i, h in enumerate(hashes) if h is not None], dtype=np.int64)
+    values = np.array([hashes[i] for i in index], dtype=np.uint64)
+    bounds = np.linspace(0, 64, min(threshold, 63) + 2).astype(int)
+    found = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        key = (values >> np.uint64(lo)) & np.uint64((1 << (hi - lo)) - 1)
+        order = np.argsort(key, kind="stable")
+        sorted_key, sorted_values = key[order], values[order]
+        # Equal slice values are contiguous after sorting: compare each hash with the one k places on, for
+        # growing k, until no run is longer than k
+        for k in range(1, len(order)):
+            same = np.flatnonzero(sorted_key[k:] == sorted_key[:-k])
+            if not len(same):
+                break
+            distance = _popcount(sorted_values[same] ^ sorted_values[same + k])
+            hit = distance <= threshold
+            a, b = order[same[hit]], order[same[hit] + k]
+            found.append(np.stack([np.minimum(a, b), np.maximum(a, b), distance[hit].astype(np.int64)], axis=1))
+    if not found:
+        return []
+    # A pair agreeing on several slices is found once per slice
+    links = np.unique(np.concatenate(found), axis=0)
+    return [(int(index[i]), int(index[j]), int(d)) for i, j, d in links]
+
+
+def group_frames(
+    paths: Sequence[str],
+    hashes: Optional[Sequence[Optional[int]]] = None,
+    threshold: int = DEFAULT_THRESHOLD,
+    method: str = "phash",
+    workers: Optional[int] = None,
+) -> Tuple[List[int], Dict]:
+    """
+    Leakage groups: frames sharing an acquisition ID or within `threshold` bits of each other end up in the
+    same group. hashes: precomputed per path (None entries are computed). Returns (group label per path, report).
+    report: {"images", "acquisitions", "groups", "largest_group", "duplicate_links", "duplicate_clusters":
+    [[path, ...], ...] (hash-linked frames), "cross_acquisition_clusters", "hashed", "seconds"}.
+    """
+    t0 = time.perf_counter()
+    hashes = list(hashes) if hashes is not None else [None] * len(paths)
+    missing = [i for i, h in enumerate(hashes) if h is None]
+    for i, h in zip(missing, image_hashes([paths[i] for i in missing], method, workers)):
+        hashes[i] = h
+
+    links = duplicate_links(hashes, threshold)
+    dup = _UnionFind(len(paths))
+    for i, j, _ in links:
+        dup.union(i, j)
+    groups = _UnionFind(len(paths))
+    for i, j, _ in links:
+        groups.union(i, j)
+    first_of_acquisition: Dict[str, int] = {}
+    for i, path in enumerate(paths):
+        groups.union(first_of_acquisition.setdefault(acquisition_id(path), i), i)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(paths)):
+        clusters.setdefault(dup.find(i), []).append(i)
+    duplicate_clusters = [members for members in clusters.values() if len(members) > 1]
+    labels = [groups.find(i) for i in range(len(paths))]
+    sizes: Dict[int, int] = {}
+    for label in labels:
+        sizes[label] = sizes.get(label, 0) + 1
+    report = {
+        "images": len(paths),
+        "acquisitions": len(first_of_acquisition),
+        "groups": len(sizes),
+        "largest_group": max(sizes.values(), default=0),
+        "duplicate_links": len(links),
+        "duplicate_clusters": [[str(paths[i]) for i in members] for members in duplicate_clusters],
+        "cross_acquisition_clusters": sum(
+            len({acquisition_id(paths[i]) for i in members}) > 1 for members in duplicate_clusters
+        ),
+        "hashed": len(missing),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return labels, report
+
+
+def grouped_split(
+    pairs: List[Tuple[str, str]],
+    test_size: float = 0.15,
+    seed: int = 42,
+    hashes: Optional[Sequence[Optional[int]]] = None,
+    threshold: int = DEFAULT_THRESHOLD,
+    workers: Optional[int] = None,
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]], Dict]:
+    """
+    Leakage-free train_test_split over (image, mask) pairs: whole groups (see group_frames) go to val, in a
+    seeded random order, until it holds at least test_size of the pairs. Returns (train_pairs, val_pairs, report).
+    """
+    labels, report = group_frames([img for img, _ in pairs], hashes, threshold, workers=workers)
+    order = list(dict.fromkeys(labels))
+    np.random.default_rng(seed).shuffle(order)
+    target = int(np.ceil(test_size * len(pairs)))
+    sizes: Dict[int, int] = {}
+    for label in labels:
+        sizes[label] = sizes.get(label, 0) + 1
+    val_groups, n_val = set(), 0
+    for label in order:
+        if n_val >= target or len(val_groups) == len(order) - 1:
+            break
+        val_groups.add(label)
+        n_val += sizes[label]
+    train = [pair for pair, label in zip(pairs, labels) if label not in val_groups]
+    val = [pair for pair, label in zip(pairs, labels) if label in val_groups]
+    report["val_groups"] = len(val_groups)
+    return train, val, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report near-duplicate clusters and acquisition groups")
+    parser.add_argument("root")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD, help="Max Hamming distance (bits of 64)")
+    parser.add_argument("--method", choices=sorted(HASHES), default="phash")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", type=str, default=None, help="Write the full report to this JSON file")
+    args = parser.parse_args()
+
+    paths = [img for img, _ in discover_pairs(args.root)["pairs"]]
+    _, report = group_frames(paths, threshold=args.threshold, method=args.method, workers=args.workers)
+    print(
+        f"{report['images']} images, {report['acquisitions']} acquisitions, {report['groups']} groups "
+        f"(largest {report['largest_group']}), {len(report['duplicate_clusters'])} duplicate clusters "
+        f"({report['cross_acquisition_clusters']} across acquisitions), {report['seconds']} s"
+    )
+    for members in sorted(report["duplicate_clusters"], key=len, reverse=True)[:20]:
+        print(f"  {len(members):4d}  " + ", ".join(Path(p).name for p in members[:4]) + (" ..." if len(members) > 4 else ""))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
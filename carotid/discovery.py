@@ -0,0 +1,149 @@
+"""
+Image/mask pair discovery from a single directory listing.
+
+The tree is listed once with os.scandir (no per-image Path.exists probes, which dominate on network mounts and
+large archives); masks are then matched by name against the in-memory index. For an image <dir>/<name>, the
+first of these wins:
+
+1. <root>/{Masks,masks,Labels,labels,Mask,mask}/<name>     (previous find_image_mask_pairs, same order)
+2. <dir>/<stem>_mask<suffix>                                (previous find_image_mask_pairs)
+3. <ancestor>/../{Masks,...,Expert mask images}/<name>      mask folder next to the image folder or one of its
+                                                            parents, e.g. "US images/" + "Expert mask images/"
+
+Files inside mask folders are never treated as images. Images come out in Path.rglob order, so pairs the
+previous implementation found keep their position (and the seeded train/val split stays the same).
+
+CLI (from project root):
+    python -m carotid.discovery "data/Common Carotid Artery Ultrasound Images" [--list]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+ROOT_MASK_DIRS = ("Masks", "masks", "Labels", "labels", "Mask", "mask")
+SIBLING_MASK_DIRS = ROOT_MASK_DIRS + ("Expert mask images",)
+MASK_SUFFIX = "_mask"
+
+
+def _scan(root: str, exts: Tuple[str, ...]) -> Tuple[List[str], Dict[str, List[str]]]:
+    """Pre-order walk in scandir order (as Path.rglob): (directories, {directory: file names with a wanted extension})."""
+    dirs: List[str] = []
+    files: Dict[str, List[str]] = {}
+
+    def visit(directory: str) -> None:
+        dirs.append(directory)
+        names = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            entries = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in exts and entry.is_file():
+                    names.append(entry.name)
+            except OSError:
+                continue
+        files[directory] = names
+        for sub in subdirs:
+            visit(sub)
+
+    visit(root)
+    return dirs, files
+
+
+def _in_mask_dir(directory: str, root: str) -> bool:
+    rel = os.path.relpath(directory, root)
+    return rel != "." and any(part in SIBLING_MASK_DIRS for part in Path(rel).parts)
+
+
+def discover_pairs(root: str | Path, exts: Tuple[str, ...] = (".png", ".jpg", ".jpeg")) -> Dict:
+    """
+    Find (image_path, mask_path) pairs under root. Returns
+    {"pairs": [(img, mask), ...], "unmatched_images": [img, ...], "orphan_masks": [mask, ...],
+     "directories": n, "files": n}.
+    Images are files whose name does not contain "mask" and that are not inside a mask folder; orphan masks are
+    files in mask folders or named *_mask that no image matched.
+    """
+    root = str(Path(root))
+    dirs, ordered = _scan(root, exts)
+    index = {d: set(names) for d, names in ordered.items()}
+
+    pairs: List[Tuple[str, str]] = []
+    unmatched: List[str] = []
+    used: Set[str] = set()
+    root_mask_dirs = [os.path.join(root, d) for d in ROOT_MASK_DIRS if os.path.join(root, d) in index]
+    for directory in dirs:
+        if _in_mask_dir(directory, root):
+            continue
+        for name in ordered[directory]:
+            if "mask" in name.lower():
+                continue
+            img_path = os.path.join(directory, name)
+            mask_path = None
+            for mask_dir in root_mask_dirs:
+                if name in index[mask_dir]:
+                    mask_path = os.path.join(mask_dir, name)
+                    break
+            if mask_path is None:
+                stem, suffix = os.path.splitext(name)
+                if f"{stem}{MASK_SUFFIX}{suffix}" in index[directory]:
+                    mask_path = os.path.join(directory, f"{stem}{MASK_SUFFIX}{suffix}")
+            ancestor = directory
+            while mask_path is None and ancestor != root and os.path.dirname(ancestor) != ancestor:
+                parent = os.path.dirname(ancestor)
+                for mask_dir in SIBLING_MASK_DIRS:
+                    candidate = os.path.join(parent, mask_dir)
+                    if name in index.get(candidate, ()):
+                        mask_path = os.path.join(candidate, name)
+                        break
+                ancestor = parent
+            if mask_path is None:
+                unmatched.append(img_path)
+            else:
+                pairs.append((img_path, mask_path))
+                used.add(mask_path)
+
+    orphans = []
+    for directory in dirs:
+        in_mask_dir = _in_mask_dir(directory, root)
+        for name in ordered[directory]:
+            path = os.path.join(directory, name)
+            if (in_mask_dir or os.path.splitext(name)[0].endswith(MASK_SUFFIX)) and path not in used:
+                orphans.append(path)
+    return {
+        "pairs": pairs,
+        "unmatched_images": unmatched,
+        "orphan_masks": orphans,
+        "directories": len(dirs),
+        "files": sum(len(names) for names in ordered.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List image/mask pairs, unmatched images and orphan masks")
+    parser.add_argument("root")
+    parser.add_argument("--list", action="store_true", help="Print every unmatched image and orphan mask")
+    args = parser.parse_args()
+
+    found = discover_pairs(args.root)
+    print(
+        f"{args.root}: {len(found['pairs'])} pairs, {len(found['unmatched_images'])} unmatched images, "
+        f"{len(found['orphan_masks'])} orphan masks ({found['files']} files in {found['directories']} directories)"
+    )
+    if args.list:
+        for path in found["unmatched_images"]:
+            print(f"unmatched\t{path}")
+        for path in found["orphan_masks"]:
+            print(f"orphan\t{path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Packed training set: images, masks, spacing and QA metadata in a few contiguous shard files plus a JSON index,
+read back through np.memmap without decoding a single PNG.
+
+Layout:
+
+    <pack>/index.json            version, cleaner config (if images are stored cleaned), shards, per-sample
+                                 source paths, spacing, QA record and (shard, offset, shape, dtype) per array
+    <pack>/shard-00000.bin       raw arrays back to back, each aligned to 64 bytes
+
+Images and masks are decoded with MomotCarotidDataset's loader (pipeline.load_array). Images are stored as decoded
+(uint8 for PNG) or, with a cleaner, already cleaned (max-normalised, CLAHE + DWT, float32), which also skips the
+cleaning cost at train time (images then take 4x the space of uint8). Shards are mapped
+copy-on-write (mode "c"): samples are views of the page cache, and transforms that write into them (Cutout)
+touch private pages only. A pack is built in a temporary directory and renamed into place.
+
+PackedCarotidDataset gives random access (DataLoader shuffle); PackedCarotidStream reads samples in storage
+order, shard by shard and split across DataLoader workers, for sequential reads on slow disks.
+
+CLI (from project root):
+    python -m carotid.packed_dataset pack --data_root data --out packed/ [--qa_manifest models/qa_manifest.json] [--clean]
+    python -m carotid.packed_dataset info packed/
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+try:
+    from carotid.discovery import discover_pairs
+    from carotid.pipeline import load_array
+    from carotid.preprocessing import MedicalDataCleaner
+    from carotid.qa_manifest import QAManifest
+except ImportError:  # carotid/ scripts import their siblings directly
+    from discovery import discover_pairs
+    from pipeline import load_array
+    from preprocessing import MedicalDataCleaner
+    from qa_manifest import QAManifest
+
+PACK_VERSION = 1
+INDEX_NAME = "index.json"
+DEFAULT_SHARD_BYTES = 1 << 30
+ALIGNMENT = 64
+
+
+def clean_image(img: np.ndarray, cleaner: MedicalDataCleaner) -> np.ndarray:
+    """Same as MomotCarotidDataset: max-normalise, then CLAHE + DWT."""
+    img = img.astype(np.float32) / (np.max(img) + 1e-8)
+    return cleaner(img, apply_clahe=True, apply_dwt=True)
+
+
+class _ShardWriter:
+    def __init__(self, directory: Path, shard_bytes: int):
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        self.shards: List[str] = []
+        self._file = None
+        self._offset = 0
+
+    def _open(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        name = f"shard-{len(self.shards):05d}.bin"
+        self.shards.append(name)
+        self._file = open(self.directory / name, "wb")
+        self._offset = 0
+
+    def write(self, arrays: Sequence[np.ndarray]) -> Tuple[int, List[List]]:
+        """Write one sample's arrays into the same shard; returns (shard, [[offset, shape, dtype], ...])."""
+        size = sum(-(-a.nbytes // ALIGNMENT) * ALIGNMENT for a in arrays)
+        if self._file is None or (self._offset and self._offset + size > self.shard_bytes):
+            self._open()
+        placed = []
+        for arr in arrays:
+            arr = np.ascontiguousarray(arr)
+            placed.append([self._offset, list(arr.shape), arr.dtype.str])
+            self._file.write(arr.tobytes())
+            padding = -arr.nbytes % ALIGNMENT
+            self._file.write(b"\0" * padding)
+            self._offset += arr.nbytes + padding
+        return len(self.shards) - 1, placed
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+def pack(
+    items: List[Dict[str, Any]],
+    out_dir: str | Path,
+    cleaner: Optional[MedicalDataCleaner] = None,
+    qa: Optional[List[Optional[Dict]]] = None,
+    shard_bytes: int = DEFAULT_SHARD_BYTES,
+) -> Dict:
+    """
+    Pack items ({"image": path, "label": path, "spacing_mm_per_pixel": float}, as MomotCarotidDataset takes)
+    into out_dir, replacing any previous pack there. cleaner: store cleaned float32 images instead of decoded
+    ones. qa: per-item QA record (e.g. QAManifest entry) kept in the index. Returns the index summary.
+    """
+    out_dir = Path(out_dir)
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=out_dir.parent, prefix=f".{out_dir.name}.", suffix=".tmp"))
+    try:
+        writer = _ShardWriter(tmp, shard_bytes)
+        samples = []
+        for i, item in enumerate(items):
+            img = load_array(item["image"])
+            if cleaner is not None:
+                img = np.asarray(clean_image(img, cleaner), dtype=np.float32)
+            lbl = load_array(item["label"])
+            shard, (img_ref, lbl_ref) = writer.write([img, lbl])
+            samples.append({
+                "image": str(item["image"]),
+                "label": str(item["label"]),
+                "spacing_mm_per_pixel": item.get("spacing_mm_per_pixel", 0.04),
+                "shard": shard,
+                "arrays": {"image": img_ref, "label": lbl_ref},
+                "qa": qa[i] if qa is not None else None,
+            })
+        writer.close()
+        index = {
+            "version": PACK_VERSION,
+            "cleaner": cleaner.config() if cleaner is not None else None,
+            "shards": writer.shards,
+            "samples": samples,
+        }
+        with open(tmp / INDEX_NAME, "w") as f:
+            json.dump(index, f)
+        if out_dir.exists():
+            shutil.rmtree(out_dir)
+        os.replace(tmp, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return summary(index)
+
+
+def summary(index: Dict) -> Dict:
+    return {
+        "samples": len(index["samples"]),
+        "shards": len(index["shards"]),
+        "cleaned": index["cleaner"] is not None,
+    }
+
+
+def load_index(pack_dir: str | Path) -> Dict:
+    path = Path(pack_dir) / INDEX_NAME
+    if not path.exists():
+        raise FileNotFoundError(f"No packed dataset at {pack_dir} (missing {INDEX_NAME})")
+    with open(path) as f:
+        index = json.load(f)
+    if index.get("version") != PACK_VERSION:
+        raise ValueError(f"Packed dataset {pack_dir} has version {index.get('version')}, expected {PACK_VERSION}; re-pack it")
+    return index
+
+
+class PackedCarotidDataset(torch.utils.data.Dataset):
+    """
+    MomotCarotidDataset over a pack: same samples ({"image": (1, H, W), "label": (1, H, W), "spacing_mm_per_pixel"})
+    read from memory-mapped shards. indices: subset of pack samples (e.g. a train/val split), default all.
+    cleaner: applied to decoded images; for a pack of cleaned images it must match the one used to pack.
+    """
+
+    def __init__(
+        self,
+        pack_dir: str | Path,
+        cleaner: Optional[MedicalDataCleaner] = None,
+        transform: Optional[Callable] = None,
+        indices: Optional[Sequence[int]] = None,
+        index: Optional[Dict] = None,
+    ):
+        self.pack_dir = Path(pack_dir)
+        self.index = index if index is not None else load_index(pack_dir)
+        self.samples = self.index["samples"]
+        self.indices = list(indices) if indices is not None else list(range(len(self.samples)))
+        self.cleaned = self.index["cleaner"] is not None
+        if self.cleaned and cleaner is not None and cleaner.config() != self.index["cleaner"]:
+            raise ValueError(
+                f"{pack_dir} holds images cleaned with {self.index['cleaner']}, not {cleaner.config()}; re-pack it"
+            )
+        self.cleaner = None if self.cleaned else (cleaner or MedicalDataCleaner())
+        self.transform = transform
+        self._shards: Dict[int, np.memmap] = {}
+
+    def __getstate__(self) -> Dict:
+        # Picklable for DataLoader workers: each process maps the shards itself
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def _shard(self, shard: int) -> np.memmap:
+        mm = self._shards.get(shard)
+        if mm is None:
+            mm = np.memmap(self.pack_dir / self.index["shards"][shard], dtype=np.uint8, mode="c")
+            self._shards[shard] = mm
+        return mm
+
+    def array(self, sample: Dict, key: str) -> np.ndarray:
+        """Zero-copy (copy-on-write) view of one stored array."""
+        offset, shape, dtype = sample["arrays"][key]
+        return np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=self._shard(sample["shard"]), offset=offset)
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """Source (image, mask) paths of the samples in this dataset, in order."""
+        return [(self.samples[i]["image"], self.samples[i]["label"]) for i in self.indices]
+
+    def phashes(self) -> List[Optional[int]]:
+        """Image pHash from each sample's QA record (None if not recorded), for dedup.grouped_split."""
+        hashes = []
+        for i in self.indices:
+            value = (self.samples[i]["qa"] or {}).get("phash")
+            hashes.append(int(value, 16) if value else None)
+        return hashes
+
+    def sample(self, position: int) -> Dict[str, Any]:
+        """Item at a pack position (not a dataset index), before transforms."""
+        sample = self.samples[position]
+        img = self.array(sample, "image")
+        if not self.cleaned:
+            img = clean_image(img, self.cleaner)
+        return {
+            "image": img[None],
+            "label": self.array(sample, "label")[None],
+            "spacing_mm_per_pixel": sample["spacing_mm_per_pixel"],
+        }
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        data = self.sample(self.indices[idx])
+        if self.transform:
+            data = self.transform(data)
+        return data
+
+
+class PackedCarotidStream(torch.utils.data.IterableDataset):
+    """
+    Sequential reader over a PackedCarotidDataset: samples in storage order, whole shards per DataLoader
+    worker. shuffle_shards: visit shards in a random order per epoch (set_epoch) for some mixing without
+    random reads.
+    """
+
+    def __init__(self, dataset: PackedCarotidDataset, shuffle_shards: bool = False, seed: int = 0):
+        self.dataset = dataset
+        self.shuffle_shards = shuffle_shards
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        by_shard: Dict[int, List[int]] = {}
+        for position in sorted(self.dataset.indices, key=lambda p: self.dataset.samples[p]["arrays"]["image"][0]):
+            by_shard.setdefault(self.dataset.samples[position]["shard"], []).append(position)
+        shards = sorted(by_shard)
+        if self.shuffle_shards:
+            np.random.default_rng(self.seed + self.epoch).shuffle(shards)
+        worker = torch.utils.data.get_worker_info()
+        if worker is not None:
+            shards = shards[worker.id :: worker.num_workers]
+        for shard in shards:
+            for position in by_shard[shard]:
+                data = self.dataset.sample(position)
+                if self.dataset.transform:
+                    data = self.dataset.transform(data)
+                yield data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a carotid dataset into memory-mapped shards, or inspect a pack")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("pack", help="Discover, QA and pack image/mask pairs")
+    build.add_argument("--data_root", required=True)
+    build.add_argument("--out", required=True)
+    build.add_argument("--qa_manifest", type=str, default=None, help="QA manifest to reuse (default: <out>.qa_manifest.json)")
+    build.add_argument("--clean", action="store_true", help="Store cleaned float32 images (training cleaner settings)")
+    build.add_argument("--shard_mb", type=int, default=DEFAULT_SHARD_BYTES >> 20)
+    build.add_argument("--spacing_mm_per_pixel", type=float, default=0.04)
+    info = sub.add_parser("info", help="Summary of a pack")
+    info.add_argument("pack")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        index = load_index(args.pack)
+        sizes = [os.path.getsize(Path(args.pack) / name) for name in index["shards"]]
+        print(f"{args.pack}: {summary(index)}, {sum(sizes) / 2**20:.1f} MiB")
+        if index["cleaner"] is not None:
+            print(f"  cleaner: {index['cleaner']}")
+        return
+
+    pairs = discover_pairs(args.data_root)["pairs"]
+    manifest = QAManifest(args.qa_manifest or f"{args.out.rstrip('/')}.qa_manifest.json")
+    # Packs keep the pHashes so a grouped split does not need the source images
+    valid, flagged = manifest.validate(pairs, with_phash=True)
+    manifest.phashes(valid)
+    print(f"{len(pairs)} pairs, QA {manifest.last_run}; packing {len(valid)}")
+    items = [{"image": i, "label": m, "spacing_mm_per_pixel": args.spacing_mm_per_pixel} for i, m in valid]
+    qa = [{k: v for k, v in manifest.entries[QAManifest.key(i, m)].items() if k not in ("img", "mask")} for i, m in valid]
+    # Same settings as train_carotid.main
+    cleaner = MedicalDataCleaner(clahe_clip_limit=2.0, dwt_wavelet="db4", dwt_level=2) if args.clean else None
+    result = pack(items, args.out, cleaner=cleaner, qa=qa, shard_bytes=args.shard_mb << 20)
+    print(f"Packed {args.out}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+One preprocessing definition for training and serving.
+
+train_carotid.py writes it into the checkpoint under "preprocessing" (a plain dict, so weights_only loading
+keeps working); backend/inference.py compiles it from the checkpoint it serves. Stages, in order:
+
+    normalize   max-normalise to [0, 1] (float32)
+    cleaner     MedicalDataCleaner CLAHE + DWT at native resolution (MedicalDataCleaner.config(); None = off)
+    intensity   (x - p_lower) / (p_upper - p_lower), as MONAI ScaleIntensityRangePercentiles(b_min=None)
+    resize      bilinear to img_size (cv2 INTER_LINEAR = torch bilinear, align_corners=False)
+
+Checkpoints without the key get LEGACY_PREPROCESSING (max-normalise + resize), the serving behaviour they
+were deployed with.
+
+Decoding comes first and is shared too: decode_image (uploads) and load_array (dataset files) both go through
+cv2 grayscale, so training, packing and serving see the same (H, W) frame.
+"""
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    from carotid.preprocessing import MedicalDataCleaner
+except ImportError:  # carotid/ scripts import their siblings directly
+    from preprocessing import MedicalDataCleaner
+
+PREPROCESSING_VERSION = 1
+
+LEGACY_PREPROCESSING: Dict = {
+    "version": PREPROCESSING_VERSION,
+    "normalize": "max",
+    "cleaner": None,
+    "intensity": None,
+    "img_size": [224, 224],
+    "interpolation": "bilinear",
+}
+
+
+def training_preprocessing(
+    cleaner: MedicalDataCleaner,
+    img_size: Sequence[int],
+    percentiles: Tuple[float, float] = (1.0, 99.0),
+) -> Dict:
+    """Config of the train_carotid.py validation path: cleaner, percentile scaling, resize."""
+    return {
+        **LEGACY_PREPROCESSING,
+        "cleaner": cleaner.config(),
+        "intensity": {"type": "percentiles", "lower": float(percentiles[0]), "upper": float(percentiles[1])},
+        "img_size": [int(v) for v in img_size],
+    }
+
+
+def percentile_scale(img: np.ndarray, lower: float, upper: float) -> np.ndarray:
+    """(img - p_lower) / (p_upper - p_lower) in float32, no clipping; only shifted when the percentiles are equal."""
+    a_min, a_max = np.percentile(img, (lower, upper))
+    out = img.astype(np.float32, copy=True)
+    out -= np.float32(a_min)
+    if a_max - a_min != 0:
+        out /= np.float32(a_max - a_min)
+    return out
+
+
+def decode_image(data: bytes) -> Optional[np.ndarray]:
+    """Encoded image bytes -> grayscale (H, W) uint8 (colour converted by luminance); None if undecodable."""
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+
+
+def load_array(path: str | Path) -> np.ndarray:
+    """Image or mask file as a 2D array: .npy loaded as is (3D -> first channel), other files via decode_image."""
+    if str(path).endswith(".npy"):
+        arr = np.load(path)
+        return arr[0] if arr.ndim == 3 else arr
+    with open(path, "rb") as f:
+        arr = decode_image(f.read())
+    if arr is None:
+        raise ValueError(f"Failed to load {path}")
+    return arr
+
+
+class PreprocessingPipeline:
+    """
+    Compiled preprocessing config: __call__ maps a decoded grayscale frame (H, W) to the model input (h, w)
+    float32. Per-stage timings go to the optional `timings` dict (seconds).
+    """
+
+    def __init__(self, config: Optional[Dict] = None, dwt_backend: str = "pywt"):
+        config = {**LEGACY_PREPROCESSING, **(config or {})}
+        if config["version"] != PREPROCESSING_VERSION:
+            raise ValueError(f"Unsupported preprocessing version {config['version']} (expected {PREPROCESSING_VERSION})")
+        if config["normalize"] != "max":
+            raise ValueError(f"Unsupported normalize {config['normalize']!r}")
+        if config["interpolation"] != "bilinear":
+            raise ValueError(f"Unsupported interpolation {config['interpolation']!r}")
+        intensity = config["intensity"]
+        if intensity is not None and intensity.get("type") != "percentiles":
+            raise ValueError(f"Unsupported intensity scaling {intensity!r}")
+        self.config = config
+        self.cleaner = MedicalDataCleaner(**config["cleaner"], dwt_backend=dwt_backend) if config["cleaner"] else None
+        self.img_size = tuple(int(v) for v in config["img_size"])
+
+    @classmethod
+    def from_checkpoint(cls, state: Dict, dwt_backend: str = "pywt") -> "PreprocessingPipeline":
+        return cls(state.get("preprocessing") if isinstance(state, dict) else None, dwt_backend)
+
+    @property
+    def is_legacy(self) -> bool:
+        return self.cleaner is None and self.config["intensity"] is None
+
+    def __call__(
+        self,
+        img: np.ndarray,
+        size: Optional[Sequence[int]] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> np.ndarray:
+        t = time.perf_counter()
+
+        def mark(stage: str) -> None:
+            nonlocal t
+            if timings is not None:
+                now = time.perf_counter()
+                timings[stage] = timings.get(stage, 0.0) + now - t
+                t = now
+
+        if self.cleaner is not None:
+            # clean_batch max-normalises itself (uint8 quantisation identical to the float64 per-image path)
+            mark("normalize")
+            out = self.cleaner.clean_batch(img[None], workers=1)[0]
+            mark("cleaner")
+        else:
+            # Stay float32 under NumPy 2 scalar promotion
+            out = img.astype(np.float32) / np.float32(np.max(img) + 1e-8)
+            mark("normalize")
+        intensity = self.config["intensity"]
+        if intensity is not None:
+            out = percentile_scale(out, intensity["lower"], intensity["upper"])
+        mark("intensity")
+        height, width = size or self.img_size
+        out = cv2.resize(out, (width, height), interpolation=cv2.INTER_LINEAR)
+        mark("resize")
+        return out
+
+    def measure(self, img: np.ndarray, repeats: int = 5) -> Dict[str, float]:
+        """Best-of-repeats per-stage and total cost (ms) of preprocessing `img`."""
+        best: Dict[str, float] = {}
+        for _ in range(max(1, repeats)):
+            timings: Dict[str, float] = {}
+            self(img, timings=timings)
+            timings["total"] = sum(timings.values())
+            for stage, seconds in timings.items():
+                best[stage] = min(best.get(stage, float("inf")), seconds * 1000.0)
+        return {stage: round(ms, 3) for stage, ms in best.items()}
+
+    def describe(self) -> List[str]:
+        """Human-readable stage list, e.g. for startup logs."""
+        stages = ["normalize(max)"]
+        if self.cleaner is not None:
+            c = self.cleaner
+            stages.append(f"clahe(clip={c.clahe_clip_limit}, grid={tuple(c.clahe_grid_size)})")
+            stages.append(f"dwt({c.dwt_wavelet}, level={c.dwt_level}, {c.dwt_mode}, scale={c.dwt_threshold_scale})")
+        intensity = self.config["intensity"]
+        if intensity is not None:
+            stages.append(f"percentiles({intensity['lower']}, {intensity['upper']})")
+        stages.append(f"resize({self.img_size[0]}x{self.img_size[1]}, bilinear)")
+        return stages
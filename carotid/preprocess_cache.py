@@ -0,0 +1,138 @@
+"""
+Content-addressed on-disk cache of cleaned (CLAHE + DWT) training images.
+
+Entries are float32 .npy files keyed by a SHA-256 of the source file bytes, so an edited or replaced image
+is a new key. They live under a directory keyed by the cleaner parameters (clip limit, grid, wavelet, level,
+mode, threshold scale): changing any of them starts a fresh set of entries. Layout:
+
+    <root>/<params digest>/params.json
+    <root>/<params digest>/<sha[:2]>/<sha>.npy
+
+Entries are read with np.load(mmap_mode="r") (pages come from the OS page cache, shared by DataLoader workers)
+and written to a temporary file then os.replace'd, so concurrent writers and interrupted runs never leave
+a partial entry behind. Deleting <root> (or a params directory) is always safe.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+# Bump when the cleaning pipeline changes in a way the cleaner parameters do not capture
+CACHE_VERSION = 1
+
+
+def file_sha256(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def params_digest(params: Dict) -> str:
+    """Short, stable digest of JSON-serialisable preprocessing parameters."""
+    payload = json.dumps({"version": CACHE_VERSION, **params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class PreprocessCache:
+    """
+    Cleaned-image store shared by every dataset built on the same root. Thread- and process-safe for reads and
+    writes. File hashes are memoised per process on (path, size, mtime), so later epochs do not re-read sources.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.hits = 0
+        self.misses = 0
+        self._digests: Dict[str, Tuple[int, int, str]] = {}  # path -> (size, mtime_ns, sha256)
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict:
+        # Picklable for DataLoader workers started with spawn: the lock is per process
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def params_dir(self, params: Dict) -> Path:
+        directory = self.root / params_digest(params)
+        if not (directory / "params.json").exists():
+            directory.mkdir(parents=True, exist_ok=True)
+            self._write_atomic(
+                directory / "params.json",
+                lambda f: f.write(json.dumps({"version": CACHE_VERSION, **params}, indent=2, sort_keys=True).encode()),
+            )
+        return directory
+
+    def source_digest(self, path: str | Path) -> str:
+        key = os.fspath(path)
+        st = os.stat(key)
+        with self._lock:
+            known = self._digests.get(key)
+        if known is not None and known[:2] == (st.st_size, st.st_mtime_ns):
+            return known[2]
+        digest = file_sha256(key)
+        with self._lock:
+            self._digests[key] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def entry_path(self, path: str | Path, params: Dict) -> Path:
+        digest = self.source_digest(path)
+        return self.params_dir(params) / digest[:2] / f"{digest}.npy"
+
+    def load(self, path: str | Path, params: Dict, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Cleaned image for the source file `path` under `params`: memory-mapped (read-only) from the cache, or
+        compute() stored as float32 and returned. Unreadable entries are recomputed and overwritten.
+        """
+        entry = self.entry_path(path, params)
+        if entry.exists():
+            try:
+                arr = np.load(entry, mmap_mode="r")
+                with self._lock:
+                    self.hits += 1
+                return arr
+            except (OSError, ValueError):
+                pass
+        arr = np.ascontiguousarray(compute(), dtype=np.float32)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(entry, lambda f: np.save(f, arr))
+        with self._lock:
+            self.misses += 1
+        return arr
+
+    @staticmethod
+    def _write_atomic(target: Path, write: Callable) -> None:
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "root": str(self.root),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
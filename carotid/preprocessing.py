@@ -1,20 +1,96 @@
 """
 Medical imaging preprocessing for carotid artery ultrasound.
 CLAHE for localized contrast enhancement + DWT denoising to preserve intima-media boundaries.
+MedicalDataCleaner.clean_batch processes (N, H, W) stacks in float32, optionally across a thread pool.
+dwt_backend="torch" runs the DWT with carotid/torch_dwt.py (same result to float rounding) instead of PyWavelets.
 """
 
 from __future__ import annotations
 
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from typing import Tuple, Optional, Union
+from typing import Sequence, Tuple, Optional, Union
 import cv2
 import pywt
 
+DWT_BACKENDS = ("pywt", "torch")
+
+# CLAHE objects keep internal buffers and are not safe to share between threads: one per thread and setting.
+# Module level (not on the cleaner) so cleaners stay picklable for DataLoader workers.
+_clahe_local = threading.local()
+
+
+def _get_clahe(clip_limit: float, grid_size: Tuple[int, int]) -> "cv2.CLAHE":
+    cache = getattr(_clahe_local, "objects", None)
+    if cache is None:
+        cache = _clahe_local.objects = {}
+    key = (float(clip_limit), tuple(grid_size))
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cache[key] = cv2.createCLAHE(clipLimit=key[0], tileGridSize=key[1])
+    return clahe
+
+
+def _normalize_float32(chunk: np.ndarray) -> np.ndarray:
+    """Float32 copy of an (n, H, W) chunk with each image whose maximum exceeds 1 divided by (max + 1e-8)."""
+    out = chunk.astype(np.float32)
+    peak = out.max(axis=(1, 2))
+    scale = peak > 1.0
+    if scale.any():
+        out[scale] /= (peak[scale] + 1e-8)[:, None, None]
+    return out
+
+
+def _quantize_uint8(chunk: np.ndarray) -> np.ndarray:
+    """
+    The uint8 image MedicalDataCleaner feeds to CLAHE, for each image of an (n, H, W) chunk, bit-identical to
+    the per-image float64 path without a float64 copy of the stack: integer-valued images go through a
+    lookup table, float64 images are quantised as they are, float32 images with an exact floor(x * 255).
+    Only float32 images with non-integer values above 1 can differ (by one grey level, after normalisation).
+    """
+    out = np.empty(chunk.shape, dtype=np.uint8)
+    for i, img in enumerate(chunk):
+        peak = img.max()
+        if peak > 1 and img.dtype != np.float64 and (
+            np.issubdtype(img.dtype, np.integer) or np.array_equal(img, np.floor(img))
+        ):
+            values = np.arange(int(peak) + 1, dtype=np.float64) / (float(peak) + 1e-8)
+            out[i] = (np.clip(values, 0, 1) * 255).astype(np.uint8)[np.clip(img, 0, None).astype(np.intp)]
+        elif img.dtype == np.float64 or np.issubdtype(img.dtype, np.integer):
+            x = img / (peak + 1e-8) if peak > 1 else img
+            out[i] = (np.clip(x, 0, 1) * 255).astype(np.uint8)
+        else:
+            x = img.astype(np.float32)
+            if peak > 1:
+                x /= np.float32(peak + 1e-8)
+            x = np.clip(x, 0, 1)
+            # r = fl(x * 255) truncates like the exact product unless it rounds up onto an integer; 256x is exact
+            # and so is 256x - r (Sterbenz), so that case shows up as 256x - r < x
+            r = x * np.float32(255)
+            q = np.floor(r)
+            q -= (q == r) & (x * np.float32(256) - r < x)
+            out[i] = q
+    return out
+
+
+def _torch_dwt():
+    # Imported on first use: the default pywt backend does not need torch
+    try:
+        from carotid import torch_dwt
+    except ImportError:  # carotid/ scripts import their siblings directly
+        import torch_dwt
+    return torch_dwt
+
 
 class MedicalDataCleaner:
     """
     Preprocessing for carotid ultrasound: CLAHE + DWT denoising.
     Preserves intima-media boundaries while reducing speckle noise.
+    dwt_backend: "pywt" (default) or "torch" (carotid/torch_dwt.py on CPU tensors; the same coefficients to
+    ~1e-12 in float64 and ~1e-6 in float32). It only changes how the DWT runs, so it is not part of config().
     """
 
     def __init__(
@@ -25,13 +101,28 @@ class MedicalDataCleaner:
         dwt_level: int = 2,
         dwt_mode: str = "soft",
         dwt_threshold_scale: float = 1.0,
+        dwt_backend: str = "pywt",
     ):
+        if dwt_backend not in DWT_BACKENDS:
+            raise ValueError(f"Unknown dwt_backend {dwt_backend!r} (expected one of {DWT_BACKENDS})")
         self.clahe_clip_limit = clahe_clip_limit
         self.clahe_grid_size = clahe_grid_size
         self.dwt_wavelet = dwt_wavelet
         self.dwt_level = dwt_level
         self.dwt_mode = dwt_mode
         self.dwt_threshold_scale = dwt_threshold_scale
+        self.dwt_backend = dwt_backend
+
+    def config(self) -> dict:
+        """Constructor parameters (JSON-serialisable): MedicalDataCleaner(**cleaner.config()) rebuilds the cleaner."""
+        return {
+            "clahe_clip_limit": float(self.clahe_clip_limit),
+            "clahe_grid_size": [int(v) for v in self.clahe_grid_size],
+            "dwt_wavelet": str(self.dwt_wavelet),
+            "dwt_level": int(self.dwt_level),
+            "dwt_mode": str(self.dwt_mode),
+            "dwt_threshold_scale": float(self.dwt_threshold_scale),
+        }
 
     def _clahe(self, img: np.ndarray) -> np.ndarray:
         """Apply CLAHE for localized contrast enhancement."""
@@ -39,10 +130,7 @@ class MedicalDataCleaner:
         if img.max() > 1.0:
             img = img / (img.max() + 1e-8)
         img_uint8 = (np.clip(img, 0, 1) * 255).astype(np.uint8)
-        clahe = cv2.createCLAHE(
-            clipLimit=self.clahe_clip_limit,
-            tileGridSize=self.clahe_grid_size,
-        )
+        clahe = _get_clahe(self.clahe_clip_limit, self.clahe_grid_size)
         if img_uint8.ndim == 2:
             out = clahe.apply(img_uint8)
         else:
@@ -66,6 +154,8 @@ class MedicalDataCleaner:
 
     def _dwt_denoise_2d(self, img: np.ndarray) -> np.ndarray:
         """Single-channel 2D DWT denoising."""
+        if self.dwt_backend == "torch":
+            return self._torch_denoise(img[None])[0]
         # Multilevel decomposition
         coeffs = pywt.wavedec2(img, self.dwt_wavelet, level=self.dwt_level)
         # coeffs: [cA_n, (cH_n, cV_n, cD_n), ..., (cH_1, cV_1, cD_1)]
@@ -102,3 +192,82 @@ class MedicalDataCleaner:
         if apply_dwt:
             out = self._dwt_denoise(out)
         return np.clip(out, 0, 1).astype(np.float32)
+
+    def clean_batch(
+        self,
+        images: Union[np.ndarray, Sequence[np.ndarray]],
+        apply_clahe: bool = True,
+        apply_dwt: bool = True,
+        workers: Optional[int] = None,
+        chunk_size: int = 8,
+    ) -> np.ndarray:
+        """
+        Clean a stack of grayscale images (N, H, W), float [0,1] or uint8; same result as calling the cleaner
+        on each image (up to float32 rounding) but in float32 throughout, with the DWT run over a whole chunk
+        of images at once. Chunks of chunk_size images are spread over `workers` threads (default: CPU
+        count, at most 8; 1 = current thread); OpenCV, PyWavelets and NumPy release the GIL.
+        Returns float32 (N, H, W) in [0, 1].
+        """
+        stack = images if isinstance(images, np.ndarray) else np.stack([np.asarray(img) for img in images])
+        if stack.ndim != 3:
+            raise ValueError(f"Expected a grayscale stack (N, H, W), got shape {stack.shape}")
+        out = np.empty(stack.shape, dtype=np.float32)
+        starts = range(0, stack.shape[0], max(1, chunk_size))
+
+        def run(start: int) -> None:
+            chunk = stack[start : start + chunk_size]
+            out[start : start + len(chunk)] = self._clean_chunk(chunk, apply_clahe, apply_dwt)
+
+        workers = min(os.cpu_count() or 1, 8) if workers is None else max(1, workers)
+        if workers == 1 or len(starts) == 1:
+            for start in starts:
+                run(start)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(run, starts))
+        return out
+
+    def _clean_chunk(self, chunk: np.ndarray, apply_clahe: bool, apply_dwt: bool) -> np.ndarray:
+        """Float32 CLAHE + DWT denoising of an (n, H, W) chunk (the batched form of __call__)."""
+        if apply_clahe:
+            clahe = _get_clahe(self.clahe_clip_limit, self.clahe_grid_size)
+            img_uint8 = _quantize_uint8(chunk)
+            for i in range(len(img_uint8)):
+                img_uint8[i] = clahe.apply(img_uint8[i])
+            out = img_uint8.astype(np.float32)
+            out /= 255.0
+        else:
+            out = _normalize_float32(chunk)
+        if apply_dwt:
+            out = self._dwt_denoise_stack(out)
+        return np.clip(out, 0, 1, out=out)
+
+    def _dwt_denoise_stack(self, stack: np.ndarray) -> np.ndarray:
+        """_dwt_denoise_2d over the last two axes of an (n, H, W) float32 stack; thresholds are per image."""
+        if self.dwt_backend == "torch":
+            return self._torch_denoise(stack)
+        coeffs = pywt.wavedec2(stack, self.dwt_wavelet, level=self.dwt_level, axes=(-2, -1))
+        cA = coeffs[0]
+        per_image = cA[0].size
+        # Universal threshold per image on detail coefficients (soft thresholding)
+        if per_image:
+            sigma = np.median(np.abs(cA).reshape(len(cA), -1), axis=1) / 0.6745
+        else:
+            sigma = np.ones(len(cA))
+        thresh = self.dwt_threshold_scale * sigma * np.sqrt(2 * np.log(per_image + 1e-8))
+        thresh = thresh.astype(stack.dtype)[:, None, None]
+        detail_list = [
+            tuple(pywt.threshold(d, thresh, mode=self.dwt_mode) for d in level)
+            for level in coeffs[1:]
+        ]
+        rec = pywt.waverec2([cA] + detail_list, self.dwt_wavelet, axes=(-2, -1))
+        return rec[:, : stack.shape[1], : stack.shape[2]]
+
+    def _torch_denoise(self, stack: np.ndarray) -> np.ndarray:
+        """torch_dwt.dwt_denoise of an (n, H, W) stack, in the stack's dtype."""
+        import torch
+
+        with torch.inference_mode():
+            x = torch.from_numpy(np.ascontiguousarray(stack))
+            out = _torch_dwt().dwt_denoise(x, self.dwt_wavelet, self.dwt_level, self.dwt_mode, self.dwt_threshold_scale)
+        return out.numpy()
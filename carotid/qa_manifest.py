@@ -0,0 +1,242 @@
+"""
+Persistent QA manifest: data_qa verdicts reused across runs, so only new or modified pairs are re-checked.
+
+One JSON file holds, per image/mask pair: both files' path, size, mtime and SHA-256, the verdict and reason,
+the image shape, the mask coverage and, once a grouped split has asked for it, the image pHash. A pair is re-checked when it is new, when either file's size or mtime
+changed and its content hash did too (a touched or copied file keeps its verdict), when a file is missing,
+or when the QA thresholds differ from the ones the manifest was built with. Writes are atomic.
+
+CLI (from project root):
+    python -m carotid.qa_manifest show models/qa_manifest.json [--flagged]
+    python -m carotid.qa_manifest export models/qa_manifest.json --out flagged.csv [--all]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from carotid.data_qa import DEFAULT_CHUNKSIZE, iter_inspect_pairs
+    from carotid.dedup import image_hashes
+    from carotid.preprocess_cache import file_sha256
+except ImportError:  # carotid/ scripts import their siblings directly
+    from data_qa import DEFAULT_CHUNKSIZE, iter_inspect_pairs
+    from dedup import image_hashes
+    from preprocess_cache import file_sha256
+
+MANIFEST_VERSION = 1
+EXPORT_FIELDS = ("img", "mask", "ok", "reason", "image_shape", "mask_coverage", "checked_at")
+
+
+def _file_info(path: str) -> Optional[Dict]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class QAManifest:
+    """
+    QA verdicts keyed by (image, mask) absolute paths. validate() has the filter_and_flag_pairs contract;
+    last_run reports how many pairs were reused and how many were re-checked.
+    """
+
+    def __init__(self, path: str | Path, min_coverage_pct: float = 0.001, max_coverage_pct: float = 0.95):
+        self.path = Path(path)
+        self.params = {"min_coverage_pct": float(min_coverage_pct), "max_coverage_pct": float(max_coverage_pct)}
+        self.entries: Dict[str, Dict] = {}
+        self.last_run: Dict = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                data = json.load(f)
+            # Verdicts depend on the thresholds: other thresholds (or format) start from scratch
+            if data.get("version") == MANIFEST_VERSION and data.get("params") == self.params:
+                self.entries = data.get("entries", {})
+
+    @staticmethod
+    def key(img_path: str, mask_path: str) -> str:
+        return f"{os.path.abspath(img_path)}|{os.path.abspath(mask_path)}"
+
+    def _unchanged(self, recorded: Dict, current: Optional[Dict]) -> bool:
+        """Same file as when checked: same size and mtime, or same content after a touch / copy."""
+        if current is None or recorded.get("missing"):
+            return False
+        if (recorded["size"], recorded["mtime_ns"]) == (current["size"], current["mtime_ns"]):
+            return True
+        if recorded["size"] != current["size"]:
+            return False
+        current["sha256"] = file_sha256(current["path"])
+        return current["sha256"] == recorded.get("sha256")
+
+    def validate(
+        self,
+        pairs: List[Tuple[str, str]],
+        workers: Optional[int] = None,
+        chunksize: int = DEFAULT_CHUNKSIZE,
+        on_flagged: Optional[Callable[[Dict], None]] = None,
+        save: bool = True,
+        with_phash: bool = False,
+    ) -> Tuple[List[Tuple[str, str]], List[Dict]]:
+        """
+        (valid_pairs, flagged) like data_qa.filter_and_flag_pairs, re-checking only changed pairs.
+        with_phash: also hash the re-checked images (see phashes() for reused ones).
+        """
+        t0 = time.perf_counter()
+        stale: List[int] = []
+        infos: Dict[int, Tuple[Optional[Dict], Optional[Dict]]] = {}
+        for i, (img_path, mask_path) in enumerate(pairs):
+            entry = self.entries.get(self.key(img_path, mask_path))
+            img_info, mask_info = _file_info(str(img_path)), _file_info(str(mask_path))
+            if entry is not None and self._unchanged(entry["img"], img_info) and self._unchanged(entry["mask"], mask_info):
+                # Refresh size / mtime so the next run takes the fast path again
+                entry["img"].update({k: v for k, v in img_info.items() if k != "path"})
+                entry["mask"].update({k: v for k, v in mask_info.items() if k != "path"})
+                continue
+            stale.append(i)
+            infos[i] = (img_info, mask_info)
+
+        checked_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        stale_pairs = [pairs[i] for i in stale]
+        for i, (_, record) in zip(stale, iter_inspect_pairs(
+            stale_pairs, self.params["min_coverage_pct"], self.params["max_coverage_pct"], workers, chunksize, with_phash
+        )):
+            img_path, mask_path = pairs[i]
+            files = []
+            for path, info in zip(pairs[i], infos[i]):
+                if info is None:
+                    info = {"path": str(path), "missing": True}
+                elif "sha256" not in info:
+                    info["sha256"] = file_sha256(info["path"])
+                files.append(info)
+            self.entries[self.key(img_path, mask_path)] = {
+                "img": files[0],
+                "mask": files[1],
+                **record,
+                "checked_at": checked_at,
+            }
+
+        valid, flagged = [], []
+        for img_path, mask_path in pairs:
+            entry = self.entries[self.key(img_path, mask_path)]
+            if entry["ok"]:
+                valid.append((img_path, mask_path))
+            else:
+                record = {"img": img_path, "mask": mask_path, "reason": entry["reason"]}
+                flagged.append(record)
+                if on_flagged is not None:
+                    on_flagged(record)
+        self.last_run = {
+            "pairs": len(pairs),
+            "reused": len(pairs) - len(stale),
+            "checked": len(stale),
+            "flagged": len(flagged),
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+        if save:
+            self.save()
+        return valid, flagged
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "params": self.params, "entries": self.entries}, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def phashes(self, pairs: List[Tuple[str, str]], workers: Optional[int] = None, save: bool = True) -> List[Optional[int]]:
+        """
+        Image pHash of each pair, for dedup.grouped_split. Pairs validated without one are hashed now and the
+        hashes recorded, so a later grouped split reuses them; None for pairs not in the manifest or unreadable.
+        """
+        entries = [self.entries.get(self.key(img_path, mask_path)) for img_path, mask_path in pairs]
+        missing = [i for i, entry in enumerate(entries) if entry is not None and entry["ok"] and not entry.get("phash")]
+        if missing:
+            for i, h in zip(missing, image_hashes([pairs[i][0] for i in missing], workers=workers)):
+                entries[i]["phash"] = f"{h:016x}" if h is not None else None
+            if save:
+                self.save()
+        return [int(entry["phash"], 16) if entry is not None and entry.get("phash") else None for entry in entries]
+
+    def records(self, flagged_only: bool = False) -> List[Dict]:
+        """Flat rows (EXPORT_FIELDS) for display / export, flagged first."""
+        rows = []
+        for entry in self.entries.values():
+            if flagged_only and entry["ok"]:
+                continue
+            rows.append({
+                "img": entry["img"]["path"],
+                "mask": entry["mask"]["path"],
+                "ok": entry["ok"],
+                "reason": entry["reason"],
+                "image_shape": entry["image_shape"],
+                "mask_coverage": entry["mask_coverage"],
+                "checked_at": entry["checked_at"],
+            })
+        return sorted(rows, key=lambda r: (r["ok"], str(r["img"])))
+
+
+def _load_existing(path: str) -> QAManifest:
+    if not Path(path).exists():
+        raise SystemExit(f"No QA manifest at {path}")
+    with open(path) as f:
+        params = json.load(f).get("params", {})
+    return QAManifest(path, **params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect / export the dataset QA manifest")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="Summary and flagged pairs")
+    show.add_argument("manifest")
+    show.add_argument("--flagged", action="store_true", help="List every flagged pair with its reason")
+    export = sub.add_parser("export", help="Write flagged (or all) pairs as CSV or JSON")
+    export.add_argument("manifest")
+    export.add_argument("--out", required=True, help=".csv or .json")
+    export.add_argument("--all", action="store_true", help="Export every pair, not only flagged ones")
+    args = parser.parse_args()
+
+    manifest = _load_existing(args.manifest)
+    if args.command == "show":
+        flagged = manifest.records(flagged_only=True)
+        reasons: Dict[str, int] = {}
+        for r in flagged:
+            kind = r["reason"].split(" (")[0]
+            reasons[kind] = reasons.get(kind, 0) + 1
+        print(f"{args.manifest}: {len(manifest.entries)} pairs, {len(flagged)} flagged, thresholds {manifest.params}")
+        for kind, n in sorted(reasons.items(), key=lambda kv: -kv[1]):
+            print(f"  {n:5d}  {kind}")
+        if args.flagged:
+            for r in flagged:
+                print(f"{r['img']}\t{r['mask']}\t{r['reason']}")
+        return
+
+    rows = manifest.records(flagged_only=not args.all)
+    if args.out.endswith(".json"):
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
+    else:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    print(f"Wrote {len(rows)} rows to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,6 @@ import torch.nn as nn
 from torch.utils.data import DataLoader
 
 import monai
-from monai.data import load_image
 from monai.losses import DiceCELoss
 from monai.metrics import DiceMetric
 from monai.transforms import (
@@ -36,31 +35,32 @@ from monai.networks.nets import SwinUNETR
 
 from sklearn.model_selection import train_test_split
 
-from preprocessing import MedicalDataCleaner
-from imt_utils import imt_mae_mm
-from data_qa import filter_and_flag_pairs
+try:
+    from carotid.preprocessing import MedicalDataCleaner
+    from carotid.preprocess_cache import PreprocessCache
+    from carotid.pipeline import load_array, training_preprocessing
+    from carotid.imt_utils import imt_mae_mm
+    from carotid.qa_manifest import QAManifest
+    from carotid.discovery import discover_pairs
+    from carotid.dedup import DEFAULT_THRESHOLD, grouped_split
+    from carotid.packed_dataset import PackedCarotidDataset
+except ImportError:  # carotid/ scripts import their siblings directly
+    from preprocessing import MedicalDataCleaner
+    from preprocess_cache import PreprocessCache
+    from pipeline import load_array, training_preprocessing
+    from imt_utils import imt_mae_mm
+    from qa_manifest import QAManifest
+    from discovery import discover_pairs
+    from dedup import DEFAULT_THRESHOLD, grouped_split
+    from packed_dataset import PackedCarotidDataset
 
 IMT_HIGH_RISK_MM = 0.9  # Clinical threshold for stroke risk triage (matches notebook)
 SPACING_MM_PER_PIXEL = 0.04
 
 
 def find_image_mask_pairs(root: Path, exts: Tuple[str, ...] = (".png", ".jpg", ".jpeg")) -> List[Tuple[str, str]]:
-    """Find (image_path, mask_path) pairs. Same logic as notebook. Checks Masks/, masks/, Labels/, or _mask suffix."""
-    root = Path(root)
-    images = [p for p in root.rglob("*") if p.suffix.lower() in exts and "mask" not in p.name.lower()]
-    pairs = []
-    for img_path in images:
-        for mask_dir in ("Masks", "masks", "Labels", "labels", "Mask", "mask"):
-            mask_path = root / mask_dir / img_path.name
-            if mask_path.exists():
-                pairs.append((str(img_path), str(mask_path)))
-                break
-        else:
-            stem, suf = img_path.stem, img_path.suffix
-            mask_path = img_path.parent / f"{stem}_mask{suf}"
-            if mask_path.exists():
-                pairs.append((str(img_path), str(mask_path)))
-    return pairs
+    """Find (image_path, mask_path) pairs. Checks Masks/, masks/, Labels/, _mask suffix, or Expert mask images/ (see discovery.py)."""
+    return discover_pairs(root, exts)["pairs"]
 
 
 # --------------- Data ---------------
@@ -69,6 +69,7 @@ class MomotCarotidDataset(torch.utils.data.Dataset):
     """
     Dataset for Momot (2022) style carotid ultrasound.
     Expects a list of dicts: {"image": path, "label": path, "spacing_mm_per_pixel": float}.
+    cache: optional PreprocessCache; cleaned images are then computed once per source file and cleaner setting.
     """
 
     def __init__(
@@ -78,9 +79,11 @@ class MomotCarotidDataset(torch.utils.data.Dataset):
         transform: Optional[Transform] = None,
         image_key: str = "image",
         label_key: str = "label",
+        cache: Optional[PreprocessCache] = None,
     ):
         self.items = items
         self.cleaner = cleaner or MedicalDataCleaner()
+        self.cache = cache
         self.transform = transform
         self.image_key = image_key
         self.label_key = label_key
@@ -88,16 +91,24 @@ class MomotCarotidDataset(torch.utils.data.Dataset):
     def __len__(self) -> int:
         return len(self.items)
 
+    def _clean_image(self, item: Dict[str, Any]) -> np.ndarray:
+        # Decoded exactly as served (cv2 grayscale, see pipeline.load_array)
+        img = load_array(item[self.image_key])
+        img = img.astype(np.float32) / (np.max(img) + 1e-8)
+        return self.cleaner(img, apply_clahe=True, apply_dwt=True)
+
+    def _cache_params(self) -> Dict[str, Any]:
+        """Everything _clean_image depends on besides the file bytes."""
+        return {"cleaner": self.cleaner.config(), "loader": "cv2.grayscale", "normalize": "max", "clahe": True, "dwt": True}
+
     def __getitem__(self, idx: int) -> Dict[str, Any]:
         item = self.items[idx]
-        img = np.load(item[self.image_key]) if str(item[self.image_key]).endswith(".npy") else np.asarray(load_image(item[self.image_key]))
-        lbl = np.load(item[self.label_key]) if str(item[self.label_key]).endswith(".npy") else np.asarray(load_image(item[self.label_key]))
-        if img.ndim == 3:
-            img = img[0]
-        if lbl.ndim == 3:
-            lbl = lbl[0]
-        img = img.astype(np.float32) / (np.max(img) + 1e-8)
-        img = self.cleaner(img, apply_clahe=True, apply_dwt=True)
+        if self.cache is not None:
+            # Copy out of the read-only memory map: transforms (e.g. Cutout) write into the image
+            img = np.array(self.cache.load(item[self.image_key], self._cache_params(), lambda: self._clean_image(item)))
+        else:
+            img = self._clean_image(item)
+        lbl = load_array(item[self.label_key])
         data = {"image": img[None], "label": lbl[None], "spacing_mm_per_pixel": item.get("spacing_mm_per_pixel", 0.04)}
         if self.transform:
             data = self.transform(data)
@@ -144,7 +155,7 @@ class RandSpeckle(Transform):
         return data
 
 
-def get_train_transforms(img_size: Tuple[int, int]) -> Transform:
+def get_train_transforms(img_size: Tuple[int, int], percentiles: Tuple[float, float] = (1, 99)) -> Transform:
     return Compose([
         EnsureChannelFirst(channel_dim="no_channel"),
         RandRotate(range_x=0.2, prob=0.5, mode="bilinear"),
@@ -158,17 +169,18 @@ def get_train_transforms(img_size: Tuple[int, int]) -> Transform:
         ),
         RandGaussianNoise(prob=0.3, std=0.01),
         RandSpeckle(prob=0.3, sigma=0.05),
-        ScaleIntensityRangePercentiles(lower=1, upper=99),
+        ScaleIntensityRangePercentiles(lower=percentiles[0], upper=percentiles[1], b_min=None, b_max=None),
         Cutout(num_holes=1, size=(24, 24), prob=0.4),
         Resize(spatial_size=img_size, mode="bilinear"),
         EnsureType("tensor", dtype=torch.float32),
     ])
 
 
-def get_val_transforms(img_size: Tuple[int, int]) -> Transform:
+def get_val_transforms(img_size: Tuple[int, int], percentiles: Tuple[float, float] = (1, 99)) -> Transform:
+    """Same stages as the served pipeline (carotid/pipeline.py, stored in the checkpoint) after cleaning."""
     return Compose([
         EnsureChannelFirst(channel_dim="no_channel"),
-        ScaleIntensityRangePercentiles(lower=1, upper=99),
+        ScaleIntensityRangePercentiles(lower=percentiles[0], upper=percentiles[1], b_min=None, b_max=None),
         Resize(spatial_size=img_size, mode="bilinear"),
         EnsureType("tensor", dtype=torch.float32),
     ])
@@ -342,6 +354,12 @@ def main():
     parser.add_argument("--pretrained", type=str, default=None, help="Path to pretrained encoder/checkpoint (e.g. USF-MAE or ImageNet)")
     parser.add_argument("--output_dir", type=str, default="models")
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--qa_manifest", type=str, default=None, help="QA manifest reused across runs so only new / changed pairs are re-validated (default: <output_dir>/qa_manifest.json)")
+    parser.add_argument("--split", choices=("group", "random"), default="group", help="group: acquisitions and near-duplicate frames never straddle train/val; random: previous per-image split")
+    parser.add_argument("--dup_threshold", type=int, default=DEFAULT_THRESHOLD, help="Max pHash Hamming distance (of 64 bits) for frames to count as near-duplicates")
+    parser.add_argument("--packed_dir", type=str, default=None, help="Packed dataset (python -m carotid.packed_dataset pack) read via mmap instead of --data_root files")
+    parser.add_argument("--dwt_backend", choices=("pywt", "torch"), default="pywt", help="DWT denoising implementation (torch: carotid/torch_dwt.py, same result to float rounding)")
+    parser.add_argument("--preprocess_cache", type=str, default=None, help="Directory for cleaned (CLAHE + DWT) images, reused across epochs and runs")
     args = parser.parse_args()
 
     torch.manual_seed(args.seed)
@@ -358,14 +376,47 @@ def main():
         val_items = config.get("val", [])
         if train_items and isinstance(train_items[0].get("spacing_mm_per_pixel"), (int, float)):
             spacing_mm = train_items[0]["spacing_mm_per_pixel"]
-    elif args.data_root and Path(args.data_root).exists():
-        pairs = find_image_mask_pairs(Path(args.data_root))
-        if not pairs:
-            raise FileNotFoundError(f"No image/mask pairs under {args.data_root}. Check folder structure (e.g. Images/ + Masks/).")
-        valid_pairs, flagged = filter_and_flag_pairs(pairs, min_coverage_pct=0.001, max_coverage_pct=0.95)
-        if flagged:
-            print(f"Flagged {len(flagged)} pairs (removed from training)")
-        train_pairs, val_pairs = train_test_split(valid_pairs, test_size=0.15, random_state=args.seed)
+    elif args.packed_dir or (args.data_root and Path(args.data_root).exists()):
+        if args.packed_dir:
+            # Already discovered and QA'd when packed (python -m carotid.packed_dataset pack)
+            packed = PackedCarotidDataset(args.packed_dir)
+            valid_pairs, hashes = packed.pairs(), packed.phashes()
+            print(f"Packed dataset {args.packed_dir}: {len(valid_pairs)} pairs in {len(packed.index['shards'])} shards")
+        else:
+            found = discover_pairs(Path(args.data_root))
+            pairs = found["pairs"]
+            if not pairs:
+                raise FileNotFoundError(f"No image/mask pairs under {args.data_root}. Check folder structure (e.g. Images/ + Masks/).")
+            if found["unmatched_images"] or found["orphan_masks"]:
+                print(
+                    f"Discovery: {len(found['unmatched_images'])} images without a mask, {len(found['orphan_masks'])} masks without an image "
+                    f"(list them with: python -m carotid.discovery {args.data_root} --list)"
+                )
+            manifest = QAManifest(args.qa_manifest or Path(args.output_dir) / "qa_manifest.json", min_coverage_pct=0.001, max_coverage_pct=0.95)
+            # pHashes only matter to the grouped split; hashed while QA decodes the images anyway
+            valid_pairs, flagged = manifest.validate(pairs, with_phash=args.split == "group")
+            print(f"Data QA: {manifest.last_run} (manifest {manifest.path})")
+            if flagged:
+                print(f"Flagged {len(flagged)} pairs (removed from training); list them with: python -m carotid.qa_manifest show {manifest.path} --flagged")
+            hashes = manifest.phashes(valid_pairs) if args.split == "group" else None
+        if args.split == "group":
+            train_pairs, val_pairs, dedup_report = grouped_split(
+                valid_pairs, test_size=0.15, seed=args.seed, hashes=hashes, threshold=args.dup_threshold
+            )
+            clusters = dedup_report["duplicate_clusters"]
+            print(
+                f"Grouped split: {dedup_report['acquisitions']} acquisitions, {len(clusters)} near-duplicate clusters "
+                f"({dedup_report['cross_acquisition_clusters']} across acquisitions) -> {dedup_report['groups']} groups, "
+                f"{dedup_report['val_groups']} in val ({dedup_report['seconds']} s)"
+            )
+            Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+            with open(Path(args.output_dir) / "dedup_report.json", "w") as f:
+                json.dump(dedup_report, f, indent=2)
+            if not val_pairs:
+                print("Grouped split: a single leakage group, nothing left for val; falling back to --split random")
+                train_pairs, val_pairs = train_test_split(valid_pairs, test_size=0.15, random_state=args.seed)
+        else:
+            train_pairs, val_pairs = train_test_split(valid_pairs, test_size=0.15, random_state=args.seed)
         train_items = [{"image": i, "label": m, "spacing_mm_per_pixel": spacing_mm} for i, m in train_pairs]
         val_items = [{"image": i, "label": m, "spacing_mm_per_pixel": spacing_mm} for i, m in val_pairs]
         print(f"Train: {len(train_items)}, Val: {len(val_items)}")
@@ -373,15 +424,27 @@ def main():
         train_items = []
         val_items = []
     if not train_items:
-        raise SystemExit("No training data. Provide --data_config or --data_root (e.g. --data_root /content/data).")
+        raise SystemExit("No training data. Provide --data_config, --packed_dir or --data_root (e.g. --data_root /content/data).")
 
     cleaner = MedicalDataCleaner(
         clahe_clip_limit=2.0,
         dwt_wavelet="db4",
         dwt_level=2,
+        dwt_backend=args.dwt_backend,
     )
-    train_ds = MomotCarotidDataset(train_items, cleaner=cleaner, transform=get_train_transforms(img_size))
-    val_ds = MomotCarotidDataset(val_items, cleaner=cleaner, transform=get_val_transforms(img_size))
+    # Saved with the checkpoint: the API preprocesses exactly like the validation path
+    preprocessing = training_preprocessing(cleaner, img_size)
+    percentiles = (preprocessing["intensity"]["lower"], preprocessing["intensity"]["upper"])
+    cache = PreprocessCache(args.preprocess_cache) if args.preprocess_cache and not args.packed_dir else None
+    if args.packed_dir:
+        position = {pair: i for i, pair in enumerate(packed.pairs())}
+        train_idx = [position[(item["image"], item["label"])] for item in train_items]
+        val_idx = [position[(item["image"], item["label"])] for item in val_items]
+        train_ds = PackedCarotidDataset(args.packed_dir, cleaner=cleaner, transform=get_train_transforms(img_size, percentiles), indices=train_idx, index=packed.index)
+        val_ds = PackedCarotidDataset(args.packed_dir, cleaner=cleaner, transform=get_val_transforms(img_size, percentiles), indices=val_idx, index=packed.index)
+    else:
+        train_ds = MomotCarotidDataset(train_items, cleaner=cleaner, transform=get_train_transforms(img_size, percentiles), cache=cache)
+        val_ds = MomotCarotidDataset(val_items, cleaner=cleaner, transform=get_val_transforms(img_size, percentiles), cache=cache)
     train_loader = DataLoader(train_ds, batch_size=args.batch_size, shuffle=True, num_workers=0, pin_memory=True)
     val_loader = DataLoader(val_ds, batch_size=args.batch_size, shuffle=False, num_workers=0)
 
@@ -421,6 +484,7 @@ def main():
                 "out_channels": args.out_channels,
                 "imt_high_risk_mm": IMT_HIGH_RISK_MM,
                 "spacing_mm_per_pixel": spacing_mm,
+                "preprocessing": preprocessing,
             }
             torch.save(ckpt, out_dir / "best_model.pt")
             torch.save(ckpt, out_dir / "carotid_swin_unetr_2d.pt")
@@ -431,11 +495,14 @@ def main():
             "out_channels": args.out_channels,
             "imt_high_risk_mm": IMT_HIGH_RISK_MM,
             "spacing_mm_per_pixel": spacing_mm,
+            "preprocessing": preprocessing,
         }, out_dir / "last_model.pt")
 
     with open(out_dir / "train_log.txt", "w") as f:
         f.write("\n".join(log_lines))
     print("Training finished. Best Dice:", best_dice)
+    if cache is not None:
+        print(f"Preprocess cache: {cache.stats()}")
     print(f"StrokeLink triage: IMT ≥ {IMT_HIGH_RISK_MM} mm = high risk (refer to Gasabo District). Model saved to {out_dir}/carotid_swin_unetr_2d.pt")
 
 